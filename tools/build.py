@@ -128,6 +128,17 @@ if __name__ == '__main__':
 
     parser.add_argument("-j", "--jobs", type=int, dest="jobs",
                       default=0, help="Number of concurrent jobs. Default: 0/auto (based on host machine's number of CPUs)")
+
+    parser.add_argument("--reproducible", action="store_true", dest="reproducible",
+                      default=False, help="Make identical inputs produce bit-identical objects and binaries")
+    parser.add_argument("--unity", action="store_true", dest="unity",
+                      default=False, help="Compile the sources of each directory together in unity files")
+    parser.add_argument("-k", "--keep-going", action="store_true", dest="keep_going",
+                      default=False, help="Compile every source even when some fail, and report all the errors")
+    parser.add_argument("--optimize-includes", action="store_true", dest="optimize_includes",
+                      default=False, help="Only pass the include paths headers are found through, the most used first")
+    parser.add_argument("--compile-timeout", dest="compile_timeout", type=int,
+                      default=None, help="Seconds a parallel compile may go without any compiler output or finished job before it is stopped. Default: COMPILE_TIMEOUT of the settings")
     parser.add_argument("-N", "--artifact-name", dest="artifact_name",
                       default=None, help="The built project's name")
 
@@ -259,7 +270,12 @@ if __name__ == '__main__':
                                                         archive=(not options.no_archive),
                                                         macros=options.macros,
                                                         name=options.artifact_name,
-                                                        build_profile=profile)
+                                                        build_profile=profile,
+                                                        reproducible=options.reproducible,
+                                                        unity=options.unity,
+                                                        keep_going=options.keep_going,
+                                                        optimize_includes=options.optimize_includes,
+                                                        compile_timeout=options.compile_timeout)
                         else:
                             lib_build_res = build_mbed_libs(mcu, toolchain,
                                                         extra_verbose=options.extra_verbose_notify,
@@ -17,6 +17,7 @@ limitations under the License.
 
 import re
 import tempfile
+from copy import deepcopy
 from types import ListType
 from shutil import rmtree
 from os.path import join, exists, dirname, basename, abspath, normpath, splitext
@@ -32,7 +33,10 @@ from tools.paths import MBED_CMSIS_PATH, MBED_TARGETS_PATH, MBED_LIBRARIES,\
     BUILD_DIR
 from tools.targets import TARGET_NAMES, TARGET_MAP
 from tools.libraries import Library
-from tools.toolchains import TOOLCHAIN_CLASSES
+from tools.toolchains import TOOLCHAIN_CLASSES, TOOLCHAIN_PATHS
+from tools.build_manifest import build_key, check_manifest, write_manifest
+from tools.memap import load_sizes, diff_sizes, generate_diff_table
+from tools.size_history import record_build, git_commit, profile_name
 from jinja2 import FileSystemLoader
 from jinja2.environment import Environment
 from tools.config import Config
@@ -303,7 +307,9 @@ def prepare_toolchain(src_paths, target, toolchain_name,
                       macros=None, clean=False, jobs=1,
                       notify=None, silent=False, verbose=False,
                       extra_verbose=False, config=None,
-                      app_config=None, build_profile=None):
+                      app_config=None, build_profile=None, reproducible=False,
+                      pch=False, unity=False, keep_going=False,
+                      optimize_includes=False, compile_timeout=None):
     """ Prepares resource related objects - toolchain, target, config
 
     Positional arguments:
@@ -322,6 +328,15 @@ def prepare_toolchain(src_paths, target, toolchain_name,
     config - a Config object to use instead of creating one
     app_config - location of a chosen mbed_app.json file
     build_profile - a dict of flags that will be passed to the compiler
+    reproducible - make identical inputs give bit-identical outputs
+    pch - precompile mbed.h; True keeps it in the build directory, a directory
+          path keeps it there for several builds to share
+    unity - compile the sources of each directory together (see unity_build.py)
+    keep_going - compile every source, and report all the failures at once
+    optimize_includes - only pass the include paths headers are found through,
+                        the most used first (see include_paths.py)
+    compile_timeout - seconds a parallel compile may go without any compiler
+                      output or finished job before it is considered hung
     """
 
     # We need to remove all paths which are repeated to avoid
@@ -346,6 +361,13 @@ def prepare_toolchain(src_paths, target, toolchain_name,
     toolchain.jobs = jobs
     toolchain.build_all = clean
     toolchain.VERBOSE = verbose
+    toolchain.reproducible = reproducible
+    toolchain.pch = pch
+    toolchain.unity = unity
+    toolchain.keep_going = keep_going
+    toolchain.optimize_includes = optimize_includes
+    if compile_timeout:
+        toolchain.compile_timeout = compile_timeout
 
     return toolchain
 
@@ -384,8 +406,50 @@ def merge_region_list(region_list, destination, padding=b'\xFF'):
     with open(destination, "wb+") as output:
         merged.tofile(output, format='bin')
 
+class SharedScan(object):
+    """The resources of the leading source paths of several builds, scanned
+    once for all of them (see build_tests)
+
+    A build only uses them when its source paths start with the shared ones
+    and its toolchain has the same name and labels, as its own scan could
+    differ otherwise. Each build gets a copy of the resources, and of the
+    .mbedignore patterns read by the scan, and scans its other source paths on
+    top of them. The configuration is not shared: the other paths may hold
+    configuration files.
+    """
+
+    def __init__(self, src_paths, toolchain):
+        self.src_paths = list(src_paths)
+        self.toolchain_name = toolchain.name
+        self.labels = deepcopy(toolchain.get_labels())
+        self.resources = toolchain.scan_resources(src_paths[0])
+        for path in src_paths[1:]:
+            self.resources.add(toolchain.scan_resources(path))
+        self.ignore_patterns = list(toolchain.ignore_patterns)
+        self.ignore_matcher = toolchain.ignore_matcher.copy()
+
+    def applies(self, src_paths, toolchain):
+        """Whether a toolchain that did not scan yet would find the shared
+        resources in the leading paths of src_paths
+        """
+        return (list(src_paths[:len(self.src_paths)]) == self.src_paths and
+                toolchain.name == self.toolchain_name and
+                not toolchain.ignore_patterns and
+                toolchain.get_labels() == self.labels)
+
+    def apply(self, toolchain):
+        """Give the toolchain the state of the shared scan
+
+        Return value:
+        a copy of the shared resources
+        """
+        toolchain.ignore_patterns = list(self.ignore_patterns)
+        toolchain.ignore_matcher = self.ignore_matcher.copy()
+        return self.resources.copy()
+
+
 def scan_resources(src_paths, toolchain, dependencies_paths=None,
-                   inc_dirs=None, base_path=None):
+                   inc_dirs=None, base_path=None, shared_scan=None):
     """ Scan resources using initialized toolcain
 
     Positional arguments
@@ -394,11 +458,20 @@ def scan_resources(src_paths, toolchain, dependencies_paths=None,
     dependencies_paths - dependency paths that we should scan for include dirs
     inc_dirs - additional include directories which should be added to
                the scanner resources
+    base_path - the base path of the scans, the scanned path when None
+    shared_scan - a SharedScan of the leading paths of src_paths, used instead
+                  of scanning them again when it applies
     """
 
     # Scan src_path
-    resources = toolchain.scan_resources(src_paths[0], base_path=base_path)
-    for path in src_paths[1:]:
+    if (shared_scan is not None and base_path is None and
+            shared_scan.applies(src_paths, toolchain)):
+        resources = shared_scan.apply(toolchain)
+        remaining_paths = src_paths[len(shared_scan.src_paths):]
+    else:
+        resources = toolchain.scan_resources(src_paths[0], base_path=base_path)
+        remaining_paths = src_paths[1:]
+    for path in remaining_paths:
         resources.add(toolchain.scan_resources(path, base_path=base_path))
 
     # Scan dependency paths for include dirs
@@ -423,13 +496,47 @@ def scan_resources(src_paths, toolchain, dependencies_paths=None,
 
     return resources
 
+def memap_size_diff(memap_diff, symbols, toolchain_name):
+    """ The table of the biggest size changes of a build since an earlier one
+
+    Positional arguments:
+    memap_diff - the map file or memap json output of the earlier build
+    symbols - the memap symbols output of the build
+    toolchain_name - the name of the build tools
+    """
+    if not exists(symbols):
+        return ''
+    return "Size changes since %s\n%s" % (memap_diff, generate_diff_table(
+        diff_sizes(load_sizes(memap_diff, toolchain_name),
+                   load_sizes(symbols))))
+
+def notify_info(message, notify=None, silent=False):
+    """ Report a message of a build that has no toolchain, as the toolchain
+    would have: through the notify function, or printed unless silent
+
+    Positional arguments:
+    message - the message to report
+
+    Keyword arguments:
+    notify - Notify function for logs
+    silent - suppress printing of the message
+    """
+    if notify:
+        notify({'type': 'info', 'message': message, 'toolchain': None},
+               silent)
+    elif not silent:
+        print message
+
 def build_project(src_paths, build_path, target, toolchain_name,
                   libraries_paths=None, linker_script=None,
                   clean=False, notify=None, verbose=False, name=None,
                   macros=None, inc_dirs=None, jobs=1, silent=False,
                   report=None, properties=None, project_id=None,
                   project_description=None, extra_verbose=False, config=None,
-                  app_config=None, build_profile=None):
+                  app_config=None, build_profile=None, reproducible=False,
+                  pch=False, unity=False, keep_going=False,
+                  optimize_includes=False, shared_scan=None, memap_diff=None,
+                  size_history=None, compile_timeout=None):
     """ Build a project. A project may be a test or a user program.
 
     Positional arguments:
@@ -458,6 +565,22 @@ def build_project(src_paths, build_path, target, toolchain_name,
     config - a Config object to use instead of creating one
     app_config - location of a chosen mbed_app.json file
     build_profile - a dict of flags that will be passed to the compiler
+    reproducible - make identical inputs give bit-identical outputs
+    pch - precompile mbed.h; True keeps it in the build directory, a directory
+          path keeps it there for several builds to share
+    unity - compile the sources of each directory together (see unity_build.py)
+    keep_going - compile every source, and report all the failures at once
+    optimize_includes - only pass the include paths headers are found through,
+                        the most used first (see include_paths.py)
+    shared_scan - a SharedScan of the leading source paths, shared by several
+                  builds
+    memap_diff - the map file or memap json output of an earlier build, to
+                 rank the biggest size changes since
+    size_history - an SQLite database to record the memory footprint of the
+                   build in; the build fails when it grew beyond the limits of
+                   the settings (see size_history.py)
+    compile_timeout - seconds a parallel compile may go without any compiler
+                      output or finished job before it is considered hung
     """
 
     # Convert src_path to a list if needed
@@ -473,16 +596,72 @@ def build_project(src_paths, build_path, target, toolchain_name,
         rmtree(build_path)
     mkdir(build_path)
 
+    # The first path will give the name to the library
+    if name is None:
+        name = basename(normpath(abspath(src_paths[0])))
+
+    # The profile, project and commit of the build in the size history. The
+    # profile is named before the regions of the configuration change it
+    history_key = None
+    if size_history:
+        history_key = (profile_name(build_profile, toolchain_name),
+                       project_id or name, git_commit(src_paths[0]))
+
+    # Return the previous build when nothing it was made from changed. A
+    # Config object given by the caller cannot be fingerprinted
+    manifest_key = None
+    if config is None:
+        manifest_key = build_key(
+            src_paths=src_paths, target=target, toolchain_name=toolchain_name,
+            linker_script=linker_script, name=name, macros=macros,
+            inc_dirs=inc_dirs, app_config=app_config,
+            build_profile=build_profile, reproducible=reproducible, pch=pch,
+            unity=unity, toolchain_paths=TOOLCHAIN_PATHS)
+        previous = check_manifest(build_path, manifest_key)
+        # A build that grew too much since another commit fails again, by
+        # going through the link below
+        if previous is not None and history_key and previous['memory_usage'] \
+           and record_build(size_history,
+                            (previous['target'], toolchain_name) + history_key,
+                            previous['memory_usage']):
+            previous = None
+        if previous is not None:
+            memap_table = previous['memap_table']
+            if memap_diff:
+                memap_table += memap_size_diff(
+                    memap_diff, join(build_path, name + "_symbols.json"),
+                    toolchain_name)
+            notify_info("Building project %s (%s, %s): up to date" % (
+                name, previous['target'], toolchain_name), notify, silent)
+            if memap_table:
+                notify_info(memap_table, notify, silent)
+            if report != None:
+                id_name = project_id.upper() if project_id else name.upper()
+                description = project_description if project_description else name
+                prep_report(report, previous['target'], toolchain_name, id_name)
+                cur_result = create_result(previous['target'], toolchain_name,
+                                           id_name, description)
+                if properties != None:
+                    prep_properties(properties, previous['target'],
+                                    toolchain_name, previous['vendor_label'])
+                cur_result["elapsed_time"] = 0
+                cur_result["output"] = memap_table
+                cur_result["result"] = "OK"
+                cur_result["memory_usage"] = previous['memory_usage']
+                cur_result["elf"] = previous['res']
+                cur_result.update(previous['toolchain_report'])
+                add_result_to_report(report, cur_result)
+            return previous['res']
+
     # Pass all params to the unified prepare_toolchain()
     toolchain = prepare_toolchain(
         src_paths, target, toolchain_name, macros=macros, clean=clean,
         jobs=jobs, notify=notify, silent=silent, verbose=verbose,
         extra_verbose=extra_verbose, config=config, app_config=app_config,
-        build_profile=build_profile)
+        build_profile=build_profile, reproducible=reproducible, pch=pch,
+        unity=unity, keep_going=keep_going,
+        optimize_includes=optimize_includes, compile_timeout=compile_timeout)
 
-    # The first path will give the name to the library
-    if name is None:
-        name = basename(normpath(abspath(src_paths[0])))
     toolchain.info("Building project %s (%s, %s)" %
                    (name, toolchain.target.name, toolchain_name))
 
@@ -502,7 +681,8 @@ def build_project(src_paths, build_path, target, toolchain_name,
 
     try:
         # Call unified scan_resources
-        resources = scan_resources(src_paths, toolchain, inc_dirs=inc_dirs)
+        resources = scan_resources(src_paths, toolchain, inc_dirs=inc_dirs,
+                                   shared_scan=shared_scan)
 
         # Change linker script if specified
         if linker_script is not None:
@@ -526,6 +706,7 @@ def build_project(src_paths, build_path, target, toolchain_name,
 
         memap_instance = getattr(toolchain, 'memap_instance', None)
         memap_table = ''
+        outputs = [res]
         if memap_instance:
             # Write output to stdout in text (pretty table) format
             memap_table = memap_instance.generate_output('table')
@@ -541,12 +722,48 @@ def build_project(src_paths, build_path, target, toolchain_name,
             map_csv = join(build_path, name + "_map.csv")
             memap_instance.generate_output('csv-ci', map_csv)
 
+            # Write the sizes of every symbol, to compare later builds with
+            map_symbols = join(build_path, name + "_symbols.json")
+            memap_instance.generate_output('symbols', map_symbols)
+            outputs += [map_out, map_csv, map_symbols]
+
+        # The size changes are not part of the table kept by the manifest: the
+        # earlier build they are measured from may change
+        diff_table = ''
+        if memap_instance and memap_diff:
+            diff_table = memap_size_diff(memap_diff, map_symbols,
+                                         toolchain_name)
+            if not silent:
+                print diff_table
+
         resources.detect_duplicates(toolchain)
 
+        if history_key and toolchain.map_outputs:
+            regressions = record_build(
+                size_history,
+                (toolchain.target.name, toolchain_name) + history_key,
+                toolchain.map_outputs)
+            if regressions:
+                message = "\n".join(regressions)
+                toolchain.tool_error(message)
+                raise ToolException(message)
+
+        if manifest_key:
+            write_manifest(build_path, manifest_key, toolchain, resources,
+                           outputs, {
+                               'res': res,
+                               'target': toolchain.target.name,
+                               'vendor_label': toolchain.target.extra_labels[0],
+                               'memap_table': memap_table,
+                               'memory_usage': toolchain.map_outputs,
+                               'toolchain_report': toolchain.report
+                           }, app_config=app_config, inc_dirs=inc_dirs)
+
         if report != None:
             end = time()
             cur_result["elapsed_time"] = end - start
-            cur_result["output"] = toolchain.get_output() + memap_table
+            cur_result["output"] = toolchain.get_output() + memap_table + \
+                                   diff_table
             cur_result["result"] = "OK"
             cur_result["memory_usage"] = toolchain.map_outputs
             cur_result["elf"] = res
@@ -582,7 +799,9 @@ def build_library(src_paths, build_path, target, toolchain_name,
                   inc_dirs=None, jobs=1, silent=False, report=None,
                   properties=None, extra_verbose=False, project_id=None,
                   remove_config_header_file=False, app_config=None,
-                  build_profile=None):
+                  build_profile=None, reproducible=False, unity=False,
+                  keep_going=False, optimize_includes=False,
+                  compile_timeout=None):
     """ Build a library
 
     Positional arguments:
@@ -610,6 +829,13 @@ def build_library(src_paths, build_path, target, toolchain_name,
     remove_config_header_file - delete config header file when done building
     app_config - location of a chosen mbed_app.json file
     build_profile - a dict of flags that will be passed to the compiler
+    reproducible - make identical inputs give bit-identical outputs
+    unity - compile the sources of each directory together (see unity_build.py)
+    keep_going - compile every source, and report all the failures at once
+    optimize_includes - only pass the include paths headers are found through,
+                        the most used first (see include_paths.py)
+    compile_timeout - seconds a parallel compile may go without any compiler
+                      output or finished job before it is considered hung
     """
 
     # Convert src_path to a list if needed
@@ -634,7 +860,9 @@ def build_library(src_paths, build_path, target, toolchain_name,
         src_paths, target, toolchain_name, macros=macros, clean=clean,
         jobs=jobs, notify=notify, silent=silent, verbose=verbose,
         extra_verbose=extra_verbose, app_config=app_config,
-        build_profile=build_profile)
+        build_profile=build_profile, reproducible=reproducible, unity=unity,
+        keep_going=keep_going, optimize_includes=optimize_includes,
+        compile_timeout=compile_timeout)
 
     # The first path will give the name to the library
     if name is None:
@@ -0,0 +1,212 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+from os import stat, getpid, rename, remove, walk
+from os.path import join, exists, relpath, abspath, isabs, splitext
+from distutils.spawn import find_executable
+from hashlib import md5
+
+from tools.targets import Target
+from tools.settings import MBED_ORG_USER
+
+# Bump when the layout of the manifest changes
+MANIFEST_VERSION = 2
+
+# Headers looked for in the include directories given to a build, which its
+# scan does not list
+HEADER_EXTENSIONS = ['.h', '.hpp']
+
+FILENAME = ".mbed_build_manifest.json"
+
+
+def _file_state(path):
+    info = stat(path)
+    return [info.st_mtime, info.st_size]
+
+
+def _hash_file(path):
+    digest = md5()
+    with open(path, "rb") as file_in:
+        for chunk in iter(lambda: file_in.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _tool_state(executable):
+    # The executable stands in for the version of the toolchain, as in the
+    # compile cache
+    if not isabs(executable):
+        executable = find_executable(executable) or executable
+    try:
+        return [executable] + _file_state(executable)
+    except OSError:
+        return [executable]
+
+
+def build_key(**params):
+    """A digest of the parameters of a build that are not files
+
+    Keyword arguments are the build parameters. They must be JSON
+    serializable, except for the target, which may be a Target object. The
+    settings the toolchains turn into macros are added to them.
+    """
+    target = params.get('target')
+    if isinstance(target, Target):
+        params['target'] = target.name
+    params['settings'] = {'MBED_ORG_USER': MBED_ORG_USER}
+    return md5(json.dumps([MANIFEST_VERSION, params], sort_keys=True)).hexdigest()
+
+
+def _outside(path, build_path):
+    return relpath(abspath(path), abspath(build_path)).startswith('..')
+
+
+def _resource_files(resources):
+    files = (resources.headers + resources.s_sources + resources.c_sources +
+             resources.cpp_sources + resources.objects + resources.libraries +
+             resources.hex_files + resources.bin_files + resources.json_files +
+             resources.lib_builds)
+    if resources.linker_script:
+        files.append(resources.linker_script)
+    return files
+
+
+def _resource_dirs(resources):
+    # Every directory the scan walked is an include directory, including the
+    # directories of the features that were not enabled
+    dirs = list(resources.inc_dirs)
+    for feature in resources.features.values():
+        dirs.extend(_resource_dirs(feature))
+    return dirs
+
+
+def _include_dir_contents(inc_dirs, build_path):
+    # The headers of include directories outside of the scanned sources, and
+    # the directories under them, for added headers to be noticed
+    files, dirs = [], []
+    for inc_dir in inc_dirs:
+        for root, subdirs, names in walk(inc_dir):
+            subdirs[:] = [name for name in subdirs
+                          if _outside(join(root, name), build_path)]
+            dirs.append(root)
+            files.extend(join(root, name) for name in names
+                         if splitext(name)[1].lower() in HEADER_EXTENSIONS)
+    return files, dirs
+
+
+def write_manifest(build_path, key, toolchain, resources, outputs, result,
+                   app_config=None, inc_dirs=None):
+    """Record what a successful build was made from
+
+    Positional arguments:
+    build_path - the build directory
+    key - the build_key of the build parameters
+    toolchain - the toolchain that did the build
+    resources - the resources that were built
+    outputs - the files the build produced
+    result - what the build returned and reported, handed back by
+             check_manifest
+
+    Keyword arguments:
+    app_config - the mbed_app.json given explicitly to the build, if any
+    inc_dirs - the include directories given to the build, whose headers are
+               recorded as well
+    """
+    inputs = set(path for path in _resource_files(resources)
+                 if _outside(path, build_path))
+    inputs.add(Target.get_targets_json_location())
+    if app_config:
+        inputs.add(app_config)
+    dirs = set(path for path in _resource_dirs(resources)
+               if _outside(path, build_path))
+    if isinstance(inc_dirs, basestring):
+        inc_dirs = [inc_dirs]
+    headers, header_dirs = _include_dir_contents(
+        [path for path in inc_dirs or [] if _outside(path, build_path)],
+        build_path)
+    inputs.update(headers)
+    dirs.update(header_dirs)
+    for path in dirs:
+        if exists(join(path, ".mbedignore")):
+            inputs.add(join(path, ".mbedignore"))
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'key': key,
+        'inputs': dict((path, _file_state(path)) for path in inputs
+                       if exists(path)),
+        'dirs': dict((path, stat(path).st_mtime) for path in dirs
+                     if exists(path)),
+        'tools': dict((tool, _tool_state(tool))
+                      for tool in (toolchain.cc[0], toolchain.ld[0])),
+        'outputs': dict((path, _hash_file(path)) for path in outputs
+                        if exists(path)),
+        'result': result
+    }
+
+    path = join(build_path, FILENAME)
+    temp = "%s.%d.tmp" % (path, getpid())
+    try:
+        with open(temp, "w") as manifest_out:
+            json.dump(manifest, manifest_out)
+        rename(temp, path)
+    except (IOError, OSError):
+        try:
+            remove(temp)
+        except OSError:
+            pass
+
+
+def check_manifest(build_path, key):
+    """Find out whether the previous build of a build directory is still up
+    to date
+
+    Positional arguments:
+    build_path - the build directory
+    key - the build_key of the parameters of the new build
+
+    Return value:
+    the result recorded by write_manifest when none of the inputs, the
+    toolchain and the outputs changed, None otherwise
+    """
+    path = join(build_path, FILENAME)
+    if not exists(path):
+        return None
+    try:
+        with open(path) as manifest_in:
+            manifest = json.load(manifest_in)
+    except (IOError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest['key'] != key:
+        return None
+
+    try:
+        for path, state in manifest['inputs'].iteritems():
+            if _file_state(path) != state:
+                return None
+        for path, mtime in manifest['dirs'].iteritems():
+            if stat(path).st_mtime != mtime:
+                return None
+        for tool, state in manifest['tools'].iteritems():
+            if _tool_state(tool) != state:
+                return None
+        for path, digest in manifest['outputs'].iteritems():
+            if _hash_file(path) != digest:
+                return None
+    except (IOError, OSError):
+        return None
+    return manifest['result']
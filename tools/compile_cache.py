@@ -0,0 +1,296 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import re
+import json
+from os import stat, walk, remove, rename, utime, getpid
+from os.path import join, exists, splitext, dirname, isabs
+from hashlib import md5
+from distutils.spawn import find_executable
+
+from tools.utils import mkdir
+
+# Bump when the layout of the cache or the key derivation changes
+CACHE_VERSION = "2"
+
+# Placeholder for the build directory in commands and dependency files. Objects
+# built in different build directories share cache entries through it.
+BUILD_DIR_PLACEHOLDER = "<<BUILD_DIR>>"
+
+# Number of dependency sets remembered per command
+MAX_MANIFEST_ENTRIES = 16
+
+# Definition of the build time stamp, different in every build unless it is
+# reproducible. It is left out of the keys, as build_pch does, or no object
+# would ever be shared between builds
+TIMESTAMP_DEFINE = re.compile(r'-DMBED_BUILD_TIMESTAMP=\S*')
+
+# Options of the compilers naming a response file in the next argument (armcc
+# and IAR), besides the @file of GCC
+RESPONSE_FILE_OPTIONS = ('--via', '-f')
+
+
+class CompileCache(object):
+    """A content addressed object cache, in the spirit of ccache's direct mode
+
+    Entries are found in two steps. The first key is made of the compiler
+    executable, the compile command (with the build directory abstracted
+    away), the source and the configuration header. It points to a manifest
+    that lists the headers each previous compilation depended on, with their
+    content hashes. When all of those headers still hash the same, the second
+    key, derived from the first key and the header hashes, names the stored
+    object and dependency file.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+        # First key of every job that missed, by object path
+        self._pending = {}
+        # Content hashes of the files seen during this build, by path
+        self._file_hashes = {}
+        # Identity of each compiler executable, by path
+        self._compiler_ids = {}
+
+        self._stored = False
+
+    def _hash_file(self, path):
+        if path not in self._file_hashes:
+            digest = md5()
+            with open(path, "rb") as file_in:
+                for chunk in iter(lambda: file_in.read(65536), b""):
+                    digest.update(chunk)
+            self._file_hashes[path] = digest.hexdigest()
+        return self._file_hashes[path]
+
+    def _compiler_id(self, executable):
+        # The path, size and modification time stand in for the version, so
+        # that the compiler does not have to be run to find out. A compiler
+        # given by its name is the one found through the PATH
+        if executable not in self._compiler_ids:
+            path = executable
+            if not isabs(path):
+                path = find_executable(path) or path
+            try:
+                info = stat(path)
+                self._compiler_ids[executable] = "%s:%d:%d" % (
+                    path, info.st_size, int(info.st_mtime))
+            except OSError:
+                self._compiler_ids[executable] = executable
+        return self._compiler_ids[executable]
+
+    def _path(self, key, ext):
+        return join(self.cache_dir, key[:2], key + ext)
+
+    @staticmethod
+    def _normalize(text, build_dir):
+        if build_dir in ("", "."):
+            return text
+        return text.replace(build_dir, BUILD_DIR_PLACEHOLDER)
+
+    @staticmethod
+    def _dep_path(obj):
+        return splitext(obj)[0] + '.d'
+
+    def _response_file(self, path, build_dir):
+        # Response files are hashed without the build time stamp either
+        try:
+            with open(path) as file_in:
+                text = file_in.read()
+        except IOError:
+            return ""
+        return md5(self._normalize(TIMESTAMP_DEFINE.sub("", text),
+                                   build_dir)).hexdigest()
+
+    def _command_key(self, toolchain, job):
+        digest = md5(CACHE_VERSION)
+        for command in job['commands']:
+            digest.update(self._compiler_id(command[0]))
+            previous = None
+            for arg in command[1:]:
+                if TIMESTAMP_DEFINE.match(arg):
+                    continue
+                digest.update("\0" + self._normalize(arg, toolchain.build_dir))
+                if arg.startswith("@"):
+                    digest.update(self._response_file(arg[1:],
+                                                      toolchain.build_dir))
+                elif previous in RESPONSE_FILE_OPTIONS:
+                    digest.update(self._response_file(arg,
+                                                      toolchain.build_dir))
+                previous = arg
+            digest.update("\n")
+        digest.update(self._hash_file(job['source']))
+        config_file = toolchain.get_config_header()
+        if config_file:
+            digest.update(self._hash_file(config_file))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _result_key(key, deps):
+        digest = md5(key)
+        for path, file_hash in deps:
+            digest.update("%s\0%s\n" % (path, file_hash))
+        return digest.hexdigest()
+
+    def _read_manifest(self, key):
+        try:
+            with open(self._path(key, ".manifest")) as manifest:
+                return json.load(manifest)
+        except (IOError, ValueError):
+            return []
+
+    def _write_atomic(self, path, data):
+        mkdir(dirname(path))
+        temp = "%s.%d.tmp" % (path, getpid())
+        with open(temp, "wb") as file_out:
+            file_out.write(data)
+        try:
+            rename(temp, path)
+        except OSError:
+            # Another build stored the same entry first
+            remove(temp)
+
+    def _deps_match(self, toolchain, deps):
+        for path, file_hash in deps:
+            path = path.replace(BUILD_DIR_PLACEHOLDER, toolchain.build_dir)
+            try:
+                if self._hash_file(path) != file_hash:
+                    return False
+            except IOError:
+                return False
+        return True
+
+    def fetch(self, toolchain, job):
+        """Restore the object of a compile job from the cache
+
+        Positional arguments:
+        toolchain - the toolchain that generated the job
+        job - a compile job, as queued by compile_sources
+
+        Return value:
+        True when the object (and its dependency file) were restored
+        """
+        key = self._command_key(toolchain, job)
+        for entry in self._read_manifest(key):
+            if not self._deps_match(toolchain, entry['deps']):
+                continue
+            obj_path = self._path(entry['result'], ".o")
+            dep_path = self._path(entry['result'], ".d")
+            try:
+                with open(obj_path, "rb") as obj_in:
+                    obj_data = obj_in.read()
+                dep_data = None
+                if exists(dep_path):
+                    with open(dep_path, "rb") as dep_in:
+                        dep_data = dep_in.read()
+            except IOError:
+                continue
+            with open(job['object'], "wb") as obj_out:
+                obj_out.write(obj_data)
+            if dep_data is not None:
+                with open(self._dep_path(job['object']), "wb") as dep_out:
+                    dep_out.write(dep_data.replace(BUILD_DIR_PLACEHOLDER,
+                                                   toolchain.build_dir))
+            # The modification time is the recency used for eviction
+            utime(obj_path, None)
+            self.hits += 1
+            return True
+
+        self._pending[job['object']] = key
+        self.misses += 1
+        return False
+
+    def store(self, toolchain, job):
+        """Add the freshly compiled object of a job to the cache
+
+        Positional arguments:
+        toolchain - the toolchain that generated the job
+        job - a compile job that compiled successfully
+        """
+        key = self._pending.pop(job['object'], None)
+        if key is None or not exists(job['object']):
+            return
+
+        dep_file = self._dep_path(job['object'])
+        dep_data = None
+        if exists(dep_file):
+            dependencies = toolchain.parse_dependencies(dep_file)
+            with open(dep_file, "rb") as dep_in:
+                dep_data = self._normalize(dep_in.read(), toolchain.build_dir)
+        else:
+            dependencies = [job['source']]
+
+        deps = []
+        for path in sorted(set(dependencies)):
+            try:
+                deps.append([self._normalize(path, toolchain.build_dir),
+                             self._hash_file(path)])
+            except IOError:
+                # A dependency we cannot read cannot be validated later
+                return
+        result = self._result_key(key, deps)
+
+        with open(job['object'], "rb") as obj_in:
+            self._write_atomic(self._path(result, ".o"), obj_in.read())
+        if dep_data is not None:
+            self._write_atomic(self._path(result, ".d"), dep_data)
+
+        manifest = [entry for entry in self._read_manifest(key)
+                    if entry['result'] != result]
+        manifest.insert(0, {'deps': deps, 'result': result})
+        self._write_atomic(self._path(key, ".manifest"),
+                           json.dumps(manifest[:MAX_MANIFEST_ENTRIES]))
+        self._stored = True
+
+    def trim(self):
+        """Evict the least recently used objects until the cache fits within
+        its size limit
+        """
+        if not self._stored:
+            return
+        self._stored = False
+
+        entries = []
+        total = 0
+        for root, _, files in walk(self.cache_dir):
+            for name in files:
+                path = join(root, name)
+                try:
+                    info = stat(path)
+                except OSError:
+                    continue
+                total += info.st_size
+                if name.endswith(".o"):
+                    entries.append((info.st_mtime, info.st_size, path))
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            for victim in (path, splitext(path)[0] + ".d"):
+                try:
+                    total -= stat(victim).st_size
+                    remove(victim)
+                except OSError:
+                    pass
+
+    def stats(self):
+        """A summary of the cache efficiency of this build"""
+        return {'hits': self.hits, 'misses': self.misses}
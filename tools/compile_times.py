@@ -0,0 +1,111 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import heapq
+from os import getpid, rename, remove
+from os.path import join, relpath
+
+
+def makespan(durations, workers):
+    """The wall clock time taken by a pool of workers that picks up jobs in
+    the given order, each worker taking the next job as soon as it is free
+
+    Positional arguments:
+    durations - the duration of each job, in submission order
+    workers - the number of jobs running at the same time
+    """
+    finish = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + duration)
+    return max(finish)
+
+
+class CompileTimes(object):
+    """Compile durations of the objects of a build directory
+
+    The durations recorded by one build are used to order the compile queue of
+    the next one. Compile jobs do not depend on each other, so the critical
+    path of a build is its longest job: starting the longest jobs first keeps
+    a heavy translation unit from being picked up last and running alone at
+    the end of the build.
+    """
+
+    FILENAME = ".mbed_compile_times.json"
+
+    def __init__(self, build_path):
+        self.build_path = build_path
+        self.path = join(build_path, self.FILENAME)
+        try:
+            with open(self.path) as times_in:
+                self.times = json.load(times_in)
+        except (IOError, ValueError):
+            self.times = {}
+        self._changed = False
+
+    def _key(self, obj):
+        return relpath(obj, self.build_path)
+
+    def estimate(self, obj):
+        """The expected compile duration of an object, or None when it has
+        never been compiled in this build directory
+        """
+        return self.times.get(self._key(obj))
+
+    def record(self, obj, duration):
+        """Remember how long an object took to compile"""
+        self.times[self._key(obj)] = duration
+        self._changed = True
+
+    def _estimates(self, queue):
+        # Jobs without history are assumed to take the average known time
+        known = [t for t in (self.estimate(job['object']) for job in queue)
+                 if t is not None]
+        default = sum(known) / len(known) if known else 0.0
+        return [self.estimate(job['object']) or default for job in queue]
+
+    def schedule(self, queue):
+        """Order a compile queue longest job first
+
+        Jobs with the same estimate keep their relative order, so a build
+        without any history compiles in the order it was queued in.
+        """
+        estimates = self._estimates(queue)
+        order = sorted(range(len(queue)), key=lambda i: -estimates[i])
+        return [queue[i] for i in order]
+
+    def saving(self, queue, scheduled, workers):
+        """The estimated wall clock time of a queue in its original and its
+        scheduled order, as a tuple
+        """
+        return (makespan(self._estimates(queue), workers),
+                makespan(self._estimates(scheduled), workers))
+
+    def save(self):
+        """Write the recorded durations back to the build directory"""
+        if not self._changed:
+            return
+        temp = "%s.%d.tmp" % (self.path, getpid())
+        try:
+            with open(temp, "w") as times_out:
+                json.dump(self.times, times_out, indent=0, sort_keys=True)
+            rename(temp, self.path)
+        except (IOError, OSError):
+            try:
+                remove(temp)
+            except OSError:
+                pass
+        self._changed = False
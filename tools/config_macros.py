@@ -0,0 +1,122 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import re
+import json
+from os import stat, getpid, rename, remove
+from os.path import join
+
+# A "#define" line of mbed_config.h, without its "set by"/"defined by" comment
+DEFINE_PATTERN = re.compile(
+    r'^#define\s+(?P<name>\w+)(?P<value>.*?)\s*(?://\s*(?:set|defined) by .*)?$')
+
+
+def parse_config_header(data):
+    """The macros defined by the content of a configuration header, as a dict
+    of macro name to value
+    """
+    macros = {}
+    for line in data.splitlines():
+        match = DEFINE_PATTERN.match(line)
+        if match:
+            macros[match.group('name')] = match.group('value').strip()
+    return macros
+
+
+class ConfigMacroTracker(object):
+    """Which objects of a build directory a configuration change affects
+
+    When mbed_config.h changes, the macros whose value changed are recorded
+    along with the modification time of the new header. An object then only
+    has to be rebuilt when one of its source files or headers mentions a
+    macro that changed after the object was built. The change times are kept
+    in the build directory, so objects left stale by an interrupted build are
+    still rebuilt by the next one.
+    """
+
+    FILENAME = ".mbed_config_macros.json"
+
+    def __init__(self, build_path):
+        self.path = join(build_path, self.FILENAME)
+        try:
+            with open(self.path) as changes_in:
+                self.changes = json.load(changes_in)
+        except (IOError, ValueError):
+            self.changes = {}
+        self._pattern = None
+        # Changed macros mentioned by each file, found once per build
+        self._mentions = {}
+
+    def update(self, config_file, prev_data, crt_data):
+        """Record the macros that differ between two contents of the
+        configuration header
+
+        Positional arguments:
+        config_file - the configuration header, already holding crt_data
+        prev_data - the previous content of the header
+        crt_data - the new content of the header
+        """
+        prev_macros = parse_config_header(prev_data)
+        crt_macros = parse_config_header(crt_data)
+        changed_at = stat(config_file).st_mtime
+        for name in set(prev_macros) | set(crt_macros):
+            if prev_macros.get(name) != crt_macros.get(name):
+                self.changes[name] = changed_at
+        self._pattern = None
+        self._mentions = {}
+
+        temp = "%s.%d.tmp" % (self.path, getpid())
+        try:
+            with open(temp, "w") as changes_out:
+                json.dump(self.changes, changes_out, indent=0, sort_keys=True)
+            rename(temp, self.path)
+        except (IOError, OSError):
+            try:
+                remove(temp)
+            except OSError:
+                pass
+
+    def _mentioned(self, path):
+        if path not in self._mentions:
+            if self._pattern is None:
+                self._pattern = re.compile(r'\b(%s)\b' % '|'.join(
+                    re.escape(name) for name in sorted(self.changes)))
+            with open(path, "rb") as file_in:
+                self._mentions[path] = set(self._pattern.findall(file_in.read()))
+        return self._mentions[path]
+
+    def need_update(self, target, dependencies):
+        """Whether an object mentions a configuration macro that changed
+        after it was built
+
+        Positional arguments:
+        target - the object
+        dependencies - its source and the headers it includes
+        """
+        if not self.changes:
+            return False
+        target_mod_time = stat(target).st_mtime
+        changed = set(name for name, changed_at in self.changes.iteritems()
+                      if changed_at >= target_mod_time)
+        if not changed:
+            return False
+        for dep in dependencies:
+            try:
+                if self._mentioned(dep) & changed:
+                    return True
+            except IOError:
+                return True
+        return False
@@ -0,0 +1,165 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import marshal
+from os import stat, getpid, rename, remove
+from os.path import join, relpath
+from hashlib import md5
+
+# Bump when the layout of the index changes
+INDEX_VERSION = 1
+
+
+class DependencyIndex(object):
+    """The dependency graph of a build directory, kept between builds
+
+    Every dependency file produced by the compiler is parsed once. The index
+    keeps, for each of them, the ids of the files it lists, and for each of
+    those files its size, modification time and content hash. A rebuild only
+    has to stat the dependency files and the headers, instead of parsing the
+    dependency files again.
+
+    A header whose modification time changed but whose content did not (a
+    branch switch, a touch) keeps the modification time of its last content
+    change, so that it does not trigger a rebuild.
+    """
+
+    FILENAME = ".mbed_deps.idx"
+
+    def __init__(self, build_path):
+        self.build_path = build_path
+        self.path = join(build_path, self.FILENAME)
+
+        self.paths = []
+        # Per file id: [mtime, size, content hash, mtime of the last change]
+        self.files = []
+        # Per dependency file: [mtime, size, ids of the files it lists]
+        self.tus = {}
+        try:
+            with open(self.path, "rb") as index_in:
+                version, self.paths, self.files, self.tus = \
+                    marshal.load(index_in)
+            if version != INDEX_VERSION:
+                raise ValueError
+        except (IOError, ValueError, EOFError, TypeError):
+            self.paths, self.files, self.tus = [], [], {}
+        self.ids = dict((path, i) for i, path in enumerate(self.paths))
+
+        # Modification times already checked during this build
+        self._checked = {}
+        self._changed = False
+
+    @staticmethod
+    def _hash_file(path):
+        digest = md5()
+        with open(path, "rb") as file_in:
+            for chunk in iter(lambda: file_in.read(65536), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _file_id(self, path):
+        if path not in self.ids:
+            self.ids[path] = len(self.paths)
+            self.paths.append(path)
+            self.files.append(None)
+        return self.ids[path]
+
+    def update(self, dep_path, parse):
+        """Record the files listed in a dependency file
+
+        Positional arguments:
+        dep_path - the dependency file
+        parse - the function that parses it into a list of files
+
+        Return value:
+        the files listed in the dependency file
+        """
+        info = stat(dep_path)
+        dependencies = parse(dep_path)
+        self.tus[relpath(dep_path, self.build_path)] = [
+            info.st_mtime, info.st_size,
+            [self._file_id(dep) for dep in dependencies]]
+        # Record the state of the files the object was just built from
+        for dep in dependencies:
+            try:
+                self.mtime(dep)
+            except OSError:
+                pass
+        self._changed = True
+        return dependencies
+
+    def dependencies(self, dep_path, parse):
+        """The files listed in a dependency file, parsed only when the
+        dependency file changed since it was last indexed
+
+        Positional arguments:
+        dep_path - the dependency file
+        parse - the function that parses it into a list of files
+        """
+        try:
+            info = stat(dep_path)
+        except OSError:
+            return []
+        entry = self.tus.get(relpath(dep_path, self.build_path))
+        if entry and entry[0] == info.st_mtime and entry[1] == info.st_size:
+            return [self.paths[i] for i in entry[2]]
+        return self.update(dep_path, parse)
+
+    def mtime(self, path):
+        """The modification time of the last content change of an indexed
+        file, or None when the file is not indexed
+
+        Raises OSError when the file does not exist anymore.
+        """
+        if path in self._checked:
+            return self._checked[path]
+        file_id = self.ids.get(path)
+        if file_id is None:
+            return None
+
+        info = stat(path)
+        record = self.files[file_id]
+        if record is None or record[1] != info.st_size:
+            record = [info.st_mtime, info.st_size, self._hash_file(path),
+                      info.st_mtime]
+            self._changed = True
+        elif record[0] != info.st_mtime:
+            content = self._hash_file(path)
+            if content != record[2]:
+                record = [info.st_mtime, info.st_size, content, info.st_mtime]
+            else:
+                record = [info.st_mtime, info.st_size, content, record[3]]
+            self._changed = True
+        self.files[file_id] = record
+        self._checked[path] = record[3]
+        return record[3]
+
+    def save(self):
+        """Write the index back to the build directory"""
+        if not self._changed:
+            return
+        temp = "%s.%d.tmp" % (self.path, getpid())
+        try:
+            with open(temp, "wb") as index_out:
+                marshal.dump((INDEX_VERSION, self.paths, self.files, self.tus),
+                             index_out)
+            rename(temp, self.path)
+        except (IOError, OSError):
+            try:
+                remove(temp)
+            except OSError:
+                pass
+        self._changed = False
@@ -0,0 +1,87 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the rebuild that follows a change of one configuration parameter
+
+The whole mbed-os tree is built once with the default configuration, then
+again with the parameter overridden in an application configuration, then
+with the default configuration again. Each build reports how many objects
+were compiled and how long it took.
+"""
+import sys
+import json
+from argparse import ArgumentParser
+from os.path import join, abspath, dirname
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tools.build_api import build_library
+
+
+def build(target, toolchain, build_path, app_config, jobs):
+    """Build mbed-os and return the number of compiled objects and the time
+    the build took
+    """
+    compiled = []
+
+    def notify(event, silent):
+        if event['type'] == 'progress' and event['action'] == 'compile':
+            compiled.append(event['file'])
+
+    start = time()
+    build_library(ROOT, build_path, target, toolchain, archive=False,
+                  notify=notify, silent=True, jobs=jobs, app_config=app_config)
+    return len(compiled), time() - start
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-m", "--mcu", default="K64F")
+    parser.add_argument("-t", "--toolchain", default="GCC_ARM")
+    parser.add_argument("-p", "--parameter", default="platform.stdio-baud-rate",
+                        help="configuration parameter to toggle")
+    parser.add_argument("-v", "--value", default="115200",
+                        help="value of the parameter in the second build")
+    parser.add_argument("-j", "--jobs", type=int, default=0)
+    options = parser.parse_args()
+
+    work_dir = mkdtemp()
+    try:
+        build_path = join(work_dir, "BUILD")
+        app_config = join(work_dir, "mbed_app.json")
+        with open(app_config, "w") as config_out:
+            json.dump({"target_overrides": {
+                "*": {options.parameter: options.value}}}, config_out)
+
+        for label, config in [("default configuration", None),
+                              ("%s=%s" % (options.parameter, options.value),
+                               app_config),
+                              ("default configuration again", None)]:
+            count, duration = build(options.mcu, options.toolchain, build_path,
+                                    config, options.jobs)
+            print "%-50s %5d objects compiled in %7.2fs" % (label, count,
+                                                            duration)
+    finally:
+        rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
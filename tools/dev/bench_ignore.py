@@ -0,0 +1,105 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the .mbedignore matching of a scan, on a generated tree
+
+Every directory of the tree holds sources and an .mbedignore file. The tree
+is scanned serially, testing each path against every pattern with fnmatch as
+is_ignored used to, then with the compiled patterns of the toolchain.
+"""
+import sys
+import fnmatch
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join, abspath, dirname
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tools.targets import TARGET_MAP
+from tools.toolchains import TOOLCHAIN_CLASSES
+
+
+def make_tree(path, depth, width, files, patterns):
+    with open(join(path, ".mbedignore"), "w") as ignore:
+        ignore.write("".join("ignored_%d*\n" % index
+                             for index in range(patterns)))
+    for index in range(files):
+        open(join(path, "source_%d.c" % index), "w").close()
+    open(join(path, "ignored_0.c"), "w").close()
+    if depth:
+        for index in range(width):
+            subdir = join(path, "dir_%d" % index)
+            makedirs(subdir)
+            make_tree(subdir, depth - 1, width, files, patterns)
+
+
+def legacy_is_ignored(toolchain):
+    def is_ignored(file_path):
+        for pattern in toolchain.ignore_patterns:
+            if fnmatch.fnmatch(file_path, pattern):
+                return True
+        return False
+    return is_ignored
+
+
+def scan(mcu, toolchain_name, path, legacy):
+    toolchain = TOOLCHAIN_CLASSES[toolchain_name](TARGET_MAP[mcu], silent=True)
+    toolchain.scan_threads = 1
+    if legacy:
+        toolchain.is_ignored = legacy_is_ignored(toolchain)
+    start = time()
+    resources = toolchain.scan_resources(path)
+    return time() - start, resources, len(toolchain.ignore_patterns)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-m", "--mcu", default="K64F")
+    parser.add_argument("-t", "--toolchain", default="GCC_ARM")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--width", type=int, default=6)
+    parser.add_argument("--files", type=int, default=10,
+                        help="sources in each directory")
+    parser.add_argument("--patterns", type=int, default=4,
+                        help="patterns in each .mbedignore file")
+    options = parser.parse_args()
+
+    work_dir = mkdtemp()
+    try:
+        make_tree(work_dir, options.depth, options.width, options.files,
+                  options.patterns)
+        sources = None
+        for legacy in (True, False):
+            duration, resources, patterns = scan(options.mcu, options.toolchain,
+                                                 work_dir, legacy)
+            if sources is None:
+                sources = resources.c_sources
+            print "%-8s %d sources, %d patterns: %7.3fs%s" % (
+                "fnmatch" if legacy else "compiled", len(resources.c_sources),
+                patterns, duration,
+                "" if resources.c_sources == sources else
+                " (sources differ from fnmatch)")
+    finally:
+        rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the map file parsers of memap, on generated map files
+
+A map file of each toolchain is generated with the given number of input
+sections, spread over the objects of a large build (BLE and nanostack
+builds link thousands of sections). Each file is parsed by the line by line
+parser memap used to have and by the current one, and their reports are
+checked to be the same.
+"""
+import re
+import sys
+import random
+from argparse import ArgumentParser
+from os import remove, close
+from os.path import join, abspath, dirname, getsize
+from tempfile import mkstemp
+from time import time
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tools.memap import MemapParser, RE_ARMCC
+
+RE_IAR = re.compile(
+    r'^\s+(.+)\s+(zero|const|ro code|inited|uninit)\s'
+    r'+0x(\w{8})\s+0x(\w+)\s+(.+)\s.+$')
+
+MODULES = ["features/FEATURE_BLE/source", "features/FEATURE_BLE/targets",
+           "features/nanostack/sal-stack-nanostack",
+           "features/nanostack/nanostack-libservice",
+           "features/mbedtls/src", "features/netsocket", "rtos/rtx5",
+           "drivers", "platform", "hal", "events/equeue",
+           "targets/TARGET_NORDIC/TARGET_NRF5"]
+SECTIONS = [".text", ".rodata", ".data", ".bss"]
+
+
+class LegacyMemapParser(MemapParser):
+    """The parsers of memap before the single pass engine"""
+
+    def check_new_section_gcc(self, line):
+        for i in self.all_sections:
+            if line.startswith(i):
+                return i
+        if line.startswith('.'):
+            return 'unknown'
+        else:
+            return False
+
+    def path_object_to_module_name(self, txt):
+        txt = txt.replace('\\', '/')
+        test_rex_mbed_os_name = re.match(r'^.+mbed-os\/(.+)\/(.+\.o)$', txt)
+        if test_rex_mbed_os_name:
+            object_name = test_rex_mbed_os_name.group(2)
+            data = test_rex_mbed_os_name.group(1).split('/')
+            if len(data) == 1:
+                module_name = data[0]
+            else:
+                module_name = data[0] + '/' + data[1]
+            return [module_name, object_name]
+        return ['Misc', ""]
+
+    def parse_section_gcc(self, line):
+        rex_address_len_name = re.compile(
+            r'^\s+.*0x(\w{8,16})\s+0x(\w+)\s(.+)$')
+        test_address_len_name = re.match(rex_address_len_name, line)
+        if test_address_len_name:
+            if int(test_address_len_name.group(2), 16) == 0:
+                return ["", 0]
+            m_name, _ = self.path_object_to_module_name(
+                test_address_len_name.group(3))
+            return [m_name, int(test_address_len_name.group(2), 16)]
+        test_address_len = re.match(
+            r'^\s+\*fill\*\s+0x(\w{8,16})\s+0x(\w+).*$', line)
+        if test_address_len and int(test_address_len.group(2), 16):
+            return ['Fill', int(test_address_len.group(2), 16)]
+        return ["", 0]
+
+    def parse_map_file_gcc(self, file_desc):
+        current_section = 'unknown'
+        with file_desc as infile:
+            for line in infile:
+                if line.startswith('Linker script and memory map'):
+                    break
+            for line in infile:
+                change_section = self.check_new_section_gcc(line)
+                if change_section == "OUTPUT":
+                    break
+                elif change_section != False:
+                    current_section = change_section
+                [module_name, module_size] = self.parse_section_gcc(line)
+                if module_size and module_name:
+                    self.module_add(module_name, module_size, current_section)
+
+    def parse_section_armcc(self, line):
+        test_rex_armcc = re.match(RE_ARMCC, line)
+        if test_rex_armcc:
+            size = int(test_rex_armcc.group(2), 16)
+            if test_rex_armcc.group(4) == 'RO':
+                section = '.text'
+            elif test_rex_armcc.group(3) == 'Data':
+                section = '.data'
+            else:
+                section = '.bss'
+            module_name = self.object_to_module.get(test_rex_armcc.group(6),
+                                                    'Misc')
+            return [module_name, size, section]
+        return ["", 0, ""]
+
+    def parse_map_file_armcc(self, file_desc):
+        with file_desc as infile:
+            for line in infile:
+                if line.startswith('    Base Addr    Size'):
+                    break
+            for line in infile:
+                [name, size, section] = self.parse_section_armcc(line)
+                if size and name and section:
+                    self.module_add(name, size, section)
+
+    def parse_section_iar(self, line):
+        test_rex_iar = re.match(RE_IAR, line)
+        if test_rex_iar:
+            size = int(test_rex_iar.group(4), 16)
+            kind = test_rex_iar.group(2)
+            if kind == 'const' or kind == 'ro code':
+                section = '.text'
+            elif kind == 'zero' or kind == 'uninit':
+                if test_rex_iar.group(1)[0:4] == 'HEAP':
+                    section = '.heap'
+                elif test_rex_iar.group(1)[0:6] == 'CSTACK':
+                    section = '.stack'
+                else:
+                    section = '.bss'
+            else:
+                section = '.data'
+            module_name = self.object_to_module.get(test_rex_iar.group(5),
+                                                    'Misc')
+            return [module_name, size, section]
+        return ["", 0, ""]
+
+    def parse_map_file_iar(self, file_desc):
+        with file_desc as infile:
+            for line in infile:
+                if line.startswith('  Section  '):
+                    break
+            for line in infile:
+                [name, size, section] = self.parse_section_iar(line)
+                if size and name and section:
+                    self.module_add(name, size, section)
+
+
+def objects(count):
+    """Object paths relative to the build directory, and their modules"""
+    return [("mbed-os/%s/dir_%d/object_%d.o" % (MODULES[i % len(MODULES)],
+                                                  i % 7, i), i)
+            for i in range(count)]
+
+
+def gcc_map(out, sections, objs):
+    out.write("Archive member included to satisfy reference by file (symbol)\n\n"
+              "Discarded input sections\n\n"
+              " .text          0x00000000        0x0 ./BUILD/mbed-os/x.o\n\n"
+              "Linker script and memory map\n\n"
+              "LOAD ./BUILD/mbed-os/main.o\n")
+    address = 0
+    for section in SECTIONS:
+        out.write("\n%-15s 0x%08x    0x10000\n *(%s*)\n" % (section, address,
+                                                          section))
+        for index in range(sections // len(SECTIONS)):
+            path, number = random.choice(objs)
+            size = random.randint(0, 512)
+            name = "%s._Z%dfunction_%dv" % (section, number, index)
+            out.write(" %s\n                0x%08x %10s ./BUILD/K64F/GCC_ARM/%s\n"
+                      "                0x%08x                function_%d()\n"
+                      % (name, address, hex(size), path, address, index))
+            address += size
+            if size % 4:
+                out.write(" *fill*         0x%08x %10s \n"
+                          % (address, hex(4 - size % 4)))
+                address += 4 - size % 4
+    out.write("\nOUTPUT(./BUILD/app.elf elf32-littlearm)\n")
+
+
+def armcc_map(out, sections, objs):
+    out.write("Memory Map of the image\n\n"
+              "    Base Addr    Size         Type   Attr      Idx    E Section Name        Object\n\n")
+    address = 0
+    for index in range(sections):
+        path, number = random.choice(objs)
+        size = random.randint(0, 512)
+        kind, attr = random.choice([("Code", "RO"), ("Data", "RO"),
+                                    ("Data", "RW"), ("Zero", "RW")])
+        out.write("    0x%08x   0x%08x   %-6s %-9s %-6d %s i._Z%dfunction_%dv %s\n"
+                  % (address, size, kind, attr, index, "*" if index % 5 else " ",
+                     number, index, path.split("/")[-1]))
+        address += size
+
+
+def iar_map(out, sections, objs):
+    out.write("*** PLACEMENT SUMMARY\n\n"
+              "  Section            Kind        Address    Size  Object\n"
+              "  -------            ----        -------    ----  ------\n")
+    address = 0
+    for index in range(sections):
+        path, number = random.choice(objs)
+        size = random.randint(0, 512)
+        section, kind = random.choice([(".text", "ro code"), (".rodata", "const"),
+                                       (".data", "inited"), (".bss", "zero")])
+        out.write("  %-18s %-8s  0x%08x  %6s  %s [%d]\n"
+                  % (section, kind, address, hex(size), path.split("/")[-1],
+                     number % 40))
+        address += size
+
+
+def parse(parser_class, map_file, toolchain, objs):
+    parser = parser_class()
+    for path, _ in objs:
+        parser.object_to_module[path.split("/")[-1]] = \
+            parser.path_object_to_module_name("./BUILD/" + path)[0]
+    start = time()
+    parser.parse(map_file, toolchain)
+    return time() - start, parser.mem_report
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-s", "--sections", type=int, default=60000,
+                        help="input sections in each map file")
+    parser.add_argument("--objects", type=int, default=2000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    random.seed(0)
+    objs = objects(options.objects)
+    for toolchain, generate in (("GCC_ARM", gcc_map), ("ARM", armcc_map),
+                                ("IAR", iar_map)):
+        handle, map_file = mkstemp(suffix=".map")
+        close(handle)
+        try:
+            with open(map_file, "w") as out:
+                generate(out, options.sections, objs)
+            times = {}
+            reports = {}
+            for parser_class in (LegacyMemapParser, MemapParser):
+                runs = [parse(parser_class, map_file, toolchain, objs)
+                        for _ in range(options.repeat)]
+                times[parser_class] = min(duration for duration, _ in runs)
+                reports[parser_class] = runs[0][1]
+            print "%-8s %5.1f MB: line by line %6.3fs, single pass %6.3fs, %4.1fx%s" % (
+                toolchain, getsize(map_file) / 1e6, times[LegacyMemapParser],
+                times[MemapParser],
+                times[LegacyMemapParser] / times[MemapParser],
+                "" if reports[LegacyMemapParser] == reports[MemapParser] else
+                " (reports differ)")
+        finally:
+            remove(map_file)
+
+
+if __name__ == "__main__":
+    main()
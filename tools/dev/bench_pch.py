@@ -0,0 +1,76 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the TESTS tree built with and without a precompiled mbed.h
+
+mbed-os is built once, as test.py does, then the tests are built from
+scratch twice: without and with the precompiled header.
+"""
+import sys
+import fnmatch
+from argparse import ArgumentParser
+from os.path import join, abspath, dirname
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tools.build_api import build_library
+from tools.test_api import find_tests, build_tests
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-m", "--mcu", default="K64F")
+    parser.add_argument("-t", "--toolchain", default="GCC_ARM")
+    parser.add_argument("-n", "--names", default="*",
+                        help="pattern of the names of the tests to build")
+    parser.add_argument("-j", "--jobs", type=int, default=0)
+    options = parser.parse_args()
+
+    tests = dict((name, path) for name, path
+                 in find_tests(ROOT, options.mcu, options.toolchain).items()
+                 if fnmatch.fnmatch(name, options.names))
+
+    work_dir = mkdtemp()
+    try:
+        lib_dir = join(work_dir, "mbed-os")
+        # build_tests adds to the report of the library build
+        report, properties = {}, {}
+        build_library([ROOT], lib_dir, options.mcu, options.toolchain,
+                      archive=False, silent=True, jobs=options.jobs,
+                      name="mbed-build", report=report, properties=properties)
+
+        for pch in (False, True):
+            start = time()
+            success, _ = build_tests(tests, [lib_dir],
+                                     join(work_dir, "tests-%s" % pch),
+                                     options.mcu, options.toolchain,
+                                     jobs=options.jobs, silent=True, pch=pch,
+                                     continue_on_build_fail=True,
+                                     report=report, properties=properties)
+            print "%d tests, precompiled header %-3s: %7.2fs%s" % (
+                len(tests), "on" if pch else "off", time() - start,
+                "" if success else " (with failures)")
+    finally:
+        rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the Resources of the mbed-os tree: size, add, copy, relative_to
+
+The tree is scanned once. The features are then added to copies of the
+resources, as the configuration does, the copies are copied as build_tests
+and export do, and made relative as the exporters do.
+"""
+import sys
+from argparse import ArgumentParser
+from copy import deepcopy
+from os.path import join, abspath, dirname
+from time import time
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tools.targets import TARGET_MAP
+from tools.toolchains import TOOLCHAIN_CLASSES
+
+
+def size_of(obj, seen=None):
+    """The bytes taken by an object and everything it refers to, each object
+    counted once
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(size_of(key, seen) + size_of(value, seen)
+                    for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(size_of(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += size_of(obj.__dict__, seen)
+    return size
+
+
+def timed(func, inputs):
+    """The mean time of func over the inputs, and its last result"""
+    start = time()
+    for value in inputs:
+        result = func(value)
+    return (time() - start) / len(inputs), result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-m", "--mcu", default="K64F")
+    parser.add_argument("-t", "--toolchain", default="GCC_ARM")
+    parser.add_argument("-p", "--path", default=ROOT)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    toolchain = TOOLCHAIN_CLASSES[options.toolchain](TARGET_MAP[options.mcu],
+                                                     silent=True)
+    resources = toolchain.scan_resources(options.path)
+
+    def add_features(added):
+        # Features enabling more features are added again
+        for _ in range(2):
+            for feature in resources.features.values():
+                added.add(feature)
+        return added
+
+    def relative_to(relative):
+        relative.relative_to(options.path)
+        return relative
+
+    copies = lambda: [deepcopy(resources) for _ in range(options.repeat)]
+    add_time, added = timed(add_features, copies())
+    copy_time, _ = timed(deepcopy, [added] * options.repeat)
+    relative_time, _ = timed(relative_to, copies())
+    print "%d sources, %d headers, %d include directories after add" % (
+        len(added.c_sources + added.cpp_sources + added.s_sources),
+        len(added.headers), len(added.inc_dirs))
+    print "size:        %8.1f KiB (%.1f KiB after add)" % (
+        size_of(resources) / 1024.0, size_of(added) / 1024.0)
+    print "add:         %8.2f ms" % (add_time * 1000)
+    print "deepcopy:    %8.2f ms" % (copy_time * 1000)
+    print "relative_to: %8.2f ms" % (relative_time * 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the resource scan of the mbed-os tree, serial and parallel
+
+The tree is scanned with each number of threads in turn, and the resources
+found by every scan are checked against the ones of the serial scan. Run it
+after dropping the page cache to measure a cold scan. With --cache, the scans
+of each number of threads share a scan cache: the first scan fills it, the
+next ones only check it.
+"""
+import sys
+from argparse import ArgumentParser
+from os.path import join, abspath, dirname
+from time import time
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from tools.targets import TARGET_MAP
+from tools.toolchains import TOOLCHAIN_CLASSES
+from tools.scan_cache import ScanCache
+
+
+def resources_state(resources):
+    state = dict(resources.__dict__)
+    state['features'] = dict((name, resources_state(feature)) for name, feature
+                             in resources.features.items())
+    return state
+
+
+def scan(mcu, toolchain_name, path, threads, cache=None):
+    toolchain = TOOLCHAIN_CLASSES[toolchain_name](TARGET_MAP[mcu], silent=True)
+    toolchain.scan_threads = threads
+    toolchain.scan_cache = cache
+    start = time()
+    resources = toolchain.scan_resources(path)
+    return time() - start, resources
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-m", "--mcu", default="K64F")
+    parser.add_argument("-t", "--toolchain", default="GCC_ARM")
+    parser.add_argument("-p", "--path", default=ROOT)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--cache", action="store_true",
+                        help="scan through a scan cache")
+    options = parser.parse_args()
+
+    serial = None
+    for threads in options.threads:
+        times = []
+        cache = ScanCache() if options.cache else None
+        for _ in range(options.repeat):
+            duration, resources = scan(options.mcu, options.toolchain,
+                                       options.path, threads, cache)
+            times.append(duration)
+        state = resources_state(resources)
+        if serial is None:
+            _, resources = scan(options.mcu, options.toolchain, options.path, 1)
+            serial = resources_state(resources)
+        print "%2d threads: best %7.3fs, first %7.3fs%s" % (
+            threads, min(times), times[0],
+            "" if state == serial else " (resources differ from serial scan)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Benchmark of the overhead of the parallel compile scheduler per 1,000 jobs
+
+The jobs sleep for a fixed time instead of running a compiler, so the wall
+time of a queue beyond jobs * duration / workers is the time spent
+scheduling them. The queue goes through the polling loop compile_queue used
+to have and through the completion order iteration it has now.
+"""
+import sys
+from argparse import ArgumentParser
+from multiprocessing import Pool, TimeoutError
+from os.path import join, abspath, dirname
+from time import time, sleep
+
+ROOT = abspath(join(dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+
+def sleep_worker(job):
+    sleep(job['duration'])
+    return job
+
+
+def legacy_queue(pool, queue, workers):
+    """The polling loop of compile_queue before completion order iteration"""
+    results = []
+    for job in queue:
+        results.append(pool.apply_async(sleep_worker, [job]))
+
+    done = []
+    while len(results):
+        sleep(0.01)
+        pending = 0
+        for r in results:
+            if r._ready is True:
+                done.append(r.get())
+                results.remove(r)
+            else:
+                pending += 1
+                if pending >= workers:
+                    break
+    return done
+
+
+def completion_queue(pool, queue, _):
+    """The completion order iteration of compile_queue"""
+    done = []
+    results = pool.imap_unordered(sleep_worker, queue)
+    for _ in range(len(queue)):
+        try:
+            done.append(results.next(300))
+        except TimeoutError:
+            raise RuntimeError("No job finished in 300 seconds")
+    return done
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("-n", "--jobs", type=int, default=1000,
+                        help="number of jobs in the queue (default: 1000)")
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("-d", "--duration", type=float, default=0.005,
+                        help="seconds each job takes (default: 0.005)")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    options = parser.parse_args()
+
+    queue = [{'source': "main%d.c" % index, 'duration': options.duration}
+             for index in range(options.jobs)]
+    ideal = options.jobs * options.duration / options.workers
+    print "%d jobs of %.1f ms on %d workers: %.3fs ideal" % (
+        options.jobs, options.duration * 1000, options.workers, ideal)
+
+    pool = Pool(processes=options.workers)
+    try:
+        for name, scheduler in (("polling", legacy_queue),
+                                ("completion order", completion_queue)):
+            times = []
+            for _ in range(options.repeat):
+                start = time()
+                done = scheduler(pool, queue, options.workers)
+                times.append(time() - start)
+                assert sorted(job['source'] for job in done) == \
+                    sorted(job['source'] for job in queue)
+            # Seconds over the ideal time, in milliseconds per 1,000 jobs
+            overhead = (min(times) - ideal) * 1000000 / options.jobs
+            print "%-16s: best %7.3fs, %6.1f ms overhead per 1,000 jobs" % (
+                name, min(times), overhead)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import mmap
+import struct
+from collections import namedtuple
+
+# Section types
+SHT_SYMTAB = 2
+SHT_NOBITS = 8
+
+# Section flags
+SHF_WRITE = 0x1
+SHF_ALLOC = 0x2
+SHF_EXECINSTR = 0x4
+
+# Symbol types and bindings
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_SECTION = 3
+STT_FILE = 4
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STB_WEAK = 2
+
+# Section indexes of undefined symbols, and of the escape to the extended
+# section numbering
+SHN_UNDEF = 0
+SHN_XINDEX = 0xffff
+
+EM_ARM = 40
+
+# Layouts of the file header after its identification bytes, of the section
+# headers and of the symbols, per class (32 or 64 bit)
+HEADER_LAYOUTS = {1: "HHIIIIIHHHHHH", 2: "HHIQQQIHHHHHH"}
+SECTION_LAYOUTS = {1: "IIIIIIIIII", 2: "IIQQQQIIQQ"}
+SYMBOL_LAYOUTS = {1: "IIIBBH", 2: "IBBHQQ"}
+
+Section = namedtuple("Section", "name type flags address offset size link "
+                                "entsize")
+Symbol = namedtuple("Symbol", "name value size type bind shndx")
+
+
+class ElfFile(object):
+    """The sections and the symbols of an ELF file, linked image or object
+
+    The file is mapped in memory and only its section headers, symbol table
+    and string tables are read, whatever the size of the code and the debug
+    information it holds. Both classes and byte orders are read, so the
+    objects and images of all the toolchains go through the same code.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as elf_in:
+            try:
+                self._data = mmap.mmap(elf_in.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error) as error:
+                raise ValueError("%s is not an ELF file: %s" % (path, error))
+        try:
+            self._read_sections(path)
+        except (ValueError, struct.error, IndexError) as error:
+            self.close()
+            raise ValueError("%s is not a valid ELF file: %s" % (path, error))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Unmap the file"""
+        self._data.close()
+
+    def _read_sections(self, path):
+        data = self._data
+        if data[:4] != "\x7fELF" or data[4] not in "\x01\x02" or \
+           data[5] not in "\x01\x02":
+            raise ValueError("%s is not an ELF file" % path)
+        elf_class = ord(data[4])
+        byte_order = "<" if data[5] == "\x01" else ">"
+        section_layout = struct.Struct(byte_order + SECTION_LAYOUTS[elf_class])
+        self._symbol_layout = struct.Struct(byte_order +
+                                            SYMBOL_LAYOUTS[elf_class])
+        self._elf_class = elf_class
+
+        (_, self.machine, _, _, _, shoff, _, _, _, _, _, shnum,
+         shstrndx) = struct.unpack_from(
+             byte_order + HEADER_LAYOUTS[elf_class], data, 16)
+        headers = []
+        if shoff:
+            first = section_layout.unpack_from(data, shoff)
+            # Files with many sections keep their count and the index of the
+            # section names in the first section header
+            shnum = shnum or first[5]
+            if shstrndx == SHN_XINDEX:
+                shstrndx = first[6]
+            headers = [section_layout.unpack_from(
+                data, shoff + index * section_layout.size)
+                       for index in range(shnum)]
+
+        names_offset = headers[shstrndx][4] if headers else 0
+        self.sections = [
+            Section(self._string(names_offset + header[0]), header[1],
+                    header[2], header[3], header[4], header[5], header[6],
+                    header[9])
+            for header in headers]
+
+    def _string(self, offset):
+        end = self._data.find("\0", offset)
+        if end < 0:
+            raise ValueError("unterminated string at %d" % offset)
+        return self._data[offset:end]
+
+    def symbols(self):
+        """The symbols of the symbol table, in the order of the table: the
+        local symbols of each file follow the STT_FILE symbol naming it
+        """
+        data = self._data
+        layout = self._symbol_layout
+        for section in self.sections:
+            if section.type != SHT_SYMTAB:
+                continue
+            names_offset = self.sections[section.link].offset
+            entsize = section.entsize or layout.size
+            for offset in xrange(section.offset + entsize,
+                                 section.offset + section.size, entsize):
+                if self._elf_class == 1:
+                    name, value, size, info, _, shndx = \
+                        layout.unpack_from(data, offset)
+                else:
+                    name, info, _, shndx, value, size = \
+                        layout.unpack_from(data, offset)
+                yield Symbol(self._string(names_offset + name), value, size,
+                             info & 0xf, info >> 4, shndx)
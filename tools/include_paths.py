@@ -0,0 +1,178 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from collections import defaultdict
+from heapq import heapify, heappush, heappop
+from os.path import dirname, normpath
+
+
+def _ancestors(path):
+    """The directories above a path, innermost first"""
+    while True:
+        parent = dirname(path)
+        if parent == path or not parent:
+            return
+        yield parent
+        path = parent
+
+
+class IncludePaths(object):
+    """The include paths of a compile, reduced to the directories headers can
+    be found through and ordered by how often they were used
+
+    A scan puts every directory it visits on the include path, and the
+    preprocessor looks for each included file in every one of them in turn
+    until it finds it. An include directory is kept when a header of the
+    resources, or a dependency of the previous build, is found in it or below
+    it; the others cannot resolve any #include. The kept directories are then
+    sorted by the number of dependencies of the previous build, as recorded by
+    the dependency index, that were found through them.
+
+    Every name under which a known header can be included resolves to the
+    same file as with the original include paths: when several directories
+    hold a header of the same name, the one it was found in first stays ahead
+    of the others. The resolution of every name is checked again once the
+    directories are sorted, and the original order is kept if any changed.
+    """
+
+    def __init__(self, dep_index=None):
+        # Times each dependency was listed by a dependency file
+        self.hits = defaultdict(int)
+        if dep_index:
+            for _, _, ids in dep_index.tus.itervalues():
+                for file_id in ids:
+                    self.hits[normpath(dep_index.paths[file_id])] += 1
+
+        self.paths = []
+        self.removed = 0
+        self.reordered = False
+        # Estimated look ups of the dependencies of the previous build, with
+        # the original and the optimized include paths
+        self.probes = 0
+        self.optimized_probes = 0
+
+    @staticmethod
+    def _found_in(dirs, headers):
+        """Per include name, the set of directories it is found in"""
+        dir_set = set(dirs)
+        found = defaultdict(set)
+        for header in headers:
+            for directory in _ancestors(header):
+                if directory in dir_set:
+                    found[header[len(directory):].lstrip("/\\")].add(directory)
+        return found
+
+    @staticmethod
+    def _resolve(dirs, found):
+        """The directory each include name is found in first"""
+        rank = dict((directory, index) for index, directory in enumerate(dirs))
+        resolved = {}
+        for name, candidates in found.iteritems():
+            ranked = [directory for directory in candidates if directory in rank]
+            resolved[name] = min(ranked, key=rank.get) if ranked else None
+        return resolved
+
+    def _count_probes(self, dirs, found_through):
+        """The directories looked into to find the dependencies of the
+        previous build: up to the one a dependency is found through, all of
+        them for the dependencies found outside of the include paths
+        """
+        rank = dict((directory, index) for index, directory in enumerate(dirs))
+        return sum(hits * (rank[found_through[dep]] + 1
+                           if dep in found_through else len(dirs))
+                   for dep, hits in self.hits.iteritems())
+
+    @staticmethod
+    def _order(dirs, found, resolved, hits):
+        """The directories sorted by decreasing hits, each directory staying
+        ahead of the ones holding a header of the same name as one found in it
+        """
+        rank = dict((directory, index) for index, directory in enumerate(dirs))
+        # The directories each directory must stay ahead of, and the number of
+        # directories each one must stay behind
+        ahead_of = defaultdict(set)
+        for name, candidates in found.iteritems():
+            for directory in candidates:
+                if directory != resolved[name] and directory in rank:
+                    ahead_of[resolved[name]].add(directory)
+        behind = defaultdict(int)
+        for others in ahead_of.itervalues():
+            for directory in others:
+                behind[directory] += 1
+
+        # The constraints follow the original order, so there is always one
+        # directory free to go next
+        ready = [(-hits[directory], rank[directory], directory)
+                 for directory in dirs if not behind[directory]]
+        heapify(ready)
+        ordered = []
+        while ready:
+            _, _, directory = heappop(ready)
+            ordered.append(directory)
+            for other in ahead_of[directory]:
+                behind[other] -= 1
+                if not behind[other]:
+                    heappush(ready, (-hits[other], rank[other], other))
+        return ordered
+
+    def optimize(self, inc_dirs, headers, keep=None):
+        """The include paths to compile with
+
+        Positional arguments:
+        inc_dirs - the include paths, in the order the compiler searches them
+        headers - the headers of the resources of the build
+
+        Keyword arguments:
+        keep - include paths to keep even when no known header is found in them
+        """
+        dirs = [normpath(directory) for directory in inc_dirs]
+        originals = dict(zip(dirs, inc_dirs))
+        known = set(normpath(header) for header in headers)
+        known.update(self.hits)
+        found = self._found_in(dirs, known)
+        resolved = self._resolve(dirs, found)
+
+        used = set(normpath(directory) for directory in keep or [])
+        for candidates in found.itervalues():
+            used.update(candidates)
+        kept = [directory for directory in dirs if directory in used]
+
+        # A dependency is taken to be included by its shortest name, as the
+        # directory of every header is on the include paths
+        found_through = {}
+        hits = defaultdict(int)
+        for dep, count in self.hits.iteritems():
+            for directory in _ancestors(dep):
+                if resolved.get(dep[len(directory):].lstrip("/\\")) == directory:
+                    found_through[dep] = directory
+                    hits[directory] += count
+                    break
+        ordered = self._order(kept, found, resolved, hits)
+        if self._resolve(ordered, found) != resolved:
+            ordered = kept
+
+        self.paths = [originals[directory] for directory in ordered]
+        self.removed = len(dirs) - len(kept)
+        self.reordered = ordered != kept
+        self.probes = self._count_probes(dirs, found_through)
+        self.optimized_probes = self._count_probes(ordered, found_through)
+        return self.paths
+
+    def probes_avoided(self):
+        """The look ups of files the optimized include paths would have saved
+        in the previous build
+        """
+        return self.probes - self.optimized_probes
@@ -0,0 +1,194 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from multiprocessing import Lock, Value, cpu_count
+from time import sleep
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Memory a compiler is assumed to need until one was measured, in bytes
+DEFAULT_COMPILER_MEMORY = 256 * 1024 * 1024
+
+# Seconds between two checks of a job waiting for a slot
+POLL_INTERVAL = 0.05
+
+# Seconds a job waits for the lock of the controller before it starts
+# anyway, should a process have been killed while holding it
+MAX_WAIT = 30
+
+# The controller of the build, inherited by the processes it forks
+_CONTROLLER = None
+
+
+def available_memory():
+    """Bytes of memory that can be used without swapping, or None when the
+    system does not tell
+    """
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, ValueError, IndexError):
+        pass
+    return None
+
+
+def cpu_load():
+    """The number of processes running or waiting for a CPU, or None when
+    unknown. The load average is only used where the current count is not
+    available: it lags a minute behind, so the compilers that just finished
+    would still hold slots back
+    """
+    try:
+        with open("/proc/loadavg") as loadavg:
+            # The fourth field is "running/total", the reader included
+            return int(loadavg.read().split()[3].split("/")[0]) - 1
+    except (IOError, ValueError, IndexError):
+        pass
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+def children_peak_memory():
+    """The largest resident set of the terminated child processes, in bytes"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class JobController(object):
+    """Decides how many compilers run at once, across all the processes of a
+    build
+
+    Up to max_jobs compilers run while the machine can take them. Fewer are
+    started when the available memory would not hold one more compiler on top
+    of the reserve, or when other processes keep the CPUs busy. Slots come
+    back as memory is freed and the load goes down. The counters live in
+    shared memory, so that the compile pool and the processes of build_tests
+    forked after the controller share them.
+    """
+
+    def __init__(self, max_jobs, memory_reserve):
+        self.max_jobs = max_jobs
+        self.memory_reserve = memory_reserve
+        self.cpus = cpu_count()
+        self._lock = Lock()
+        self._active = Value('i', 0, lock=False)
+        # Largest resident set of a compiler seen so far, 0 until measured
+        self._compiler_memory = Value('d', 0, lock=False)
+
+    def compiler_memory(self):
+        return self._compiler_memory.value or DEFAULT_COMPILER_MEMORY
+
+    def allowed(self, active, memory=None, load=None):
+        """The number of compilers that may run now
+
+        Positional arguments:
+        active - the number of compilers running
+
+        Keyword arguments:
+        memory - the available memory in bytes, if known
+        load - the number of processes using the CPUs, if known
+        """
+        slots = self.max_jobs
+        if memory is not None:
+            slots = min(slots, active + int((memory - self.memory_reserve)
+                                            // self.compiler_memory()))
+        if load is not None:
+            # The running compilers are part of the load
+            slots = min(slots, self.cpus - int(max(0.0, load - active)))
+        return max(slots, 1)
+
+    def acquire(self):
+        """Wait for a compiler slot
+
+        A job waits as long as other compilers run and there is no room for
+        one more, so that a build short of memory does not start them all
+        """
+        while True:
+            memory, load = available_memory(), cpu_load()
+            # A process killed while holding the lock must not stop the build
+            if not self._lock.acquire(timeout=MAX_WAIT):
+                return
+            try:
+                active = self._active.value
+                if active == 0 or active < self.allowed(active, memory, load):
+                    self._active.value = active + 1
+                    return
+            finally:
+                self._lock.release()
+            sleep(POLL_INTERVAL)
+
+    def release(self, peak_memory=None):
+        """Give a compiler slot back
+
+        Keyword arguments:
+        peak_memory - the largest resident set of the compilers of the job
+        """
+        if not self._lock.acquire(timeout=MAX_WAIT):
+            return
+        try:
+            self._active.value = max(0, self._active.value - 1)
+            if peak_memory:
+                self._compiler_memory.value = max(self._compiler_memory.value,
+                                                  peak_memory)
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        """Forget the running compilers, after they were killed"""
+        self._active.value = 0
+
+
+def start_job_control(max_jobs, memory_reserve):
+    """Set up the controller of the build before its processes are forked.
+    The first caller sets the number of jobs, later callers share it
+    """
+    global _CONTROLLER
+    if _CONTROLLER is None:
+        _CONTROLLER = JobController(max_jobs, memory_reserve)
+    return _CONTROLLER
+
+
+def reset_job_control():
+    if _CONTROLLER is not None:
+        _CONTROLLER.reset()
+
+
+@contextmanager
+def job_slot():
+    """Run the body as one compile job of the build, when the build has a
+    controller
+    """
+    if _CONTROLLER is None:
+        yield
+        return
+    _CONTROLLER.acquire()
+    try:
+        yield
+    finally:
+        _CONTROLLER.release(children_peak_memory())
@@ -51,7 +51,7 @@ from utils import argparse_filestring_type
 from utils import argparse_many
 from utils import argparse_dir_not_parent
 from tools.toolchains import mbedToolchain, TOOLCHAIN_CLASSES, TOOLCHAIN_PATHS
-from tools.settings import CLI_COLOR_MAP
+from tools.settings import CLI_COLOR_MAP, SIZE_HISTORY
 
 if __name__ == '__main__':
     # Parse Options
@@ -73,6 +73,54 @@ if __name__ == '__main__':
                       default=0,
                       help="Number of concurrent jobs. Default: 0/auto (based on host machine's number of CPUs)")
 
+    parser.add_argument("--reproducible",
+                      action="store_true",
+                      dest="reproducible",
+                      default=False,
+                      help="Make identical inputs produce bit-identical objects and binaries")
+
+    parser.add_argument("--pch",
+                      action="store_true",
+                      dest="pch",
+                      default=False,
+                      help="Precompile mbed.h for the C++ sources that include it first (GCC_ARM and ARM)")
+
+    parser.add_argument("--unity",
+                      action="store_true",
+                      dest="unity",
+                      default=False,
+                      help="Compile the sources of each directory together in unity files")
+
+    parser.add_argument("-k", "--keep-going",
+                      action="store_true",
+                      dest="keep_going",
+                      default=False,
+                      help="Compile every source even when some fail, and report all the errors")
+
+    parser.add_argument("--optimize-includes",
+                      action="store_true",
+                      dest="optimize_includes",
+                      default=False,
+                      help="Only pass the include paths headers are found through, the most used first")
+
+    parser.add_argument("--compile-timeout",
+                      dest="compile_timeout",
+                      default=None,
+                      type=int,
+                      help="Seconds a parallel compile may go without any compiler output or finished job before it is stopped. Default: COMPILE_TIMEOUT of the settings")
+
+    parser.add_argument("--memap-diff",
+                      dest="memap_diff",
+                      default=None,
+                      type=argparse_filestring_type,
+                      metavar="OLD",
+                      help="Rank the biggest size changes since an earlier build, given by its map file or memap json output")
+
+    parser.add_argument("--size-history",
+                      dest="size_history",
+                      default=SIZE_HISTORY or None,
+                      help="Record the memory footprint of the build in this SQLite database, and fail the build when it grew beyond the limits of the settings")
+
     parser.add_argument("-v", "--verbose",
                       action="store_true",
                       dest="verbose",
@@ -288,7 +336,15 @@ if __name__ == '__main__':
                                      inc_dirs=[dirname(MBED_LIBRARIES)],
                                      build_profile=extract_profile(parser,
                                                                    options,
-                                                                   toolchain))
+                                                                   toolchain),
+                                     reproducible=options.reproducible,
+                                     pch=options.pch,
+                                     unity=options.unity,
+                                     keep_going=options.keep_going,
+                                     optimize_includes=options.optimize_includes,
+                                     compile_timeout=options.compile_timeout,
+                                     memap_diff=options.memap_diff,
+                                     size_history=options.size_history)
             print 'Image: %s'% bin_file
 
             if options.disk:
@@ -8,18 +8,209 @@ import re
 import csv
 import json
 import argparse
+from array import array
+from collections import defaultdict
 from prettytable import PrettyTable
 
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
 from utils import argparse_filestring_type, \
     argparse_lowercase_hyphen_type, argparse_uppercase_type
+from elf_file import ElfFile, SHF_ALLOC, SHF_WRITE, SHT_NOBITS, STT_NOTYPE, \
+    STT_OBJECT, STT_FUNC, STT_FILE, STB_LOCAL, STB_WEAK, SHN_UNDEF, EM_ARM
 
 DEBUG = False
 
 RE_ARMCC = re.compile(
     r'^\s+0x(\w{8})\s+0x(\w{8})\s+(\w+)\s+(\w+)\s+(\d+)\s+[*]?.+\s+(.+)$')
 RE_IAR = re.compile(
-    r'^\s+(.+)\s+(zero|const|ro code|inited|uninit)\s'
+    r'^\s+(.+?)\s+(zero|const|ro code|inited|uninit)\s'
     r'+0x(\w{8})\s+0x(\w+)\s+(.+)\s.+$')
+RE_GCC = re.compile(r'^\s+.*0x(\w{8,16})\s+0x(\w+)\s(.+)$')
+RE_GCC_FILL = re.compile(r'^\s+\*fill\*\s+0x(\w{8,16})\s+0x(\w+).*$')
+RE_MBED_OS_OBJECT = re.compile(r'^.+mbed-os\/(.+)\/(.+\.o)$')
+RE_OBJECT = re.compile(r'^.+\/(.+\.o\)*)$')
+
+# Sections of the armcc map file entries that are not read only, per type
+ARMCC_RW_SECTIONS = {'Data': '.data', 'Zero': '.bss'}
+
+# Sections of the IAR map file entries, per kind
+IAR_SECTIONS = {'const': '.text', 'ro code': '.text', 'inited': '.data',
+                'zero': '.bss', 'uninit': '.bss'}
+
+# Bytes read from a map file at once
+MAP_FILE_BUFFER = 1024 * 1024
+
+
+class SymbolTable(object):
+    """The input sections of a map file: name, address, size, section, object
+    and module of each
+
+    With -ffunction-sections and -fdata-sections, as in the mbed build
+    profiles, each input section holds a single symbol and is named after it.
+    The addresses and sizes are kept in arrays. The section, object and module
+    of an input section are stored once per object and section, and the
+    entries only hold their index.
+    """
+
+    FIELDS = ('symbol', 'address', 'size', 'section', 'object', 'module')
+
+    def __init__(self):
+        self.names = []
+        self.addresses = array('L')
+        self.sizes = array('L')
+        self.origins = array('i')
+        # The distinct (section, object, module) of the input sections
+        self.origin_list = []
+        self.origin_ids = {}
+
+    def origin(self, section, object_name, module):
+        """The index of a section, object and module in the table
+
+        Positional arguments:
+        section - the section of the memory report an input section counts in
+        object_name - the object file it comes from
+        module - the module of the object file
+        """
+        origin = (section, object_name, module)
+        origin_id = self.origin_ids.get(origin)
+        if origin_id is None:
+            origin_id = self.origin_ids[origin] = len(self.origin_list)
+            self.origin_list.append(origin)
+        return origin_id
+
+    def appender(self):
+        """A function adding an input section, given its name, address, size
+        and origin index. The parsers add thousands of them
+        """
+        names, addresses = self.names.append, self.addresses.append
+        sizes, origins = self.sizes.append, self.origins.append
+        def append(name, address, size, origin_id):
+            names(name)
+            addresses(address)
+            sizes(size)
+            origins(origin_id)
+        return append
+
+    def add(self, name, address, size, section, object_name, module):
+        """Add an input section
+
+        Positional arguments:
+        name - the name of the input section
+        address - its address
+        size - its size
+        section - the section of the memory report it counts in
+        object_name - the object file it comes from
+        module - the module of the object file
+        """
+        self.appender()(name, address, size,
+                        self.origin(section, object_name, module))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __iter__(self):
+        """Iterate over the input sections as tuples of FIELDS"""
+        origin_list = self.origin_list
+        for name, address, size, origin_id in zip(
+                self.names, self.addresses, self.sizes, self.origins):
+            section, object_name, module = origin_list[origin_id]
+            yield name, address, size, section, object_name, module
+
+    def to_list(self):
+        """The input sections as a list of dicts of FIELDS"""
+        return [dict(zip(self.FIELDS, row)) for row in self]
+
+    def totals(self):
+        """The total size per (section, module, object, symbol)"""
+        totals = defaultdict(int)
+        for name, _, size, section, object_name, module in self:
+            totals[(section, module, object_name, name)] += size
+        return dict(totals)
+
+
+class ObjectModules(object):
+    """The module of each object of a build directory, for the map files of
+    the toolchains that only name the objects (see search_objects)
+
+    compile_sources records the objects it builds, so the map file of every
+    link is read with the modules of the objects next to it without walking
+    the build directory again.
+    """
+
+    FILENAME = ".mbed_object_modules.json"
+
+    def __init__(self, build_path):
+        self.build_path = build_path
+        self.path = os.path.join(build_path, self.FILENAME)
+        try:
+            with open(self.path) as modules_in:
+                self.modules = json.load(modules_in)
+        except (IOError, ValueError):
+            self.modules = {}
+        self._changed = False
+
+    def _key(self, obj):
+        return os.path.relpath(obj, self.build_path).replace('\\', '/')
+
+    def update(self, objects):
+        """Record the modules of the objects of a compile, and forget the
+        objects that were removed from the build directory
+
+        Positional arguments:
+        objects - the paths of the objects
+        """
+        memap = MemapParser()
+        keys = set()
+        for obj in objects:
+            key = self._key(obj)
+            keys.add(key)
+            if key not in self.modules:
+                self.modules[key] = memap.path_object_to_module_name(obj)[0]
+                self._changed = True
+        for key in [key for key in self.modules if key not in keys]:
+            if not os.path.exists(os.path.join(self.build_path, key)):
+                del self.modules[key]
+                self._changed = True
+
+    def object_to_module(self, detailed_misc=False):
+        """The module of each object of the mbed-os directory of the build,
+        by object file name. An object name used twice keeps the module of
+        its first path
+
+        Keyword arguments:
+        detailed_misc - give each object its own module, as MemapParser does
+        """
+        result = {}
+        for key in sorted(self.modules):
+            if not key.startswith('mbed-os/'):
+                continue
+            object_name = key.rsplit('/', 1)[-1]
+            if object_name in result:
+                continue
+            module_name = self.modules[key]
+            if detailed_misc:
+                module_name += '/' + object_name
+            result[object_name] = module_name
+        return result
+
+    def save(self):
+        """Write the modules back to the build directory"""
+        if not self._changed:
+            return
+        temp = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(temp, "w") as modules_out:
+                json.dump(self.modules, modules_out, indent=0, sort_keys=True)
+            os.rename(temp, self.path)
+        except (IOError, OSError):
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+        self._changed = False
+
 
 class MemapParser(object):
     """An object that represents parsed results, parses the memory map files,
@@ -51,12 +242,20 @@ class MemapParser(object):
         self.all_sections = self.sections + self.other_sections + \
                             self.misc_flash_sections + ('unknown', 'OUTPUT')
 
+        # Matches the known section a line of a gcc map file starts with,
+        # the first in the order of all_sections
+        self.re_section_gcc = re.compile(
+            '|'.join(re.escape(section) for section in self.all_sections))
+
         # list of all object files and mappting to module names
         self.object_to_module = dict()
 
         # Memory report (sections + summary)
         self.mem_report = []
 
+        # Input sections of the map file
+        self.symbols = SymbolTable()
+
         # Just the memory summary section
         self.mem_summary = dict()
 
@@ -88,10 +287,10 @@ class MemapParser(object):
         line - the line to check for a new section
         """
 
-        for i in self.all_sections:
-            if line.startswith(i):
-                # should name of the section (assuming it's a known one)
-                return i
+        known_section = self.re_section_gcc.match(line)
+        if known_section:
+            # should name of the section (assuming it's a known one)
+            return known_section.group(0)
 
         if line.startswith('.'):
             return 'unknown'     # all others are classified are unknown
@@ -107,8 +306,7 @@ class MemapParser(object):
         """
 
         txt = txt.replace('\\', '/')
-        rex_mbed_os_name = r'^.+mbed-os\/(.+)\/(.+\.o)$'
-        test_rex_mbed_os_name = re.match(rex_mbed_os_name, txt)
+        test_rex_mbed_os_name = RE_MBED_OS_OBJECT.match(txt)
 
         if test_rex_mbed_os_name:
 
@@ -127,8 +325,7 @@ class MemapParser(object):
                 return [module_name, object_name]
             
         elif self.detailed_misc:           
-            rex_obj_name = r'^.+\/(.+\.o\)*)$'
-            test_rex_obj_name = re.match(rex_obj_name, txt)
+            test_rex_obj_name = RE_OBJECT.match(txt)
             if test_rex_obj_name:
                 object_name = test_rex_obj_name.group(1)
                 return ['Misc/' + object_name, ""]        
@@ -147,10 +344,7 @@ class MemapParser(object):
         Positional arguments:
         line - the line to parse a section from
         """
-        rex_address_len_name = re.compile(
-            r'^\s+.*0x(\w{8,16})\s+0x(\w+)\s(.+)$')
-
-        test_address_len_name = re.match(rex_address_len_name, line)
+        test_address_len_name = RE_GCC.match(line)
 
         if test_address_len_name:
 
@@ -165,8 +359,7 @@ class MemapParser(object):
         else: # special corner case for *fill* sections
             #  example
             # *fill*         0x0000abe4        0x4
-            rex_address_len = r'^\s+\*fill\*\s+0x(\w{8,16})\s+0x(\w+).*$'
-            test_address_len = re.match(rex_address_len, line)
+            test_address_len = RE_GCC_FILL.match(line)
 
             if test_address_len:
                 if int(test_address_len.group(2), 16) == 0: # size == 0
@@ -181,11 +374,28 @@ class MemapParser(object):
     def parse_map_file_gcc(self, file_desc):
         """ Main logic to decode gcc map files
 
+        The file is read in a single pass. Only the lines starting with a
+        non blank character can start a section, and only the lines holding
+        two hexadecimal numbers can be a module entry: the other lines are
+        skipped before any regular expression is run. The module of each
+        object path is only computed once. Every input section is added to
+        the symbol table.
+
         Positional arguments:
         file_desc - a stream object to parse as a gcc map file
         """
 
         current_section = 'unknown'
+        match_entry = RE_GCC.match
+        match_fill = RE_GCC_FILL.match
+        modules = self.modules
+        origin = self.symbols.origin
+        add_symbol = self.symbols.appender()
+        # Module and symbol table origin of each object path, per section
+        paths = {}
+        section_paths = paths.setdefault(current_section, {})
+        # Name of an input section too long to share the line of its entry
+        input_section = ''
 
         with file_desc as infile:
 
@@ -198,17 +408,55 @@ class MemapParser(object):
             # Start decoding the map file
             for line in infile:
 
-                change_section = self.check_new_section_gcc(line)
-
-                if change_section == "OUTPUT": # finish parsing file: exit
-                    break
-                elif change_section != False:
-                    current_section = change_section
-
-                [module_name, module_size] = self.parse_section_gcc(line)
-
-                if module_size == 0 or module_name == "":
-                    pass
+                if not line[:1].isspace():
+                    change_section = self.check_new_section_gcc(line)
+
+                    if change_section == "OUTPUT": # finish parsing file: exit
+                        break
+                    elif change_section != False:
+                        current_section = change_section
+                        section_paths = paths.setdefault(current_section, {})
+                    continue
+
+                start = line.find('0x')
+                if start < 0 or line.find('0x', start + 2) < 0:
+                    if line[1:2] == '.':
+                        input_section = line.strip()
+                    continue
+
+                entry = match_entry(line)
+                if entry:
+                    address, module_size, path = entry.groups()
+                    module_size = int(module_size, 16)
+                    if not module_size:
+                        continue
+                    known = section_paths.get(path)
+                    if known is None:
+                        module_name, _ = self.path_object_to_module_name(path)
+                        object_name = path.replace('\\', '/').rsplit('/', 1)[-1]
+                        known = section_paths[path] = (
+                            module_name,
+                            origin(current_section, object_name, module_name))
+                    module_name, origin_id = known
+                    if line[1:2] == '.':
+                        name = line[1:line.find(' ', 1)]
+                    else:
+                        name = input_section
+                else: # special corner case for *fill* sections
+                    entry = match_fill(line)
+                    if not entry:
+                        continue
+                    address, module_size = entry.groups()
+                    module_size = int(module_size, 16)
+                    if not module_size:
+                        continue
+                    module_name, name = 'Fill', '*fill*'
+                    origin_id = origin(current_section, '', module_name)
+
+                add_symbol(name, int(address, 16), module_size, origin_id)
+
+                if module_name in modules:
+                    modules[module_name][current_section] += module_size
                 else:
                     self.module_add(module_name, module_size, current_section)
 
@@ -230,7 +478,7 @@ class MemapParser(object):
         line - the line to parse the section data from
         """
 
-        test_rex_armcc = re.match(RE_ARMCC, line)
+        test_rex_armcc = RE_ARMCC.match(line)
 
         if test_rex_armcc:
 
@@ -277,7 +525,7 @@ class MemapParser(object):
         line - the line to parse section data from
         """
 
-        test_rex_iar = re.match(RE_IAR, line)
+        test_rex_iar = RE_IAR.match(line)
 
         if test_rex_iar:
 
@@ -320,6 +568,14 @@ class MemapParser(object):
         file_desc - a file like object to parse as an armc5 map file
         """
 
+        match_entry = RE_ARMCC.match
+        modules = self.modules
+        object_to_module = self.object_to_module
+        origin = self.symbols.origin
+        add_symbol = self.symbols.appender()
+        # Module and symbol table origin of each object, per section
+        objects = defaultdict(dict)
+
         with file_desc as infile:
 
             # Search area to parse
@@ -330,12 +586,41 @@ class MemapParser(object):
             # Start decoding the map file
             for line in infile:
 
-                [name, size, section] = self.parse_section_armcc(line)
-
-                if size == 0 or name == "" or section == "":
-                    pass
+                if '0x' not in line:
+                    continue
+                entry = match_entry(line)
+                if not entry:
+                    continue
+                address, size, kind, attr, _, object_name = entry.groups()
+                size = int(size, 16)
+                if not size:
+                    continue
+
+                if attr == 'RO':
+                    section = '.text'
+                else:
+                    section = ARMCC_RW_SECTIONS.get(kind)
+                    if section is None:
+                        # Warned on stderr, not to mix with the reports
+                        sys.stderr.write("Warning: unknown section kind %s "
+                                         "of %s in armcc map file, "
+                                         "skipped\n" % (kind, object_name))
+                        continue
+
+                # lookup object in dictionary and return module name
+                known = objects[section].get(object_name)
+                if known is None:
+                    name = object_to_module.get(object_name, 'Misc')
+                    known = objects[section][object_name] = (
+                        name, origin(section, object_name, name))
+                name, origin_id = known
+                if name in modules:
+                    modules[name][section] += size
                 else:
                     self.module_add(name, size, section)
+                # The input section is the column before the object
+                add_symbol(line.rsplit(None, 2)[-2], int(address, 16), size,
+                           origin_id)
 
     def parse_map_file_iar(self, file_desc):
         """ Main logic to decode IAR map files
@@ -344,6 +629,14 @@ class MemapParser(object):
         file_desc - a file like object to parse as an IAR map file
         """
 
+        match_entry = RE_IAR.match
+        modules = self.modules
+        object_to_module = self.object_to_module
+        origin = self.symbols.origin
+        add_symbol = self.symbols.appender()
+        # Module and symbol table origin of each object, per section
+        objects = defaultdict(dict)
+
         with file_desc as infile:
 
             # Search area to parse
@@ -354,18 +647,46 @@ class MemapParser(object):
             # Start decoding the map file
             for line in infile:
 
-                [name, size, section] = self.parse_section_iar(line)
-
-                if size == 0 or name == "" or section == "":
-                    pass
+                if '0x' not in line:
+                    continue
+                entry = match_entry(line)
+                if not entry:
+                    continue
+                section_name, kind, address, size, object_name = entry.groups()
+                size = int(size, 16)
+                if not size:
+                    continue
+
+                section = IAR_SECTIONS[kind]
+                if section == '.bss':
+                    if section_name[0:4] == 'HEAP':
+                        section = '.heap'
+                    elif section_name[0:6] == 'CSTACK':
+                        section = '.stack'
+
+                # lookup object in dictionary and return module name
+                known = objects[section].get(object_name)
+                if known is None:
+                    name = object_to_module.get(object_name, 'Misc')
+                    known = objects[section][object_name] = (
+                        name, origin(section, object_name, name))
+                name, origin_id = known
+                if name in modules:
+                    modules[name][section] += size
                 else:
                     self.module_add(name, size, section)
+                add_symbol(section_name.strip(), int(address, 16), size,
+                           origin_id)
 
     def search_objects(self, path):
         """ Searches for object files and creates mapping: object --> module
 
+        The modules recorded by the build are used when the build directory
+        has them (see ObjectModules), the mbed-os directory of the build is
+        walked otherwise
+
         Positional arguments:
-        path - the path to an object file
+        path - the path to a map file
         """
 
         path = path.replace('\\', '/')
@@ -380,6 +701,14 @@ class MemapParser(object):
             print "Warning: this doesn't look like an mbed project"
             return
 
+        if os.path.exists(os.path.join(test_rex.group(1),
+                                       ObjectModules.FILENAME)):
+            object_modules = ObjectModules(test_rex.group(1))
+            for object_name, module_name in object_modules.object_to_module(
+                    self.detailed_misc).iteritems():
+                self.object_to_module.setdefault(object_name, module_name)
+            return
+
         for root, _, obj_files in os.walk(search_path):
             for obj_file in obj_files:
                 if obj_file.endswith(".o"):
@@ -397,7 +726,7 @@ class MemapParser(object):
                     else:
                         self.object_to_module.update({object_name:module_name})
 
-    export_formats = ["json", "csv-ci", "table"]
+    export_formats = ["json", "csv-ci", "table", "symbols"]
 
     def generate_output(self, export_format, file_output=None):
         """ Generates summary of memory map data
@@ -422,7 +751,8 @@ class MemapParser(object):
 
         to_call = {'json': self.generate_json,
                    'csv-ci': self.generate_csv,
-                   'table': self.generate_table}[export_format]
+                   'table': self.generate_table,
+                   'symbols': self.generate_symbols}[export_format]
         output = to_call(file_desc)
 
         if file_desc is not sys.stdout:
@@ -441,6 +771,17 @@ class MemapParser(object):
 
         return None
 
+    def generate_symbols(self, file_desc):
+        """Generate a json file of the input sections of a memory map
+
+        Positional arguments:
+        file_desc - the file to write out the symbol table to
+        """
+        json.dump(self.symbols.to_list(), file_desc, indent=1)
+        file_desc.write('\n')
+
+        return None
+
     def generate_csv(self, file_desc):
         """Generate a CSV file from a memoy map
 
@@ -591,7 +932,7 @@ class MemapParser(object):
 
         result = True
         try:
-            with open(mapfile, 'r') as file_input:
+            with open(mapfile, 'r', MAP_FILE_BUFFER) as file_input:
                 if toolchain == "ARM" or toolchain == "ARM_STD" or\
                    toolchain == "ARM_MICRO":
                     self.search_objects(os.path.abspath(mapfile))
@@ -611,6 +952,266 @@ class MemapParser(object):
             result = False
         return result
 
+    def elf_section(self, section):
+        """ The section of the report an allocated section of an image counts
+        in: by its name when it is one of the sections of the report, by its
+        flags otherwise (the armcc and IAR images name their sections after
+        the regions of the scatter file or of the placement directives)
+
+        Positional arguments:
+        section - the section of the image
+        """
+        name = section.name.lower()
+        if 'heap' in name:
+            return '.heap'
+        if 'stack' in name:
+            return '.stack'
+        match = self.re_section_gcc.match(section.name)
+        if match and match.group(0) not in ('unknown', 'OUTPUT'):
+            return match.group(0)
+        if section.type == SHT_NOBITS:
+            return '.bss'
+        if section.flags & SHF_WRITE:
+            return '.data'
+        return '.text'
+
+    def object_definitions(self, objects):
+        """ The object and module defining each symbol of the objects: by
+        name for the global symbols, a strong definition before a weak one,
+        and by file and name for the local symbols
+
+        Positional arguments:
+        objects - the paths of the objects
+        """
+        global_symbols = {}
+        weak_symbols = set()
+        local_symbols = {}
+        for obj in sorted(objects):
+            module_name, _ = self.path_object_to_module_name(obj)
+            origin = (os.path.basename(obj), module_name)
+            try:
+                elf = ElfFile(obj)
+            except (IOError, ValueError):
+                continue
+            with elf:
+                file_name = None
+                for symbol in elf.symbols():
+                    if symbol.type == STT_FILE:
+                        file_name = symbol.name
+                    elif symbol.shndx == SHN_UNDEF or not symbol.name:
+                        continue
+                    elif symbol.bind == STB_LOCAL:
+                        local_symbols.setdefault((file_name, symbol.name),
+                                                 origin)
+                    elif symbol.name not in global_symbols or \
+                         (symbol.name in weak_symbols and
+                          symbol.bind != STB_WEAK):
+                        global_symbols[symbol.name] = origin
+                        if symbol.bind == STB_WEAK:
+                            weak_symbols.add(symbol.name)
+                        else:
+                            weak_symbols.discard(symbol.name)
+        return global_symbols, local_symbols
+
+    def parse_elf(self, elf_path, objects=None):
+        """ Read the memory usage of a linked image from its section headers
+        and its symbol table, the same way for all the toolchains
+
+        The allocated sections of the image give the totals of the report.
+        Each symbol counts in the module of the object defining it; the
+        symbols of the libraries, and the bytes no symbol covers, count in
+        Misc
+
+        Positional arguments:
+        elf_path - the ELF file of the image
+
+        Keyword arguments:
+        objects - the paths of the objects linked in the image, by default
+                  the ones recorded in the build directory of the image (see
+                  ObjectModules), or found in it
+        """
+        if objects is None:
+            build_path = os.path.dirname(elf_path)
+            if os.path.exists(os.path.join(build_path,
+                                           ObjectModules.FILENAME)):
+                objects = [os.path.join(build_path, key) for key
+                           in ObjectModules(build_path).modules]
+            else:
+                objects = [os.path.join(root, obj_file)
+                           for root, _, obj_files in os.walk(build_path)
+                           for obj_file in obj_files
+                           if obj_file.endswith('.o')]
+
+        try:
+            elf = ElfFile(elf_path)
+        except IOError as error:
+            print "I/O error({0}): {1}".format(error.errno, error.strerror)
+            return False
+        except ValueError as error:
+            print "Error: %s" % error
+            return False
+
+        global_symbols, local_symbols = self.object_definitions(objects)
+        with elf:
+            report_sections = dict(
+                (index, self.elf_section(section))
+                for index, section in enumerate(elf.sections)
+                if section.flags & SHF_ALLOC and section.size)
+
+            # Symbols with a size, per section of the image. Function symbols
+            # of Thumb code have their lowest bit set
+            thumb = elf.machine == EM_ARM
+            found = []
+            file_name = None
+            for symbol in elf.symbols():
+                if symbol.type == STT_FILE:
+                    file_name = symbol.name
+                    continue
+                if symbol.shndx not in report_sections or not symbol.size \
+                   or not symbol.name or \
+                   symbol.type not in (STT_NOTYPE, STT_OBJECT, STT_FUNC):
+                    continue
+                address = symbol.value
+                if thumb and symbol.type == STT_FUNC:
+                    address &= ~1
+                if symbol.bind == STB_LOCAL:
+                    origin = local_symbols.get((file_name, symbol.name))
+                else:
+                    origin = global_symbols.get(symbol.name)
+                found.append((symbol.shndx, address, -symbol.size,
+                              symbol.name) + (origin or ('', 'Misc')))
+            found.sort()
+
+            # Aliases and symbols overlapping one already counted are skipped
+            covered = defaultdict(int)
+            end = 0
+            last_index = None
+            for index, address, size, name, object_name, module_name in found:
+                section = elf.sections[index]
+                if index != last_index:
+                    last_index, end = index, section.address
+                size = min(-size, section.address + section.size - address)
+                if address < end or size <= 0:
+                    continue
+                end = address + size
+                covered[index] += size
+                self.module_add(module_name, size, report_sections[index])
+                self.symbols.add(name, address, size, report_sections[index],
+                                 object_name, module_name)
+
+            for index, report_section in sorted(report_sections.items()):
+                section = elf.sections[index]
+                rest = section.size - covered[index]
+                if rest:
+                    self.module_add('Misc', rest, report_section)
+                    self.symbols.add(section.name, section.address, rest,
+                                     report_section, '', 'Misc')
+
+        self.compute_report()
+        return True
+
+def load_sizes(path, toolchain=None):
+    """ The sizes of a build per (section, module, object, symbol), from a map
+    file, an ELF image or the 'json' or 'symbols' output of memap. The 'json'
+    output only gives sizes per module: their object and symbol are None
+
+    Positional arguments:
+    path - the map file, image or memap output to load
+
+    Keyword arguments:
+    toolchain - the toolchain that made the map file
+    """
+    if path.endswith('.json'):
+        with open(path) as file_input:
+            data = json.load(file_input)
+        sizes = defaultdict(int)
+        for entry in data:
+            if 'symbol' in entry:
+                sizes[(entry['section'], entry['module'], entry['object'],
+                       entry['symbol'])] += entry['size']
+            elif 'module' in entry:
+                for section, size in entry['size'].items():
+                    sizes[(section, entry['module'], None, None)] += size
+        return dict(sizes)
+
+    memap = MemapParser()
+    if path.endswith('.elf'):
+        if memap.parse_elf(path) is False:
+            raise ValueError("cannot read %s" % path)
+    elif not toolchain or memap.parse(path, toolchain) is False:
+        raise ValueError("cannot parse %s as a %s map file" % (path, toolchain))
+    return memap.symbols.totals()
+
+
+def diff_sizes(old, new):
+    """ The entries of two builds that changed size, the biggest growth
+    first, as (section, module, object, symbol, old size, new size) tuples.
+    Both builds are compared per module when either only has module sizes
+
+    Positional arguments:
+    old - the sizes of the earlier build, as given by load_sizes
+    new - the sizes of the later build
+    """
+    if any(key[3] is None for key in old.keys() + new.keys()):
+        per_module = []
+        for sizes in (old, new):
+            totals = defaultdict(int)
+            for (section, module, _, _), size in sizes.items():
+                if section in MemapParser.print_sections:
+                    totals[(section, module, None, None)] += size
+            per_module.append(totals)
+        old, new = per_module
+
+    changes = [key + (old.get(key, 0), new.get(key, 0))
+               for key in set(old) | set(new)
+               if old.get(key, 0) != new.get(key, 0)]
+    changes.sort(key=lambda change: (change[4] - change[5], change[:4]))
+    return changes
+
+
+def generate_diff_table(changes, top=20):
+    """ Generate a table of the biggest size changes between two builds
+
+    Positional arguments:
+    changes - the changes, as given by diff_sizes
+
+    Keyword arguments:
+    top - the number of entries that grew the most, and that shrank the
+          most, to show
+
+    Returns: string of the generated table
+    """
+    per_symbol = any(change[3] is not None for change in changes)
+    columns = ['Section', 'Module']
+    if per_symbol:
+        columns += ['Object', 'Symbol']
+    columns += ['Old', 'New', 'Delta']
+
+    table = PrettyTable(columns)
+    for column in columns:
+        table.align[column] = 'r' if column in ('Old', 'New', 'Delta') else 'l'
+
+    grown = [change for change in changes if change[5] > change[4]]
+    shrunk = [change for change in changes if change[5] < change[4]]
+    for change in grown[:top] + list(reversed(shrunk[-top:])):
+        row = list(change[:4] if per_symbol else change[:2])
+        row += [change[4], change[5], "%+d" % (change[5] - change[4])]
+        table.add_row(row)
+
+    output = table.get_string()
+    output += '\n'
+
+    totals = defaultdict(int)
+    for change in changes:
+        totals[change[0]] += change[5] - change[4]
+    output += "Size change: %s\n" % (", ".join(
+        "%s %+d" % (section, totals[section])
+        for section in sorted(totals)) or "none")
+    output += "%d entries grew, %d shrank\n" % (len(grown), len(shrunk))
+
+    return output
+
+
 def main():
     """Entry Point"""
 
@@ -622,13 +1223,15 @@ def main():
         version)
 
     parser.add_argument(
-        'file', type=argparse_filestring_type, help='memory map file')
+        'file', type=argparse_filestring_type,
+        help='memory map file or ELF image, or json or symbols output with '
+        '--diff')
 
     parser.add_argument(
         '-t', '--toolchain', dest='toolchain',
         help='select a toolchain used to build the memory map file (%s)' %
         ", ".join(MemapParser.toolchains),
-        required=True,
+        required=False,
         type=argparse_uppercase_type(MemapParser.toolchains, "toolchain"))
 
     parser.add_argument(
@@ -645,6 +1248,16 @@ def main():
     
     parser.add_argument('-d', '--detailed', action='store_true', help='Displays the elements in "Misc" in a detailed fashion', required=False)
 
+    parser.add_argument(
+        '--diff', dest='diff', type=argparse_filestring_type, metavar='OLD',
+        help='compare with an earlier build given by its map file, its image '
+        'or its json or symbols output, and rank the biggest size changes '
+        '(table or json export)', required=False)
+
+    parser.add_argument(
+        '--top', dest='top', type=int, default=20,
+        help='entries that changed the most shown by --diff (default: 20)')
+
     # Parse/run command
     if len(sys.argv) <= 1:
         parser.print_help()
@@ -653,11 +1266,42 @@ def main():
 
     args = parser.parse_args()
 
+    maps = [path for path in (args.file, args.diff)
+            if path and not path.endswith(('.json', '.elf'))]
+    if maps and not args.toolchain:
+        parser.error("argument -t/--toolchain is required to parse %s" %
+                     maps[0])
+
+    if args.diff:
+        try:
+            changes = diff_sizes(load_sizes(args.diff, args.toolchain),
+                                 load_sizes(args.file, args.toolchain))
+        except (IOError, ValueError) as error:
+            print "Error: %s" % error
+            sys.exit(1)
+        if args.export == 'json':
+            output = json.dumps([{'section': section, 'module': module,
+                                  'object': obj, 'symbol': symbol,
+                                  'old': old, 'new': new}
+                                 for section, module, obj, symbol, old, new
+                                 in changes], indent=4) + '\n'
+        else:
+            output = generate_diff_table(changes, args.top)
+        if args.output:
+            with open(args.output, 'wb') as file_output:
+                file_output.write(output)
+        else:
+            print output
+        sys.exit(0)
+
     # Create memap object
     memap = MemapParser(detailed_misc=args.detailed)
 
-    # Parse and decode a map file
-    if args.file and args.toolchain:
+    # Parse and decode a map file, or read an image
+    if args.file.endswith('.elf'):
+        if memap.parse_elf(args.file) is False:
+            sys.exit(0)
+    elif args.file and args.toolchain:
         if memap.parse(args.file, args.toolchain) is False:
             sys.exit(0)
 
@@ -0,0 +1,517 @@
+#! /usr/bin/env python2
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Compile worker daemon, running the compile jobs of builds on other hosts
+
+Builds send their jobs to the workers listed in COMPILE_WORKERS (see
+settings.py). Each job comes with the files it reads, addressed by content:
+a worker only receives the files it has not seen before, and lays them out
+in a private directory that mirrors the paths of the build host. The worker
+runs arbitrary compiler command lines, so it must only be reachable from
+trusted build hosts.
+"""
+import re
+import sys
+import json
+import zlib
+import socket
+import struct
+import fnmatch
+from base64 import b64encode, b64decode
+from hashlib import md5
+from os import stat, rename, getpid, remove
+from os.path import join, exists, dirname, abspath, basename, splitext, \
+    relpath, normpath
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread, Lock, current_thread
+from Queue import Queue, Empty
+from SocketServer import ThreadingTCPServer, BaseRequestHandler
+from multiprocessing import TimeoutError
+
+ROOT = abspath(join(dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from tools.utils import mkdir, compile_worker
+from tools.compile_cache import RESPONSE_FILE_OPTIONS
+
+DEFAULT_PORT = 7420
+
+# Executables a worker runs unless told otherwise
+DEFAULT_ALLOWED = ["arm-none-eabi-*", "armcc", "armasm", "armcc.exe",
+                   "armasm.exe", "iccarm", "iasmarm", "iccarm.exe",
+                   "iasmarm.exe"]
+
+# Files of the build directory that name other files, and whose paths are
+# mapped into the directory of the worker: response files, unity sources
+TEXT_EXTENSIONS = ['.txt', '.c', '.cpp', '.h']
+
+# Options that make the compiler driver run programs other than the allowed
+# executables: gcc -wrapper, plugins, program prefixes and spec files
+FORBIDDEN_OPTIONS = re.compile(r"^(?:-wrapper$|-fplugin|-B|--?specs)")
+
+
+def send_message(sock, message):
+    """Send a JSON message, prefixed by its length"""
+    data = json.dumps(message)
+    sock.sendall(struct.pack(">I", len(data)) + data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+
+def recv_message(sock):
+    """Receive a message sent by send_message, or None when the connection is
+    closed
+    """
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    data = _recv_exactly(sock, struct.unpack(">I", header)[0])
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+def encode_blob(data):
+    return b64encode(zlib.compress(data))
+
+
+def decode_blob(blob):
+    return zlib.decompress(b64decode(blob))
+
+
+def path_roots(paths):
+    """The deepest directories containing each group of absolute paths that
+    share their first component; the worker maps them to its own directory
+    """
+    groups = {}
+    for path in paths:
+        top = path.split("/")[1]
+        groups.setdefault(top, []).append(dirname(path))
+    roots = []
+    for dirs in groups.values():
+        parts = dirs[0].split("/")
+        for path in dirs[1:]:
+            other = path.split("/")
+            common = 0
+            while (common < len(parts) and common < len(other) and
+                   parts[common] == other[common]):
+                common += 1
+            parts = parts[:common]
+        roots.append("/".join(parts) or "/")
+    return sorted(roots)
+
+
+class ContentStore(object):
+    """Files received by a worker, named by their md5"""
+
+    def __init__(self, path):
+        self.path = path
+        mkdir(path)
+
+    def _path(self, digest):
+        return join(self.path, digest[:2], digest)
+
+    def has(self, digest):
+        return exists(self._path(digest))
+
+    def put(self, digest, data):
+        if md5(data).hexdigest() != digest:
+            raise ValueError("Content does not match digest %s" % digest)
+        path = self._path(digest)
+        mkdir(dirname(path))
+        temp = "%s.%d.%d.tmp" % (path, getpid(), current_thread().ident)
+        with open(temp, "wb") as blob_out:
+            blob_out.write(data)
+        rename(temp, path)
+
+    def read(self, digest):
+        with open(self._path(digest), "rb") as blob_in:
+            return blob_in.read()
+
+
+class _WorkerHandler(BaseRequestHandler):
+    """One build host connection. Its files are laid out in a directory of
+    its own, removed when the connection closes
+    """
+
+    def handle(self):
+        sandbox = mkdtemp(dir=self.server.work_root)
+        # Digest of each file already laid out, by path on the build host
+        placed = {}
+        try:
+            while True:
+                request = recv_message(self.request)
+                if request is None:
+                    break
+                if request['op'] == 'missing':
+                    reply = {'missing': [digest for digest in request['digests']
+                                         if not self.server.store.has(digest)]}
+                elif request['op'] == 'put':
+                    for digest, blob in request['blobs'].iteritems():
+                        self.server.store.put(digest, decode_blob(blob))
+                    reply = {}
+                elif request['op'] == 'compile':
+                    reply = self.server.compile(sandbox, placed, request)
+                else:
+                    reply = {'error': "Unknown operation %s" % request['op']}
+                send_message(self.request, reply)
+        finally:
+            rmtree(sandbox, ignore_errors=True)
+
+
+class CompileServer(ThreadingTCPServer):
+    """The compile worker daemon"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, work_root, allowed=None, toolchain_dir=None):
+        """
+        Positional arguments:
+        address - the (host, port) to listen on
+        work_root - where to keep received files and the job directories
+
+        Keyword arguments:
+        allowed - patterns of the executable names the jobs may run
+        toolchain_dir - where the compilers are, when they are not installed
+                        at the same path as on the build hosts
+        """
+        ThreadingTCPServer.__init__(self, address, _WorkerHandler)
+        self.work_root = work_root
+        self.store = ContentStore(join(work_root, "objects"))
+        self.allowed = DEFAULT_ALLOWED if allowed is None else allowed
+        self.toolchain_dir = toolchain_dir
+
+    def _executable(self, executable):
+        name = basename(executable)
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in self.allowed):
+            raise ValueError("%s is not an allowed executable" % name)
+        if self.toolchain_dir:
+            return join(self.toolchain_dir, name)
+        return executable
+
+    @staticmethod
+    def _sandbox_path(sandbox, path):
+        """The path of the directory of a connection a path of the build host
+        is moved to. Raises ValueError when it would be outside of it
+        """
+        target = normpath(join(sandbox, path.lstrip("/")))
+        if target != sandbox and not target.startswith(join(sandbox, "")):
+            raise ValueError("%s is outside of the job directory" % path)
+        return target
+
+    @staticmethod
+    def _check_paths(arg, work_dir, sandbox):
+        """Raise ValueError when an argument names a path outside of the
+        directory of the connection: absolute, or going up with ..
+        """
+        # The path may be the argument, or follow an option in it, as in
+        # -o/path, -save-temps=path or -Wp,-MD,path
+        candidates = [arg]
+        if arg.startswith("-") and not arg.startswith("--"):
+            candidates.append(arg[2:])
+        candidates.extend(arg.split("=", 1)[1:])
+        candidates.extend(arg.split(",")[1:])
+        for path in candidates:
+            if not path.startswith("/") and ".." not in path.split("/"):
+                continue
+            target = normpath(join(work_dir, path))
+            if target != sandbox and not target.startswith(join(sandbox, "")):
+                raise ValueError("%s is outside of the job directory" % arg)
+
+    @staticmethod
+    def _check_arguments(args, work_dir, sandbox):
+        """Raise ValueError when the arguments of a command, or the response
+        files they name, hold one of the FORBIDDEN_OPTIONS or a path outside
+        of the directory of the connection
+        """
+        args = list(reversed(args))
+        read = set()
+        previous = None
+        while args:
+            arg = args.pop()
+            response_file = None
+            if arg.startswith("@"):
+                response_file = arg[1:]
+            elif previous in RESPONSE_FILE_OPTIONS:
+                response_file = arg
+            elif FORBIDDEN_OPTIONS.match(arg):
+                raise ValueError("%s is not an allowed option" % arg)
+            previous = arg
+            if arg.startswith(("-D", "-U")):
+                # Macro values are not paths the compiler uses
+                continue
+            CompileServer._check_paths(response_file or arg, work_dir, sandbox)
+            if response_file:
+                path = normpath(join(work_dir, response_file))
+                if path not in read and exists(path):
+                    read.add(path)
+                    with open(path) as response_in:
+                        args.extend(reversed(response_in.read().split()))
+
+    def compile(self, sandbox, placed, request):
+        """Run a compile job in the directory of a connection
+
+        Paths of the build host that start with one of the roots of the
+        request are moved into the directory, in the command line and in the
+        text files of the build directory. The paths are moved back in the
+        compiler output and in the dependency files returned. Jobs naming
+        files outside of the directory, running other executables than the
+        allowed ones or using FORBIDDEN_OPTIONS are refused.
+        """
+        job = request['job']
+        pattern = re.compile("(?:%s)(?=[/\\\\\"'\\s]|$)" % "|".join(
+            re.escape(root) for root in sorted(request['roots'], key=len,
+                                               reverse=True)))
+        rewrite = lambda text: pattern.sub(lambda m: sandbox + m.group(0), text)
+
+        try:
+            for path, digest, is_text in request['files']:
+                if placed.get(path) == digest:
+                    continue
+                target = self._sandbox_path(sandbox, path)
+                data = self.store.read(digest)
+                if is_text:
+                    data = rewrite(data)
+                mkdir(dirname(target))
+                with open(target, "wb") as file_out:
+                    file_out.write(data)
+                placed[path] = digest
+            outputs = [(path, self._sandbox_path(sandbox, path))
+                       for path in request['outputs']]
+            for _, target in outputs:
+                mkdir(dirname(target))
+                if exists(target):
+                    remove(target)
+
+            commands = [[self._executable(command[0])] +
+                        [rewrite(arg) for arg in command[1:]]
+                        for command in job['commands']]
+            work_dir = self._sandbox_path(sandbox, job['work_dir'])
+            for command in commands:
+                self._check_arguments(command[1:], work_dir, sandbox)
+        except ValueError, e:
+            return {'error': str(e)}
+        result = compile_worker({
+            'source': job['source'],
+            'object': job['object'],
+            'commands': commands,
+            'work_dir': work_dir,
+            'chroot': None
+        })
+        result['commands'] = job['commands']
+        for res, command in zip(result['results'], job['commands']):
+            res['output'] = res['output'].replace(sandbox, "")
+            res['command'] = command
+
+        files = {}
+        for path, target in outputs:
+            if exists(target):
+                with open(target, "rb") as file_in:
+                    data = file_in.read()
+                if splitext(path)[1] == '.d':
+                    data = data.replace(sandbox, "")
+                files[path] = encode_blob(data)
+        return {'result': result, 'files': files}
+
+
+class RemotePool(object):
+    """Runs compile jobs on compile workers, in place of the worker pool of
+    the build session
+
+    Each worker is a "host:port" string, optionally followed by "/slots", the
+    number of jobs to send to it at once (1 by default). Jobs list the files
+    they read in an 'inputs' key. A job that a worker cannot run, or that
+    fails on it, is compiled locally, so that the diagnostics and the result
+    are the same as without workers.
+    """
+
+    def __init__(self, workers, build_dir):
+        self.build_dir = abspath(build_dir)
+        self.addresses = []
+        for worker in workers:
+            address, _, slots = worker.partition("/")
+            host, _, port = address.rpartition(":")
+            self.addresses.extend([(host or "localhost",
+                                    int(port or DEFAULT_PORT))]
+                                  * int(slots or 1))
+        self.jobs = Queue()
+        self.results = Queue()
+        self._digests = {}
+        self._lock = Lock()
+
+    def _digest(self, path):
+        info = stat(path)
+        key = (path, info.st_mtime, info.st_size)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            with open(path, "rb") as file_in:
+                digest = md5(file_in.read()).hexdigest()
+            with self._lock:
+                self._digests[key] = digest
+        return digest
+
+    def _is_text(self, path):
+        return (splitext(path)[1] in TEXT_EXTENSIONS and
+                not relpath(path, self.build_dir).startswith('..'))
+
+    def _remote(self, sock, sent, job):
+        work_dir = abspath(job['work_dir'])
+        inputs = sorted(set(abspath(join(work_dir, path))
+                            for path in job.get('inputs', [])
+                            if exists(join(work_dir, path))))
+        obj = abspath(join(work_dir, job['object']))
+        outputs = [obj, splitext(obj)[0] + '.d']
+        files = [[path, self._digest(path), self._is_text(path)]
+                 for path in inputs]
+        new_files = [entry for entry in files if sent.get(entry[0]) != entry[1]]
+
+        send_message(sock, {'op': 'missing',
+                            'digests': sorted(set(entry[1] for entry in new_files))})
+        missing = set(recv_message(sock)['missing'])
+        if missing:
+            blobs = {}
+            for path, digest, _ in new_files:
+                if digest in missing and digest not in blobs:
+                    with open(path, "rb") as file_in:
+                        blobs[digest] = encode_blob(file_in.read())
+            send_message(sock, {'op': 'put', 'blobs': blobs})
+            recv_message(sock)
+
+        send_message(sock, {
+            'op': 'compile',
+            'job': {'source': job['source'], 'object': job['object'],
+                    'commands': job['commands'], 'work_dir': work_dir},
+            'files': new_files,
+            'outputs': outputs,
+            'roots': path_roots(inputs + outputs + [join(work_dir, "")])
+        })
+        reply = recv_message(sock)
+        if reply is None or 'error' in reply:
+            return None
+        for path, digest, _ in new_files:
+            sent[path] = digest
+        for path, blob in reply['files'].iteritems():
+            mkdir(dirname(path))
+            with open(path, "wb") as file_out:
+                file_out.write(decode_blob(blob))
+        return reply['result']
+
+    def _run(self, address, func):
+        try:
+            sock = socket.create_connection(address)
+        except socket.error:
+            sock = None
+        # Digest of each file this worker has, by path
+        sent = {}
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except Empty:
+                break
+            result = None
+            if sock:
+                try:
+                    result = self._remote(sock, sent, job)
+                except (socket.error, ValueError, KeyError, TypeError):
+                    sock.close()
+                    sock = None
+            try:
+                if result is None or any(res['code'] != 0
+                                         for res in result['results']):
+                    result = func(job)
+            except Exception, e:
+                result = e
+            self.results.put(result)
+        if sock:
+            sock.close()
+
+    def imap_unordered(self, func, jobs):
+        """Run func over the jobs, on the workers when possible, and return an
+        iterator of the results in completion order, like Pool.imap_unordered
+        """
+        for job in jobs:
+            self.jobs.put(job)
+        for address in self.addresses:
+            thread = Thread(target=self._run, args=(address, func))
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def next(self, timeout=None):
+        try:
+            result = self.results.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def terminate(self):
+        """Drop the jobs that were not started yet"""
+        while True:
+            try:
+                self.jobs.get_nowait()
+            except Empty:
+                break
+
+
+def main():
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="localhost",
+                        help="Address to listen on. Default: localhost. The "
+                        "worker runs the compile jobs of any client: the "
+                        "address must only be reachable from trusted build "
+                        "hosts")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_PORT,
+                        help="Port to listen on. Default: %d" % DEFAULT_PORT)
+    parser.add_argument("-d", "--work-dir", required=True,
+                        help="Directory of the received files and the jobs")
+    parser.add_argument("--toolchain-dir", default=None,
+                        help="Directory of the compilers, when they are not "
+                        "installed at the same path as on the build hosts")
+    parser.add_argument("--allow", action="append", default=None,
+                        help="Pattern of the executable names jobs may run. "
+                        "Default: %s" % ", ".join(DEFAULT_ALLOWED))
+    options = parser.parse_args()
+
+    mkdir(options.work_dir)
+    server = CompileServer((options.host, options.port),
+                           abspath(options.work_dir), allowed=options.allow,
+                           toolchain_dir=options.toolchain_dir)
+    print "Compile worker listening on %s:%d" % server.server_address
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import marshal
+from os import stat, listdir, getpid, rename, remove
+from os.path import join, isdir, dirname
+from time import time
+
+from tools.utils import mkdir
+
+# Bump when the layout of the cache changes
+CACHE_VERSION = 1
+
+# Seconds during which a directory may still change without its modification
+# time changing, on file systems with a coarse time stamp
+RACY_WINDOW = 2
+
+# Directories above which only the ones met by the current process are saved
+MAX_ENTRIES = 200000
+
+# The cache of each cache directory, shared by the toolchains of a process
+_CACHES = {}
+
+
+def read_ignore_file(path):
+    """The patterns of an .mbedignore file"""
+    with open(path, "r") as ignore_file:
+        lines = [line.strip() for line in ignore_file.readlines()]
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+class ScanCache(object):
+    """The listings of the directories met by resource scans, kept between
+    scans and, with a cache directory, between builds
+
+    A listing is the names of the subdirectories and of the files of a
+    directory, in the order of os.walk, and the patterns of its .mbedignore
+    file. It does not depend on the target or the toolchain: the labels are
+    applied by the scan, on top of the listing. A listing is valid as long as
+    the modification time and the inode of its directory do not change, which
+    costs one stat per directory instead of a stat per file. The .mbedignore
+    patterns are checked against the modification time and size of the file.
+
+    A directory modified within RACY_WINDOW seconds of being listed is listed
+    again by the next scan, as its time stamp may not tell a later change.
+    """
+
+    FILENAME = "scan_cache.idx"
+
+    def __init__(self, cache_dir=None):
+        self.path = join(cache_dir, self.FILENAME) if cache_dir else None
+        # Per directory: [mtime, inode, subdirectories, files]
+        self.dirs = {}
+        # Per .mbedignore file: [mtime, size, patterns]
+        self.ignores = {}
+        if self.path:
+            try:
+                with open(self.path, "rb") as cache_in:
+                    version, self.dirs, self.ignores = marshal.load(cache_in)
+                if version != CACHE_VERSION:
+                    raise ValueError
+            except (IOError, ValueError, EOFError, TypeError):
+                self.dirs, self.ignores = {}, {}
+        self.used = set()
+        self.changed = False
+
+    @staticmethod
+    def _settled(mtime):
+        return time() - mtime > RACY_WINDOW
+
+    def listdir(self, path):
+        """The subdirectories and the files of a directory, or None when it
+        cannot be listed
+        """
+        try:
+            st = stat(path)
+        except OSError:
+            return None
+        self.used.add(path)
+        entry = self.dirs.get(path)
+        if entry is not None and entry[0] == st.st_mtime and entry[1] == st.st_ino:
+            return entry[2], entry[3]
+
+        try:
+            names = listdir(path)
+        except OSError:
+            return None
+        dirs, files = [], []
+        for name in names:
+            (dirs if isdir(join(path, name)) else files).append(name)
+        if self._settled(st.st_mtime):
+            self.dirs[path] = [st.st_mtime, st.st_ino, dirs, files]
+            self.changed = True
+        else:
+            self.dirs.pop(path, None)
+        return dirs, files
+
+    def walk(self, top):
+        """Walk a tree as os.walk(top, followlinks=True) does, removing names
+        from the yielded subdirectories to prune the walk
+        """
+        listing = self.listdir(top)
+        if listing is None:
+            return
+        dirs, files = list(listing[0]), list(listing[1])
+        yield top, dirs, files
+        for name in dirs:
+            for entry in self.walk(join(top, name)):
+                yield entry
+
+    def ignore_patterns(self, path):
+        """The patterns of an .mbedignore file"""
+        st = stat(path)
+        entry = self.ignores.get(path)
+        if entry is not None and entry[0] == st.st_mtime and entry[1] == st.st_size:
+            return list(entry[2])
+        patterns = read_ignore_file(path)
+        if self._settled(st.st_mtime):
+            self.ignores[path] = [st.st_mtime, st.st_size, patterns]
+            self.changed = True
+        return list(patterns)
+
+    def save(self):
+        """Write the listings to the cache directory, if any and if they
+        changed
+        """
+        if not self.path or not self.changed:
+            return
+        if len(self.dirs) > MAX_ENTRIES:
+            self.dirs = dict((path, entry) for path, entry in self.dirs.items()
+                             if path in self.used)
+            self.ignores = dict((path, entry) for path, entry
+                                in self.ignores.items()
+                                if dirname(path) in self.used)
+        temp = "%s.%d.tmp" % (self.path, getpid())
+        try:
+            mkdir(dirname(self.path))
+            with open(temp, "wb") as cache_out:
+                marshal.dump((CACHE_VERSION, self.dirs, self.ignores), cache_out)
+            rename(temp, self.path)
+            self.changed = False
+        except (IOError, OSError):
+            try:
+                remove(temp)
+            except OSError:
+                pass
+
+
+def get_scan_cache(cache_dir):
+    """The scan cache of a cache directory, "" for a cache kept in memory
+    only, shared by the toolchains of the process
+    """
+    if cache_dir not in _CACHES:
+        _CACHES[cache_dir] = ScanCache(cache_dir)
+    return _CACHES[cache_dir]
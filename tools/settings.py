@@ -56,6 +56,51 @@ CLI_COLOR_MAP = {
     "error"  : "red"
 }
 
+# Content addressed object cache shared between builds. Disabled when empty
+COMPILE_CACHE_DIR = ""
+# Upper bound of the object cache size in bytes (least recently used objects
+# are evicted first)
+COMPILE_CACHE_SIZE = 5 * 1024 * 1024 * 1024
+
+# Upper bound of the sources concatenated into one unity build file, in bytes
+UNITY_MAX_SIZE = 256 * 1024
+
+# Compile workers (see tools/remote_compile.py) that parallel compiles are
+# sent to, as "host:port" or "host:port/slots" strings. Compiles are local
+# when empty
+COMPILE_WORKERS = []
+
+# Seconds a parallel compile may go without any compiler output or finished
+# job before it is considered hung and stopped. A single job may take longer
+# as long as it or another job makes progress
+COMPILE_TIMEOUT = 300
+
+# Memory left free when deciding how many compilers run at once, in bytes
+BUILD_MEMORY_RESERVE = 512 * 1024 * 1024
+
+# Threads walking the source tree when scanning resources: 0 for twice the
+# number of CPUs, up to 8. The walk is serial when 1
+SCAN_THREADS = 0
+
+# Directory keeping the directory listings of resource scans between builds.
+# The listings are only kept for the duration of a build when empty
+SCAN_CACHE_DIR = ""
+
+# Where the memory usage of a link is read from: "map" for the map file of
+# the toolchain, "elf" for the linked image, the map file being read when the
+# image cannot be
+MEMAP_SOURCE = "map"
+
+# SQLite database the memory footprint of the linked builds is recorded in
+# (see tools/size_history.py). No history is kept when empty
+SIZE_HISTORY = ""
+
+# Growth of the flash and static RAM usage of a build since the last recorded
+# build of another commit that fails it, in bytes or as a percentage ("2%").
+# Not limited when empty
+FLASH_GROWTH_LIMIT = ""
+RAM_GROWTH_LIMIT = ""
+
 ##############################################################################
 # User Settings (file)
 ##############################################################################
@@ -79,6 +124,31 @@ for _n in _ENV_PATHS:
         else:
             print "WARNING: MBED_%s set as environment variable but doesn't exist" % _n
 
+if getenv('MBED_COMPILE_CACHE_DIR'):
+    COMPILE_CACHE_DIR = getenv('MBED_COMPILE_CACHE_DIR')
+if getenv('MBED_COMPILE_CACHE_SIZE'):
+    COMPILE_CACHE_SIZE = int(getenv('MBED_COMPILE_CACHE_SIZE'))
+if getenv('MBED_UNITY_MAX_SIZE'):
+    UNITY_MAX_SIZE = int(getenv('MBED_UNITY_MAX_SIZE'))
+if getenv('MBED_COMPILE_WORKERS'):
+    COMPILE_WORKERS = getenv('MBED_COMPILE_WORKERS').split(',')
+if getenv('MBED_COMPILE_TIMEOUT'):
+    COMPILE_TIMEOUT = int(getenv('MBED_COMPILE_TIMEOUT'))
+if getenv('MBED_BUILD_MEMORY_RESERVE'):
+    BUILD_MEMORY_RESERVE = int(getenv('MBED_BUILD_MEMORY_RESERVE'))
+if getenv('MBED_SCAN_THREADS'):
+    SCAN_THREADS = int(getenv('MBED_SCAN_THREADS'))
+if getenv('MBED_SCAN_CACHE_DIR'):
+    SCAN_CACHE_DIR = getenv('MBED_SCAN_CACHE_DIR')
+if getenv('MBED_MEMAP_SOURCE'):
+    MEMAP_SOURCE = getenv('MBED_MEMAP_SOURCE')
+if getenv('MBED_SIZE_HISTORY'):
+    SIZE_HISTORY = getenv('MBED_SIZE_HISTORY')
+if getenv('MBED_FLASH_GROWTH_LIMIT'):
+    FLASH_GROWTH_LIMIT = getenv('MBED_FLASH_GROWTH_LIMIT')
+if getenv('MBED_RAM_GROWTH_LIMIT'):
+    RAM_GROWTH_LIMIT = getenv('MBED_RAM_GROWTH_LIMIT')
+
 
 ##############################################################################
 # Test System Settings
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+
+Query the memory footprints of the builds recorded in a size history
+
+The memory report of every linked build is recorded in an SQLite database,
+by target, toolchain, profile, project and commit, when the builds are given
+one (build_project, make.py and test.py --size-history). A build of a commit
+replaces the earlier builds of the same commit.
+"""
+import sys
+import json
+import sqlite3
+from argparse import ArgumentParser
+from datetime import datetime
+from glob import glob
+from hashlib import md5
+from os.path import join, abspath, dirname, basename, splitext, isdir
+from subprocess import Popen, PIPE
+from time import time
+
+ROOT = abspath(join(dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from prettytable import PrettyTable
+from tools.settings import FLASH_GROWTH_LIMIT, RAM_GROWTH_LIMIT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    toolchain TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    project TEXT NOT NULL,
+    commit_id TEXT NOT NULL,
+    time REAL NOT NULL,
+    static_ram INTEGER NOT NULL,
+    heap INTEGER NOT NULL,
+    stack INTEGER NOT NULL,
+    total_ram INTEGER NOT NULL,
+    total_flash INTEGER NOT NULL,
+    UNIQUE (target, toolchain, profile, project, commit_id)
+);
+CREATE TABLE IF NOT EXISTS modules (
+    build INTEGER NOT NULL REFERENCES builds (id),
+    module TEXT NOT NULL,
+    text INTEGER NOT NULL,
+    data INTEGER NOT NULL,
+    bss INTEGER NOT NULL,
+    PRIMARY KEY (build, module)
+);
+"""
+
+KEY = ("target", "toolchain", "profile", "project", "commit_id")
+SUMMARY = ("static_ram", "heap", "stack", "total_ram", "total_flash")
+
+
+def git_commit(path):
+    """The commit checked out in the git working tree of a path, or an empty
+    string when it is not in one
+    """
+    try:
+        process = Popen(["git", "rev-parse", "HEAD"],
+                        cwd=path if isdir(path) else dirname(path) or ".",
+                        stdout=PIPE, stderr=PIPE)
+    except OSError:
+        return ""
+    out, _ = process.communicate()
+    return out.strip() if process.returncode == 0 else ""
+
+
+def profile_name(build_profile, toolchain_name):
+    """The name of the profile of tools/profiles the flags of a build come
+    from, or a digest of the flags when they come from none of them
+
+    Positional arguments:
+    build_profile - the flags of the build
+    toolchain_name - the name of the build tools
+    """
+    if build_profile is None:
+        return "default"
+    for path in sorted(glob(join(dirname(__file__), "profiles", "*.json"))):
+        try:
+            with open(path) as profile_in:
+                flags = json.load(profile_in)[toolchain_name]
+        except (IOError, ValueError, KeyError):
+            continue
+        if all(flags.get(key, []) == build_profile.get(key, [])
+               for key in set(flags) | set(build_profile)):
+            return splitext(basename(path))[0]
+    return "custom-%s" % md5(json.dumps(build_profile, sort_keys=True))\
+        .hexdigest()[:8]
+
+
+def growth_limit(limit, size):
+    """The growth a limit allows from a size: the limit in bytes, or as a
+    percentage of the size when it ends with %. None when there is no limit
+    """
+    if limit is None or limit == "":
+        return None
+    limit = str(limit).strip()
+    if limit.endswith("%"):
+        return size * float(limit[:-1]) / 100
+    return int(limit)
+
+
+class SizeHistory(object):
+    """The memory footprints of builds: the summary and the module sizes of
+    their memory reports, by target, toolchain, profile, project and commit
+
+    The database may be shared by builds running at the same time: SQLite
+    serializes their writes.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close the database"""
+        self.connection.close()
+
+    def record(self, key, mem_report, when=None):
+        """Record the memory report of a build, in place of an earlier build
+        of the same commit
+
+        Positional arguments:
+        key - the target, toolchain, profile, project and commit of the build
+        mem_report - the memory report of the build, as made by memap
+
+        Keyword arguments:
+        when - the time of the build, now by default
+        """
+        summary = {}
+        modules = []
+        for entry in mem_report:
+            if "summary" in entry:
+                summary = entry["summary"]
+            else:
+                modules.append((entry["module"], entry["size"].get(".text", 0),
+                                entry["size"].get(".data", 0),
+                                entry["size"].get(".bss", 0)))
+        values = [summary.get(name, 0) for name in SUMMARY]
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT id FROM builds WHERE %s" % self._where(KEY),
+                key).fetchone()
+            if row:
+                build = row["id"]
+                self.connection.execute(
+                    "UPDATE builds SET time = ?, %s WHERE id = ?" %
+                    ", ".join("%s = ?" % name for name in SUMMARY),
+                    [when or time()] + values + [build])
+                self.connection.execute("DELETE FROM modules WHERE build = ?",
+                                        (build,))
+            else:
+                build = self.connection.execute(
+                    "INSERT INTO builds (%s, time, %s) VALUES (%s)" %
+                    (", ".join(KEY), ", ".join(SUMMARY),
+                     ", ".join("?" * (len(KEY) + 1 + len(SUMMARY)))),
+                    list(key) + [when or time()] + values).lastrowid
+            self.connection.executemany(
+                "INSERT INTO modules VALUES (?, ?, ?, ?, ?)",
+                [(build,) + module for module in modules])
+        return build
+
+    @staticmethod
+    def _where(names):
+        return " AND ".join("%s = ?" % name for name in names) or "1"
+
+    def baseline(self, key):
+        """The latest build of the same target, toolchain, profile and
+        project as a build, from another commit, or None
+
+        Positional arguments:
+        key - the target, toolchain, profile, project and commit of the build
+        """
+        return self.connection.execute(
+            "SELECT * FROM builds WHERE %s AND commit_id != ? "
+            "ORDER BY time DESC LIMIT 1" % self._where(KEY[:-1]),
+            key).fetchone()
+
+    def projects(self):
+        """The latest build of every target, toolchain, profile and project,
+        with the number of builds recorded as builds
+        """
+        same = " AND ".join("other.%s = builds.%s" % (name, name)
+                            for name in KEY[:-1])
+        return self.connection.execute(
+            "SELECT *, (SELECT COUNT(*) FROM builds AS other WHERE %s) "
+            "AS builds FROM builds "
+            "WHERE time = (SELECT MAX(time) FROM builds AS other WHERE %s) "
+            "ORDER BY %s" % (same, same, ", ".join(KEY[:-1]))).fetchall()
+
+    def trend(self, limit=20, module=None, **filters):
+        """The latest builds, oldest first, and the sizes of a module in them
+
+        Keyword arguments:
+        limit - the number of builds
+        module - the module to give the .text, .data and .bss of
+        filters - the target, toolchain, profile and project of the builds
+        """
+        names = [name for name in KEY if filters.get(name)]
+        rows = self.connection.execute(
+            "SELECT builds.*, modules.text, modules.data, modules.bss "
+            "FROM builds LEFT JOIN modules "
+            "ON modules.build = builds.id AND modules.module = ? "
+            "WHERE %s ORDER BY time DESC LIMIT ?" % self._where(
+                "builds." + name for name in names),
+            [module] + [filters[name] for name in names] + [limit]).fetchall()
+        return list(reversed(rows))
+
+    def check(self, key, flash_limit=FLASH_GROWTH_LIMIT,
+              ram_limit=RAM_GROWTH_LIMIT):
+        """The growths of the flash and static RAM usage of a build since its
+        baseline that are beyond their limits, as messages
+
+        Positional arguments:
+        key - the target, toolchain, profile, project and commit of the build
+
+        Keyword arguments:
+        flash_limit - the flash growth allowed, in bytes or as a percentage
+        ram_limit - the static RAM growth allowed, in bytes or as a percentage
+        """
+        build = self.connection.execute(
+            "SELECT * FROM builds WHERE %s" % self._where(KEY), key).fetchone()
+        baseline = self.baseline(key)
+        if build is None or baseline is None:
+            return []
+        regressions = []
+        for name, column, limit in (("Flash", "total_flash", flash_limit),
+                                    ("Static RAM", "static_ram", ram_limit)):
+            allowed = growth_limit(limit, baseline[column])
+            growth = build[column] - baseline[column]
+            if allowed is not None and growth > allowed:
+                regressions.append(
+                    "%s usage of %s grew by %d bytes to %d since commit %s, "
+                    "more than the %s allowed" % (
+                        name, key[3], growth, build[column],
+                        baseline["commit_id"][:12] or "(none)", limit))
+        return regressions
+
+
+def record_build(path, key, mem_report):
+    """Record the memory report of a build in a size history, and return the
+    growths of its footprint beyond the limits of the settings
+
+    Positional arguments:
+    path - the database of the size history
+    key - the target, toolchain, profile, project and commit of the build
+    mem_report - the memory report of the build, as made by memap
+    """
+    with SizeHistory(path) as history:
+        history.record(key, mem_report)
+        return history.check(key)
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("database", help="the size history to query")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("projects", help="list the latest build of every "
+                        "target, toolchain, profile and project")
+    trend = commands.add_parser("trend", help="show the footprint of the "
+                                "latest builds")
+    trend.add_argument("-m", "--mcu", dest="target")
+    trend.add_argument("-t", "--toolchain")
+    trend.add_argument("--profile")
+    trend.add_argument("-n", "--project")
+    trend.add_argument("--module", help="show the sizes of a module")
+    trend.add_argument("-l", "--limit", type=int, default=20,
+                       help="number of builds (default: 20)")
+    options = parser.parse_args()
+
+    with SizeHistory(options.database) as history:
+        if options.command == "projects":
+            table = PrettyTable(["Target", "Toolchain", "Profile", "Project",
+                                 "Builds", "Last build", "Flash",
+                                 "Static RAM"])
+            for row in history.projects():
+                table.add_row([row["target"], row["toolchain"],
+                               row["profile"], row["project"], row["builds"],
+                               format_time(row["time"]), row["total_flash"],
+                               row["static_ram"]])
+        else:
+            columns = ["Time", "Commit", "Flash", "Flash delta", "Static RAM",
+                       "RAM delta"]
+            if options.module:
+                columns += [".text", ".data", ".bss"]
+            table = PrettyTable(columns)
+            previous = None
+            for row in history.trend(options.limit, options.module,
+                                     target=options.target,
+                                     toolchain=options.toolchain,
+                                     profile=options.profile,
+                                     project=options.project):
+                cells = [format_time(row["time"]), row["commit_id"][:12],
+                         row["total_flash"],
+                         "%+d" % (row["total_flash"] - previous["total_flash"])
+                         if previous else "",
+                         row["static_ram"],
+                         "%+d" % (row["static_ram"] - previous["static_ram"])
+                         if previous else ""]
+                if options.module:
+                    cells += [row["text"] or 0, row["data"] or 0,
+                              row["bss"] or 0]
+                table.add_row(cells)
+                previous = row
+        for column in table.field_names:
+            table.align[column] = "l"
+        print table
+
+
+if __name__ == "__main__":
+    main()
@@ -133,6 +133,12 @@ class Target(namedtuple("Target", "name json_data resolution_order resolution_or
         return json_file_to_dict(Target.__targets_json_location or
                                  Target.__targets_json_location_default)
 
+    @staticmethod
+    def get_targets_json_location():
+        """Get the location of the targets.json file in use"""
+        return (Target.__targets_json_location or
+                Target.__targets_json_location_default)
+
     @staticmethod
     def set_targets_json_location(location=None):
         """Set the location of the targets.json file"""
@@ -37,7 +37,7 @@ from tools.test_exporters import ReportExporter, ResultExporterType
 from utils import argparse_filestring_type, argparse_lowercase_type, argparse_many
 from utils import argparse_dir_not_parent
 from tools.toolchains import mbedToolchain, TOOLCHAIN_PATHS, TOOLCHAIN_CLASSES
-from tools.settings import CLI_COLOR_MAP
+from tools.settings import CLI_COLOR_MAP, SIZE_HISTORY
 
 if __name__ == '__main__':
     try:
@@ -55,6 +55,47 @@ if __name__ == '__main__':
                           default=0,
                           help="Number of concurrent jobs. Default: 0/auto (based on host machine's number of CPUs)")
 
+        parser.add_argument("--reproducible",
+                          action="store_true",
+                          dest="reproducible",
+                          default=False,
+                          help="Make identical inputs produce bit-identical objects and binaries")
+
+        parser.add_argument("--pch",
+                          action="store_true",
+                          dest="pch",
+                          default=False,
+                          help="Precompile mbed.h once for all the tests (GCC_ARM and ARM)")
+
+        parser.add_argument("--unity",
+                          action="store_true",
+                          dest="unity",
+                          default=False,
+                          help="Compile the sources of each directory together in unity files")
+
+        parser.add_argument("-k", "--keep-going",
+                          action="store_true",
+                          dest="keep_going",
+                          default=False,
+                          help="Compile every source even when some fail, and report all the errors")
+
+        parser.add_argument("--optimize-includes",
+                          action="store_true",
+                          dest="optimize_includes",
+                          default=False,
+                          help="Only pass the include paths headers are found through, the most used first")
+
+        parser.add_argument("--compile-timeout",
+                          dest="compile_timeout",
+                          default=None,
+                          type=int,
+                          help="Seconds a parallel compile may go without any compiler output or finished job before it is stopped. Default: COMPILE_TIMEOUT of the settings")
+
+        parser.add_argument("--size-history",
+                          dest="size_history",
+                          default=SIZE_HISTORY or None,
+                          help="Record the memory footprint of the tests in this SQLite database, and fail the builds that grew beyond the limits of the settings")
+
         parser.add_argument("--source", dest="source_dir",
                           type=argparse_filestring_type,
                             default=None, help="The source (input) directory (for sources other than tests). Defaults to current directory.", action="append")
@@ -186,7 +227,12 @@ if __name__ == '__main__':
                                                 notify=notify,
                                                 archive=False,
                                                 app_config=options.app_config,
-                              build_profile=profile)
+                              build_profile=profile,
+                              reproducible=options.reproducible,
+                              unity=options.unity,
+                              keep_going=options.keep_going,
+                              optimize_includes=options.optimize_includes,
+                              compile_timeout=options.compile_timeout)
 
                 library_build_success = True
             except ToolException, e:
@@ -214,7 +260,14 @@ if __name__ == '__main__':
                         jobs=options.jobs,
                         continue_on_build_fail=options.continue_on_build_fail,
                                                              app_config=options.app_config,
-                                                             build_profile=profile)
+                                                             build_profile=profile,
+                                                             reproducible=options.reproducible,
+                                                             pch=options.pch,
+                                                             unity=options.unity,
+                                                             keep_going=options.keep_going,
+                                                             optimize_includes=options.optimize_includes,
+                                                             compile_timeout=options.compile_timeout,
+                                                             size_history=options.size_history)
 
                 # If a path to a test spec is provided, write it to a file
                 if options.test_spec:
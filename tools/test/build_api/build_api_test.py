@@ -15,11 +15,18 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import sys
 import unittest
+from os import mkdir, makedirs
+from os.path import join, exists, dirname
+from shutil import rmtree
+from tempfile import mkdtemp
 from collections import namedtuple
 from mock import patch, MagicMock
 from tools.build_api import prepare_toolchain, build_project, build_library,\
-    scan_resources
+    scan_resources, SharedScan
+from tools.build_manifest import build_key, check_manifest, write_manifest
+from tools.toolchains import Resources
 
 """
 Tests for build_api.py
@@ -117,11 +124,12 @@ class BuildApiTests(unittest.TestCase):
         mock_config_init.assert_called_once_with(self.target, self.src_paths,
                                                  app_config=None)
 
+    @patch('tools.build_api.write_manifest')
     @patch('tools.build_api.scan_resources')
     @patch('tools.build_api.mkdir')
     @patch('os.path.exists')
     @patch('tools.build_api.prepare_toolchain')
-    def test_build_project_app_config(self, mock_prepare_toolchain, mock_exists, _, __):
+    def test_build_project_app_config(self, mock_prepare_toolchain, mock_exists, _, __, ___):
         """
         Test that build_project uses app_config correctly
 
@@ -129,6 +137,7 @@ class BuildApiTests(unittest.TestCase):
         :param mock_exists: mock of function os.path.exists
         :param _: mock of function mkdir (not tested)
         :param __: mock of function scan_resources (not tested)
+        :param ___: mock of function write_manifest (not tested)
         :return:
         """
         app_config = "app_config"
@@ -145,11 +154,12 @@ class BuildApiTests(unittest.TestCase):
         self.assertEqual(args[1]['app_config'], app_config,
                          "prepare_toolchain was called with an incorrect app_config")
 
+    @patch('tools.build_api.write_manifest')
     @patch('tools.build_api.scan_resources')
     @patch('tools.build_api.mkdir')
     @patch('os.path.exists')
     @patch('tools.build_api.prepare_toolchain')
-    def test_build_project_no_app_config(self, mock_prepare_toolchain, mock_exists, _, __):
+    def test_build_project_no_app_config(self, mock_prepare_toolchain, mock_exists, _, __, ___):
         """
         Test that build_project correctly deals with no app_config
 
@@ -157,6 +167,7 @@ class BuildApiTests(unittest.TestCase):
         :param mock_exists: mock of function os.path.exists
         :param _: mock of function mkdir (not tested)
         :param __: mock of function scan_resources (not tested)
+        :param ___: mock of function write_manifest (not tested)
         :return:
         """
         mock_exists.return_value = False
@@ -224,5 +235,131 @@ class BuildApiTests(unittest.TestCase):
         self.assertEqual(args[1]['app_config'], None,
                          "prepare_toolchain was called with an incorrect app_config")
 
+    def test_build_manifest(self):
+        """
+        Test that a build manifest matches until one of the inputs changes
+
+        :return:
+        """
+        root = mkdtemp()
+        try:
+            source = join(root, "main.c")
+            build_path = join(root, "BUILD")
+            res = join(build_path, "main.bin")
+            mkdir(build_path)
+            with open(source, "w") as out:
+                out.write("int main;")
+            with open(res, "w") as out:
+                out.write("binary")
+            resources = Resources(root)
+            resources.c_sources = [source]
+            resources.inc_dirs = [root]
+            toolchain = MagicMock()
+            toolchain.cc = [sys.executable]
+            toolchain.ld = [sys.executable]
+
+            key = build_key(target=self.target, src_paths=[root])
+            write_manifest(build_path, key, toolchain, resources, [res],
+                           {'res': res})
+            self.assertEqual(check_manifest(build_path, key), {'res': res})
+            self.assertIsNone(check_manifest(
+                build_path, build_key(target=self.target, src_paths=["."])))
+
+            with open(source, "w") as out:
+                out.write("int main(void) {}")
+            self.assertIsNone(check_manifest(build_path, key))
+
+            # Headers of include directories the scan did not list
+            inc_dir = join(root, "lib")
+            mkdir(inc_dir)
+            header = join(inc_dir, "lib.h")
+            with open(header, "w") as out:
+                out.write("#define LIB 1")
+            write_manifest(build_path, key, toolchain, resources, [res],
+                           {'res': res}, inc_dirs=[inc_dir])
+            self.assertEqual(check_manifest(build_path, key), {'res': res})
+            with open(header, "w") as out:
+                out.write("#define LIB 2 /* edited */")
+            self.assertIsNone(check_manifest(build_path, key))
+
+            with patch('tools.build_manifest.MBED_ORG_USER', "someone"):
+                self.assertNotEqual(
+                    build_key(target=self.target, src_paths=[root]), key)
+        finally:
+            rmtree(root)
+
+    @patch('tools.build_api.check_manifest')
+    @patch('tools.build_api.prepare_toolchain')
+    def test_up_to_date_build_notifies(self, mock_prepare_toolchain,
+                                       mock_check_manifest):
+        """
+        Test that a build found up to date reports through the notify
+        function, and prints nothing when silent
+
+        :return:
+        """
+        mock_check_manifest.return_value = {
+            'res': "main.bin", 'target': self.target, 'memap_table': "TABLE",
+            'memory_usage': [], 'vendor_label': "", 'toolchain_report': {}}
+        notify = MagicMock()
+        self.assertEqual(build_project(self.src_paths, self.build_path,
+                                       self.target, self.toolchain_name,
+                                       notify=notify), "main.bin")
+        self.assertFalse(mock_prepare_toolchain.called)
+        messages = [call[0][0]['message'] for call in notify.call_args_list]
+        self.assertIn("up to date", messages[0])
+        self.assertEqual(messages[1], "TABLE")
+
+        with patch('sys.stdout') as stdout:
+            build_project(self.src_paths, self.build_path, self.target,
+                          self.toolchain_name, silent=True)
+        self.assertFalse(stdout.write.called)
+
+    def test_shared_scan(self):
+        """
+        Test that builds using a shared scan of their base source paths find
+        the same resources as builds scanning them
+
+        :return:
+        """
+        root = mkdtemp()
+        try:
+            base, test = join(root, "base"), join(root, "test")
+            # The patterns of the base apply to the scan of the test as well
+            for path, content in [(join(base, ".mbedignore"), "*_off.c\n"),
+                                  (join(base, "a.c"), ""),
+                                  (join(base, "FEATURE_X", "b.c"), ""),
+                                  (join(test, "main.cpp"), ""),
+                                  (join(test, "test_off.c"), "")]:
+                if not exists(dirname(path)):
+                    makedirs(dirname(path))
+                with open(path, "w") as out:
+                    out.write(content)
+
+            def state(resources):
+                fields = dict(resources.__dict__)
+                fields['features'] = dict(
+                    (name, state(feature)) for name, feature
+                    in resources.features.items())
+                return fields
+
+            shared = SharedScan([base], prepare_toolchain(
+                [base], self.target, "GCC_ARM", silent=True))
+            scans = []
+            for shared_scan in [None, shared, shared]:
+                toolchain = prepare_toolchain([base, test], self.target,
+                                              "GCC_ARM", silent=True)
+                scans.append(state(scan_resources([base, test], toolchain,
+                                                  shared_scan=shared_scan)))
+            self.assertEqual(scans[0], scans[1])
+            self.assertEqual(scans[0], scans[2])
+            self.assertEqual(scans[0]['c_sources'], [join(base, "a.c")])
+
+            toolchain = prepare_toolchain([base, test], self.target, "ARM",
+                                          silent=True)
+            self.assertFalse(shared.applies([base, test], toolchain))
+        finally:
+            rmtree(root)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,100 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+from mock import MagicMock
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.compile_cache import CompileCache
+
+
+def test_compile_cache_round_trip(tmpdir):
+    """Test that an object stored by one build is restored into another build
+    directory, and only while its dependencies are unchanged"""
+    source = tmpdir.join("main.c")
+    source.write("#include \"header.h\"\n")
+    header = tmpdir.join("header.h")
+    header.write("#define FOO 1\n")
+    cache = CompileCache(str(tmpdir.join("cache")), 1024 * 1024)
+
+    def make_job(build_dir):
+        build_dir.ensure(dir=True)
+        obj = build_dir.join("main.o")
+        toolchain = MagicMock(build_dir=str(build_dir))
+        toolchain.get_config_header.return_value = None
+        toolchain.parse_dependencies.return_value = [str(source), str(header)]
+        job = {'source': str(source), 'object': str(obj),
+               'commands': [["cc", "-c", "-o", str(obj), str(source)]]}
+        return toolchain, job, obj
+
+    toolchain, job, obj = make_job(tmpdir.join("build_a"))
+    assert not cache.fetch(toolchain, job)
+    obj.write("object code")
+    tmpdir.join("build_a", "main.d").write("%s: %s %s\n" % (obj, source, header))
+    cache.store(toolchain, job)
+
+    toolchain, job, obj = make_job(tmpdir.join("build_b"))
+    assert cache.fetch(toolchain, job)
+    assert obj.read() == "object code"
+    assert str(tmpdir.join("build_b")) in tmpdir.join("build_b", "main.d").read()
+
+    header.write("#define FOO 2\n")
+    cache = CompileCache(str(tmpdir.join("cache")), 1024 * 1024)
+    toolchain, job, obj = make_job(tmpdir.join("build_c"))
+    assert not cache.fetch(toolchain, job)
+    assert cache.stats() == {'hits': 0, 'misses': 1}
+
+
+def test_compile_cache_ignores_build_time_stamp(tmpdir):
+    """Test that builds with different time stamps, given on the command line
+    or in a response file, share the objects they compile"""
+    source = tmpdir.join("main.c")
+    source.write("int main(void) { return 0; }\n")
+    cache = CompileCache(str(tmpdir.join("cache")), 1024 * 1024)
+
+    def make_job(build_dir, timestamp):
+        build_dir.ensure(dir=True)
+        obj = build_dir.join("main.o")
+        macros = build_dir.join(".macros.txt")
+        macros.write("-DMBED_BUILD_TIMESTAMP=%s -DFOO=1" % timestamp)
+        toolchain = MagicMock(build_dir=str(build_dir))
+        toolchain.get_config_header.return_value = None
+        toolchain.parse_dependencies.return_value = [str(source)]
+        job = {'source': str(source), 'object': str(obj),
+               'commands': [["gcc", "-DMBED_BUILD_TIMESTAMP=%s" % timestamp,
+                             "@%s" % macros, "-c", "-o", str(obj),
+                             str(source)]]}
+        return toolchain, job, obj, macros
+
+    toolchain, job, obj, _ = make_job(tmpdir.join("build_a"), "1500000000.1")
+    assert not cache.fetch(toolchain, job)
+    obj.write("object code")
+    tmpdir.join("build_a", "main.d").write("%s: %s\n" % (obj, source))
+    cache.store(toolchain, job)
+
+    toolchain, job, obj, macros = make_job(tmpdir.join("build_b"),
+                                           "1500000042.7")
+    assert cache.fetch(toolchain, job)
+    assert obj.read() == "object code"
+
+    # The other definitions of the response file are still part of the key
+    macros.write("-DMBED_BUILD_TIMESTAMP=1500000042.7 -DFOO=2")
+    assert not CompileCache(str(tmpdir.join("cache")),
+                            1024 * 1024).fetch(toolchain, job)
@@ -0,0 +1,46 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.compile_times import CompileTimes, makespan
+
+
+def test_compile_times_schedule_longest_first(tmpdir):
+    """Test that recorded compile times order the queue longest first and
+    survive a reload of the build directory"""
+    build_dir = str(tmpdir)
+    queue = [{'object': os.path.join(build_dir, name + ".o")}
+             for name in "abcd"]
+    times = CompileTimes(build_dir)
+    assert times.schedule(queue) == queue
+    for job, duration in zip(queue, [1.0, 1.0, 1.0, 3.0]):
+        times.record(job['object'], duration)
+    times.save()
+
+    times = CompileTimes(build_dir)
+    new_job = {'object': os.path.join(build_dir, "e.o")}
+    scheduled = times.schedule(queue + [new_job])
+    assert scheduled[0] == queue[3]
+    assert scheduled[1] == new_job
+    before, after = times.saving(queue, times.schedule(queue), 2)
+    assert (before, after) == (4.0, 3.0)
+    assert makespan([], 4) == 0.0
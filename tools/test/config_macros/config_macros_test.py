@@ -0,0 +1,59 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.config_macros import ConfigMacroTracker, parse_config_header
+
+
+def test_config_macro_tracker(tmpdir):
+    """Test that a configuration change only affects the objects whose
+    sources mention a changed macro"""
+    header_data = ("#define MBED_CONF_A {0:<6} // set by library:a\n"
+                   "#define MBED_CONF_B 1      // set by library:b\n"
+                   "#define FEATURE_X // defined by application\n")
+    assert parse_config_header(header_data.format(9600)) == {
+        'MBED_CONF_A': '9600', 'MBED_CONF_B': '1', 'FEATURE_X': ''}
+
+    build_dir = str(tmpdir)
+    config_file = os.path.join(build_dir, "mbed_config.h")
+    uses_a = os.path.join(build_dir, "a.c")
+    uses_b = os.path.join(build_dir, "b.c")
+    for path, data in [(uses_a, "int x = MBED_CONF_A;\n"),
+                       (uses_b, "int y = MBED_CONF_B;\n")]:
+        with open(path, "w") as source:
+            source.write(data)
+        os.utime(path, (1000, 1000))
+    with open(config_file, "w") as config_out:
+        config_out.write(header_data.format(115200))
+    os.utime(config_file, (2000, 2000))
+
+    tracker = ConfigMacroTracker(build_dir)
+    assert not tracker.need_update(uses_a, [uses_a])
+    tracker.update(config_file, header_data.format(9600),
+                   header_data.format(115200))
+    assert tracker.need_update(uses_a, [uses_a])
+    assert not tracker.need_update(uses_b, [uses_b])
+
+    tracker = ConfigMacroTracker(build_dir)
+    assert tracker.need_update(uses_a, [uses_a])
+    os.utime(uses_a, (3000, 3000))
+    assert not tracker.need_update(uses_a, [uses_a])
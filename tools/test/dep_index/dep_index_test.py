@@ -0,0 +1,57 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+from mock import MagicMock
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.dep_index import DependencyIndex
+
+
+def test_dependency_index(tmpdir):
+    """Test that the dependency index parses each dependency file once and
+    ignores modification times that do not come with a content change"""
+    build_dir = str(tmpdir)
+    header = os.path.join(build_dir, "header.h")
+    dep_file = os.path.join(build_dir, "main.d")
+    with open(header, "w") as header_out:
+        header_out.write("#define A 1\n")
+    os.utime(header, (1000, 1000))
+    with open(dep_file, "w") as dep_out:
+        dep_out.write("main.o: " + header + "\n")
+    parse = MagicMock(return_value=[header])
+
+    index = DependencyIndex(build_dir)
+    assert index.dependencies(dep_file, parse) == [header]
+    assert index.mtime(header) == 1000
+    index.save()
+
+    index = DependencyIndex(build_dir)
+    assert index.dependencies(dep_file, parse) == [header]
+    assert parse.call_count == 1
+    os.utime(header, (1010, 1010))
+    assert index.mtime(header) == 1000
+
+    index = DependencyIndex(build_dir)
+    with open(header, "w") as header_out:
+        header_out.write("#define A 2\n")
+    os.utime(header, (1020, 1020))
+    assert index.mtime(header) == 1020
+    assert index.mtime(os.path.join(build_dir, "other.h")) is None
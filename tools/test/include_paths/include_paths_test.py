@@ -0,0 +1,56 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+from os.path import join
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.dep_index import DependencyIndex
+from tools.include_paths import IncludePaths
+
+
+def test_include_paths_keep_resolution(tmpdir):
+    """Test that include directories without headers are removed, that the
+    others are sorted by use without changing the header a name resolves to,
+    and the count of the file look ups avoided"""
+    inc_dirs = ["p", join("p", "a"), join("p", "a", "src"), join("p", "b"),
+                join("p", "c")]
+    headers = [join("p", "a", "x.h"), join("p", "b", "y.h"),
+               join("p", "c", "z.h")]
+    index = DependencyIndex(str(tmpdir))
+    deps = [join("p", "b", "y.h")] * 3 + [join("p", "c", "z.h")] * 2 + \
+           [join("p", "a", "x.h"), join("sys", "stdint.h")]
+    index.tus = dict(("%d.d" % i, [0, 0, [index._file_id(dep)]])
+                     for i, dep in enumerate(deps))
+
+    include_paths = IncludePaths(index)
+    assert include_paths.optimize(inc_dirs, headers) == [
+        join("p", "b"), join("p", "c"), join("p", "a"), "p"]
+    assert include_paths.removed == 1 and include_paths.reordered
+    assert (include_paths.probes, include_paths.optimized_probes) == (29, 14)
+    assert include_paths.probes_avoided() == 15
+
+    # x.h is found in p/a first, p/a stays ahead of p/b
+    include_paths = IncludePaths(index)
+    assert include_paths.optimize(inc_dirs, headers + [join("p", "b", "x.h")]) \
+        == [join("p", "c"), join("p", "a"), join("p", "b"), "p"]
+    assert include_paths.optimize(inc_dirs, headers,
+                                  keep=[join("p", "a", "src")])[-1] == \
+        join("p", "a", "src")
@@ -0,0 +1,64 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+from mock import patch
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.job_control import JobController, DEFAULT_COMPILER_MEMORY
+
+
+def test_job_controller_adapts_to_memory_and_load():
+    """Test that fewer compilers run when memory or CPUs run short, and that
+    the slots come back"""
+    controller = JobController(8, memory_reserve=100)
+    controller.cpus = 8
+    mega = 1024 * 1024
+    assert controller.allowed(0) == 8
+    # Room for 3 more compilers of the default size
+    memory = 100 + 3 * DEFAULT_COMPILER_MEMORY
+    assert controller.allowed(2, memory=memory) == 5
+    # Below the reserve: no compiler starts until one finishes
+    assert controller.allowed(2, memory=0) <= 2
+    assert controller.allowed(0, memory=0) == 1
+    # 5 other processes use the CPUs on top of 2 compilers
+    assert controller.allowed(2, load=7) == 3
+    assert controller.allowed(2, load=2) == 8
+
+    controller.acquire()
+    controller.release(peak_memory=512 * mega)
+    assert controller.compiler_memory() == 512 * mega
+    controller.release(peak_memory=64 * mega)
+    assert controller.compiler_memory() == 512 * mega
+    assert controller.allowed(0, memory=100 + 1024 * mega) == 2
+    assert controller._active.value == 0
+
+    # Short of memory, a job waits for the running compiler however long
+    from threading import Thread
+    controller.acquire()
+    with patch("tools.job_control.available_memory", return_value=0):
+        waiting = Thread(target=controller.acquire)
+        waiting.start()
+        waiting.join(0.5)
+        assert waiting.is_alive()
+        controller.release()
+        waiting.join(5)
+        assert not waiting.is_alive()
+    assert controller._active.value == 1
@@ -16,18 +16,91 @@ limitations under the License.
 """
 import sys
 import os
+import struct
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
 sys.path.insert(0, ROOT)
 
 import unittest
-from tools.memap import MemapParser
+from tools.memap import MemapParser, ObjectModules, diff_sizes
+from tools.size_history import SizeHistory
+from tools.elf_file import STT_OBJECT, STT_FUNC, STT_FILE, STB_LOCAL, \
+    STB_GLOBAL, STB_WEAK
 from copy import deepcopy
+from io import BytesIO
+from mock import patch
+from shutil import rmtree
+from tempfile import mkdtemp
 
 """
 Tests for test_api.py
 """
 
+GCC_MAP = (
+    " .text          0x00000000       0x10 ./BUILD/mbed-os/x/y/ignored.o\n"
+    "Linker script and memory map\n"
+    "\n"
+    ".text           0x00000000      0x200\n"
+    " *(.text*)\n"
+    " .text.main     0x00000000       0x40 ./BUILD/mbed-os/drivers/Serial.o\n"
+    "                0x00000000                main\n"
+    " .text._ZN4mbed6Ticker6attachEv\n"
+    "                0x00000040       0x22 ./BUILD/mbed-os/platform/sub/Ticker.o\n"
+    " *fill*         0x00000062        0x2 \n"
+    " .text.empty    0x00000064        0x0 ./BUILD/mbed-os/drivers/Serial.o\n"
+    ".data           0x20000000        0x8\n"
+    " .data          0x20000000        0x8 /lib/libc.a(lib_a-impure.o)\n"
+    ".init_array     0x20000008        0x4\n"
+    " .init_array    0x20000008        0x4 ./BUILD/mbed-os/drivers/Serial.o\n"
+    "OUTPUT(./BUILD/app.elf elf32-littlearm)\n"
+    " .text          0x00000000      0x100 ./BUILD/mbed-os/drivers/Serial.o\n")
+
+def write_elf(path, sections, symbols):
+    """
+    Write a 32 bit ARM ELF file with the headers of the given sections, as
+    (name, type, flags, address, size), and a symbol table of the given
+    symbols, as (name, value, size, type, binding, section name)
+    """
+    def strings(names):
+        table, offsets = "\0", {"": 0}
+        for name in names:
+            offsets[name] = len(table)
+            table += name + "\0"
+        return table, offsets
+
+    headers = [("", 0, 0, 0, 0)] + list(sections)
+    index = dict((header[0], number) for number, header in enumerate(headers))
+    strtab, symbol_names = strings(symbol[0] for symbol in symbols)
+    shstrtab, section_names = strings(
+        [header[0] for header in sections] +
+        [".symtab", ".strtab", ".shstrtab"])
+    symtab = "\0" * 16 + "".join(
+        struct.pack("<IIIBBH", symbol_names[name], value, size,
+                    bind << 4 | kind, 0, index.get(section, 0xfff1))
+        for name, value, size, kind, bind, section in symbols)
+
+    symtab_offset = 52
+    strtab_offset = symtab_offset + len(symtab)
+    shstrtab_offset = strtab_offset + len(strtab)
+    shoff = shstrtab_offset + len(shstrtab)
+    count = len(headers) + 3
+    table = "".join(struct.pack("<10I", section_names[name], kind, flags,
+                                address, 0, size, 0, 0, 4, 0)
+                    for name, kind, flags, address, size in headers)
+    table += struct.pack("<10I", section_names[".symtab"], 2, 0, 0,
+                         symtab_offset, len(symtab), len(headers) + 1, 1, 4,
+                         16)
+    table += struct.pack("<10I", section_names[".strtab"], 3, 0, 0,
+                         strtab_offset, len(strtab), 0, 0, 1, 0)
+    table += struct.pack("<10I", section_names[".shstrtab"], 3, 0, 0,
+                         shstrtab_offset, len(shstrtab), 0, 0, 1, 0)
+    with open(path, "wb") as elf_out:
+        elf_out.write("\x7fELF\x01\x01\x01" + "\0" * 9)
+        elf_out.write(struct.pack("<HHIIIIIHHHHHH", 2, 40, 1, 0, 0, shoff, 0,
+                                  52, 0, 0, 40, count, count - 1))
+        elf_out.write(symtab + strtab + shstrtab + table)
+
+
 class MemapParserTests(unittest.TestCase):
     """
     Test cases for Test Api
@@ -162,7 +235,250 @@ class MemapParserTests(unittest.TestCase):
         self.generate_test_helper('csv-ci', file_output=file_name)
         self.assertTrue(os.path.exists(file_name), "Failed to create csv-ci file")
         os.remove(file_name)
-    
+
+    def test_parse_map_file_gcc(self):
+        """
+        Test ensures that the sections, modules and fills of a gcc map file
+        are parsed, and that parsing stops at its output
+
+        :return:
+        """
+        map_file = BytesIO(GCC_MAP)
+        parser = MemapParser()
+        parser.parse_map_file_gcc(map_file)
+        sizes = dict((module, dict((section, size) for section, size
+                                   in sections.items() if size))
+                     for module, sections in parser.modules.items())
+        self.assertEqual(sizes, {
+            "drivers": {".text": 0x40, ".init": 0x4},
+            "platform/sub": {".text": 0x22},
+            "Fill": {".text": 0x2},
+            "Misc": {".data": 0x8}})
+
+    def test_parse_map_file_armcc_unknown_kind(self):
+        """
+        Test ensures that armcc map file entries of an unknown kind are
+        skipped with a warning on stderr, leaving the reports untouched
+
+        :return:
+        """
+        map_file = BytesIO(
+            "    Base Addr    Size         Type   Attr      Idx    E Section "
+            "Name        Object\n\n"
+            "    0x00000000   0x00000010   Code   RO         1    "
+            "i.main               main.o\n"
+            "    0x20000000   0x00000008   Pad    RW         2    "
+            "PAD                  main.o\n")
+        parser = MemapParser()
+        stderr = BytesIO()
+        with patch("sys.stderr", stderr), patch("sys.stdout") as stdout:
+            parser.parse_map_file_armcc(map_file)
+        self.assertFalse(stdout.write.called)
+        self.assertIn("unknown section kind Pad of main.o",
+                      stderr.getvalue())
+        self.assertEqual(
+            dict((module, dict((section, size) for section, size
+                               in sections.items() if size))
+                 for module, sections in parser.modules.items()),
+            {"Misc": {".text": 0x10}})
+
+    def test_symbols_gcc(self):
+        """
+        Test ensures that the input sections of a gcc map file are kept with
+        their address, size, section, object and module
+
+        :return:
+        """
+        parser = MemapParser()
+        parser.parse_map_file_gcc(BytesIO(GCC_MAP))
+        self.assertEqual(list(parser.symbols), [
+            (".text.main", 0x0, 0x40, ".text", "Serial.o", "drivers"),
+            (".text._ZN4mbed6Ticker6attachEv", 0x40, 0x22, ".text", "Ticker.o",
+             "platform/sub"),
+            ("*fill*", 0x62, 0x2, ".text", "", "Fill"),
+            (".data", 0x20000000, 0x8, ".data", "libc.a(lib_a-impure.o)", "Misc"),
+            (".init_array", 0x20000008, 0x4, ".init", "Serial.o", "drivers")])
+        totals = parser.symbols.totals()
+        self.assertEqual(totals[(".text", "drivers", "Serial.o", ".text.main")],
+                         0x40)
+        self.assertEqual(len(totals), 5)
+
+    def test_diff_sizes(self):
+        """
+        Test ensures that the changes between two builds are ranked by growth,
+        and compared per module when a build only has module sizes
+
+        :return:
+        """
+        old = {(".text", "drivers", "Serial.o", "a"): 10,
+               (".text", "drivers", "Serial.o", "b"): 20,
+               (".data", "platform", "Ticker.o", "c"): 4}
+        new = {(".text", "drivers", "Serial.o", "a"): 30,
+               (".text", "drivers", "Serial.o", "b"): 16,
+               (".data", "platform", "Ticker.o", "c"): 4,
+               (".bss", "rtos", "Thread.o", "d"): 8}
+        self.assertEqual(diff_sizes(old, new), [
+            (".text", "drivers", "Serial.o", "a", 10, 30),
+            (".bss", "rtos", "Thread.o", "d", 0, 8),
+            (".text", "drivers", "Serial.o", "b", 20, 16)])
+
+        old_modules = {(".text", "drivers", None, None): 30,
+                       (".data", "platform", None, None): 4}
+        self.assertEqual(diff_sizes(old_modules, new), [
+            (".text", "drivers", None, None, 30, 46),
+            (".bss", "rtos", None, None, 0, 8)])
+
+    def test_search_objects_recorded(self):
+        """
+        Test ensures that the modules recorded for the objects of a build give
+        the same mapping as a walk of its mbed-os directory, and that removed
+        objects are forgotten
+
+        :return:
+        """
+        build_path = mkdtemp()
+        try:
+            objects = [os.path.join(build_path, *parts) for parts in [
+                ("mbed-os", "drivers", "Serial.o"),
+                ("mbed-os", "platform", "sub", "dir", "Ticker.o"),
+                ("mbed-os", "rtos", "Thread.o"),
+                ("main.o",)]]
+            for obj in objects:
+                if not os.path.isdir(os.path.dirname(obj)):
+                    os.makedirs(os.path.dirname(obj))
+                open(obj, "w").close()
+            map_file = os.path.join(build_path, "app.map")
+
+            walked = MemapParser()
+            walked.search_objects(map_file)
+
+            object_modules = ObjectModules(build_path)
+            object_modules.update(objects)
+            object_modules.save()
+            recorded = MemapParser()
+            recorded.search_objects(map_file)
+            self.assertEqual(recorded.object_to_module, walked.object_to_module)
+            self.assertEqual(recorded.object_to_module, {
+                "Serial.o": "drivers", "Ticker.o": "platform/sub",
+                "Thread.o": "rtos"})
+
+            os.remove(objects[2])
+            object_modules = ObjectModules(build_path)
+            object_modules.update(objects[:2])
+            self.assertNotIn("mbed-os/rtos/Thread.o", object_modules.modules)
+            self.assertIn("main.o", object_modules.modules)
+        finally:
+            rmtree(build_path)
+
+    def test_parse_elf(self):
+        """
+        Test ensures that the sections of an image give the totals of the
+        report, that its symbols count in the module of the object defining
+        them, and that the rest counts in Misc
+
+        :return:
+        """
+        build_path = mkdtemp()
+        try:
+            os.makedirs(os.path.join(build_path, "mbed-os", "drivers"))
+            write_elf(os.path.join(build_path, "mbed-os", "drivers", "Serial.o"),
+                      [(".text", 1, 6, 0, 0x40), (".bss", 8, 3, 0, 0x20)],
+                      [("Serial.cpp", 0, 0, STT_FILE, STB_LOCAL, None),
+                       ("helper", 0, 0x10, STT_FUNC, STB_LOCAL, ".text"),
+                       ("serial_putc", 0x10, 0x20, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("mbed_die", 0x30, 0x10, STT_FUNC, STB_WEAK, ".text"),
+                       ("serial_buf", 0, 0x20, STT_OBJECT, STB_GLOBAL, ".bss")])
+            write_elf(os.path.join(build_path, "main.o"),
+                      [(".text", 1, 6, 0, 0x48)],
+                      [("main.cpp", 0, 0, STT_FILE, STB_LOCAL, None),
+                       ("helper", 0, 0x8, STT_FUNC, STB_LOCAL, ".text"),
+                       ("main", 0x8, 0x30, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("mbed_die", 0x38, 0x10, STT_FUNC, STB_GLOBAL, ".text")])
+            image = os.path.join(build_path, "app.elf")
+            write_elf(image,
+                      [(".text", 1, 6, 0x0, 0x100),
+                       (".data", 1, 3, 0x20000000, 0x10),
+                       (".bss", 8, 3, 0x20000010, 0x40),
+                       (".heap", 8, 3, 0x20000050, 0x100),
+                       (".ARM.attributes", 0x70000003, 0, 0, 0x30)],
+                      [("Serial.cpp", 0, 0, STT_FILE, STB_LOCAL, None),
+                       ("helper", 0x11, 0x10, STT_FUNC, STB_LOCAL, ".text"),
+                       ("main.cpp", 0, 0, STT_FILE, STB_LOCAL, None),
+                       ("helper", 0x21, 0x8, STT_FUNC, STB_LOCAL, ".text"),
+                       ("serial_putc", 0x31, 0x20, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("main", 0x51, 0x30, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("main_alias", 0x51, 0x30, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("mbed_die", 0x81, 0x10, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("memcpy", 0x91, 0x10, STT_FUNC, STB_GLOBAL, ".text"),
+                       ("serial_buf", 0x20000010, 0x20, STT_OBJECT, STB_GLOBAL,
+                        ".bss")])
+
+            parser = MemapParser()
+            self.assertTrue(parser.parse_elf(image))
+            self.assertEqual(parser.mem_report, [
+                {"module": "Misc",
+                 "size": {".text": 0xd0, ".data": 0x10, ".bss": 0x20}},
+                {"module": "drivers",
+                 "size": {".text": 0x30, ".data": 0, ".bss": 0x20}},
+                {"summary": {"static_ram": 0x50, "heap": 0x100, "stack": 0,
+                             "total_ram": 0x150, "total_flash": 0x110}}])
+            symbols = list(parser.symbols)
+            self.assertIn(("helper", 0x10, 0x10, ".text", "Serial.o", "drivers"),
+                          symbols)
+            self.assertIn(("helper", 0x20, 0x8, ".text", "main.o", "Misc"),
+                          symbols)
+            self.assertIn(("mbed_die", 0x80, 0x10, ".text", "main.o", "Misc"),
+                          symbols)
+            self.assertIn(("memcpy", 0x90, 0x10, ".text", "", "Misc"), symbols)
+            self.assertNotIn("main_alias", [symbol[0] for symbol in symbols])
+
+            not_elf = os.path.join(build_path, "app.map")
+            open(not_elf, "w").close()
+            self.assertFalse(MemapParser().parse_elf(not_elf))
+        finally:
+            rmtree(build_path)
+
+
+class SizeHistoryTests(unittest.TestCase):
+    """
+    Test cases for the size history
+    """
+
+    @staticmethod
+    def mem_report(flash, static_ram, text):
+        return [{"module": "drivers",
+                 "size": {".text": text, ".data": 0, ".bss": 4}},
+                {"summary": {"static_ram": static_ram, "heap": 0, "stack": 0,
+                             "total_ram": static_ram, "total_flash": flash}}]
+
+    def test_record_and_check(self):
+        """
+        Test ensures that a build replaces the earlier build of its commit,
+        and that its growth since the latest build of another commit is
+        checked against the limits, in bytes or as a percentage
+
+        :return:
+        """
+        key = lambda commit: ("K64F", "GCC_ARM", "develop", "basic", commit)
+        with SizeHistory(":memory:") as history:
+            history.record(key("a"), self.mem_report(1000, 100, 10), when=1)
+            history.record(key("b"), self.mem_report(1100, 100, 20), when=2)
+            history.record(key("b"), self.mem_report(1040, 120, 30), when=3)
+
+            trend = history.trend(module="drivers", project="basic")
+            self.assertEqual([(row["commit_id"], row["total_flash"], row["text"])
+                              for row in trend],
+                             [("a", 1000, 10), ("b", 1040, 30)])
+            self.assertEqual([row["builds"] for row in history.projects()], [2])
+
+            self.assertEqual(history.check(key("b"), "40", "20"), [])
+            self.assertEqual(history.check(key("b"), "5%", ""), [])
+            regressions = history.check(key("b"), "39", "10%")
+            self.assertEqual(len(regressions), 2)
+            self.assertIn("grew by 40 bytes to 1040 since commit a",
+                          regressions[0])
+            self.assertEqual(history.check(key("c"), "0", "0"), [])
+
 
 if __name__ == '__main__':
     unittest.main()
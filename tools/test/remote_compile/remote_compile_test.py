@@ -0,0 +1,134 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.remote_compile import CompileServer, RemotePool
+from tools.utils import compile_worker
+
+
+def test_remote_compile_with_a_local_worker(tmpdir):
+    """Test that compile jobs run on a compile worker, with the files they
+    read shipped to it, and fall back to compiling locally"""
+    from threading import Thread
+    work_dir = str(tmpdir)
+    server = CompileServer(("localhost", 0), os.path.join(work_dir, "worker"),
+                           allowed=["python*"])
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        host_dir = os.path.join(work_dir, "host")
+        os.makedirs(os.path.join(host_dir, "inc"))
+        os.makedirs(os.path.join(host_dir, "build"))
+        header = os.path.join(host_dir, "inc", "h.h")
+        includes = os.path.join(host_dir, "build", ".includes.txt")
+        for path, data in [(header, "header\n"),
+                           (os.path.join(host_dir, "a.c"), "source\n"),
+                           (includes, "-I%s" % os.path.dirname(header))]:
+            with open(path, "w") as file_out:
+                file_out.write(data)
+        # Concatenates the header and the source into the object
+        script = ("import os, sys\n"
+                  "inc = open(sys.argv[1][1:]).read()[2:]\n"
+                  "header = os.path.join(inc, 'h.h')\n"
+                  "out = open(sys.argv[3], 'w')\n"
+                  "out.write(open(header).read() + open(sys.argv[2]).read())\n"
+                  "out.write(os.getcwd())\n"
+                  "open(sys.argv[3][:-2] + '.d', 'w').write(header)\n")
+
+        def job(name, executable):
+            return {'source': "a.c", 'object': os.path.join("build", name),
+                    'commands': [[executable, "-c", script, "@" + includes,
+                                  "a.c", os.path.join("build", name)]],
+                    'work_dir': host_dir, 'chroot': None,
+                    'inputs': ["a.c", includes, header]}
+
+        pool = RemotePool(["localhost:%d/2" % server.server_address[1]],
+                          os.path.join(host_dir, "build"))
+        jobs = [job("remote.o", sys.executable), job("local.o", "env")]
+        jobs[1]['commands'][0].insert(1, sys.executable)
+        results = pool.imap_unordered(compile_worker, jobs)
+        for _ in jobs:
+            result = results.next(30)
+            assert [res['code'] for res in result['results']] == [0]
+
+        with open(os.path.join(host_dir, "build", "remote.o")) as obj:
+            content = obj.read()
+        assert content.startswith("header\nsource\n")
+        assert content.endswith(host_dir) and content != "header\nsource\n" + host_dir
+        with open(os.path.join(host_dir, "build", "remote.d")) as dep:
+            assert dep.read() == header
+        # "env" is not an allowed executable: the job ran on the build host
+        with open(os.path.join(host_dir, "build", "local.o")) as obj:
+            assert obj.read() == "header\nsource\n" + host_dir
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_compile_server_refuses_unsafe_jobs(tmpdir):
+    """Test that a compile worker refuses jobs naming files outside of their
+    directory or running programs through compiler options"""
+    from hashlib import md5
+    server = CompileServer(("localhost", 0), str(tmpdir.join("worker")),
+                           allowed=["arm-none-eabi-gcc"])
+    try:
+        sandbox = str(tmpdir.mkdir("sandbox"))
+        server.store.put(md5("-wrapper evil").hexdigest(), "-wrapper evil")
+
+        def compile(args=(), files=(), outputs=("/host/main.o",),
+                    work_dir="/host"):
+            return server.compile(sandbox, {}, {
+                'job': {'source': "main.c", 'object': "main.o",
+                        'commands': [["arm-none-eabi-gcc"] + list(args)],
+                        'work_dir': work_dir},
+                'files': [[path, md5("-wrapper evil").hexdigest(), True]
+                          for path in files],
+                'outputs': list(outputs), 'roots': ["/host"]})
+
+        for reply in [compile(files=["/host/../../escaped.txt"]),
+                      compile(outputs=["/host/../../../main.o"]),
+                      compile(work_dir="/../.."),
+                      compile(args=["-fplugin=/tmp/evil.so", "-c"]),
+                      compile(args=["-wrapper", "evil", "-c"]),
+                      compile(args=["-B/tmp/evil/", "-c"]),
+                      compile(args=["@/host/.flags.txt"],
+                              files=["/host/.flags.txt"]),
+                      compile(args=["--via", "/host/.flags.txt"],
+                              files=["/host/.flags.txt"]),
+                      compile(args=["-c", "-o", "/elsewhere/main.o"]),
+                      compile(args=["-c", "-o/elsewhere/main.o"]),
+                      compile(args=["-c", "-MF", "../../main.d"]),
+                      compile(args=["-c", "-save-temps=/elsewhere"]),
+                      compile(args=["-c", "-Wp,-MD,/elsewhere/main.d"])]:
+            assert "error" in reply
+        assert not tmpdir.join("escaped.txt").exists()
+        assert tmpdir.join("sandbox", "host", ".flags.txt").exists()
+
+        # Paths the host names are moved into the directory of the
+        # connection, and macro values are not paths
+        work_dir = os.path.join(sandbox, "host")
+        CompileServer._check_arguments(
+            ["-c", os.path.join(work_dir, "main.c"), "-o", "main.o",
+             "-I../host/hal", "-DPATH=\"/usr/lib\""], work_dir, sandbox)
+    finally:
+        server.server_close()
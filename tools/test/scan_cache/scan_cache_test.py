@@ -0,0 +1,77 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.toolchains import TOOLCHAIN_CLASSES
+from tools.targets import TARGET_MAP
+from tools.scan_cache import ScanCache
+
+
+def test_scan_cache_lists_changed_directories_again(tmpdir):
+    """Test that the scan cache keeps the listings of unchanged directories,
+    between scans and between processes, and lists changed ones again"""
+    work_dir = str(tmpdir)
+    tree = os.path.join(work_dir, "tree")
+    cache_dir = os.path.join(work_dir, "cache")
+    for name in ["a.c", "TARGET_K64F/b.c", "TARGET_LPC1768/c.c",
+                 "lib/d.c", "lib/e.c", "lib/.mbedignore"]:
+        path = os.path.join(tree, *name.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as out:
+            out.write("e.c\n" if name.endswith(".mbedignore") else "")
+
+    def settle():
+        for root, _, files in os.walk(tree):
+            for name in files + [""]:
+                os.utime(os.path.join(root, name), (1000, 1000))
+
+    def scan(cache):
+        toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"])
+        toolchain.scan_threads = 1
+        toolchain.scan_cache = cache
+        return sorted(toolchain.scan_resources(tree).c_sources)
+
+    settle()
+    expected = [os.path.join(tree, name) for name in
+                ["TARGET_K64F/b.c", "a.c", "lib/d.c"]]
+    cache = ScanCache(cache_dir)
+    assert scan(cache) == scan(None) == expected
+    # Directories of other targets are not walked, so not listed
+    assert len(cache.dirs) == 3 and len(cache.ignores) == 1
+    # Saved at the end of the scan
+    assert os.path.exists(os.path.join(cache_dir, ScanCache.FILENAME))
+
+    cache = ScanCache(cache_dir)
+    assert len(cache.dirs) == 3
+    assert scan(cache) == expected
+    assert not cache.changed
+
+    with open(os.path.join(tree, "lib", "f.c"), "w"):
+        pass
+    with open(os.path.join(tree, "lib", ".mbedignore"), "w") as out:
+        out.write("d.c\n")
+    assert scan(cache) == scan(None) == [
+        os.path.join(tree, name) for name in
+        ["TARGET_K64F/b.c", "a.c", "lib/e.c", "lib/f.c"]]
+    # Just modified, the lib directory is listed again by the next scan
+    assert os.path.join(tree, "lib") not in cache.dirs
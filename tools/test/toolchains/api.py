@@ -12,8 +12,10 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
 sys.path.insert(0, ROOT)
 
 from tools.toolchains import TOOLCHAIN_CLASSES, LEGACY_TOOLCHAIN_NAMES,\
-    Resources
+    Resources, DiagnosticParser, IgnoreMatcher, PathList, get_worker_pool,\
+    end_build_session
 from tools.targets import TARGET_MAP
+from tools.utils import compile_worker, run_cmd, ToolException
 
 def test_instantiation():
     """Test that all exported toolchain may be instantiated"""
@@ -125,3 +127,374 @@ def test_detect_duplicates(filenames):
         assert "dupe.s" in notification["message"]
         assert "dupe.c" in notification["message"]
         assert "dupe.cpp" in notification["message"]
+
+
+def test_worker_pool_is_shared_by_the_session():
+    """Test that the build session pool is started once, keeps the job budget
+    of its first user and is replaced after the session ends"""
+    pool = get_worker_pool(2)
+    try:
+        assert get_worker_pool(8) is pool
+        assert len(pool._pool) == 2
+    finally:
+        end_build_session()
+    assert get_worker_pool(1) is not pool
+    end_build_session()
+
+
+def test_terminated_session_kills_running_compilers(tmpdir):
+    """Test that ending the build session on a failure also kills the
+    compilers its workers are running"""
+    from time import time, sleep
+    work_dir = str(tmpdir)
+    try:
+        pid_file = os.path.join(work_dir, "pid")
+        script = ("import os, time\n"
+                  "open(%r, 'w').write(str(os.getpid()))\n"
+                  "time.sleep(60)\n" % pid_file)
+        get_worker_pool(2).apply_async(compile_worker, [{
+            'source': "a.c", 'object': "a.o", 'work_dir': work_dir,
+            'chroot': None, 'commands': [[sys.executable, "-c", script]]}])
+        deadline = time() + 10
+        while not os.path.exists(pid_file) or not open(pid_file).read():
+            assert time() < deadline
+            sleep(0.01)
+        compiler = int(open(pid_file).read())
+        end_build_session(terminate=True)
+        deadline = time() + 10
+        while True:
+            try:
+                os.kill(compiler, 0)
+            except OSError:
+                break
+            assert time() < deadline
+            sleep(0.01)
+    finally:
+        end_build_session(terminate=True)
+
+
+def test_keep_going_collects_compile_failures():
+    """Test that in keep going mode a failing compile job is recorded instead
+    of ending the build"""
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"],
+                                             notify=lambda event, silent: None)
+    toolchain.compiled = 0
+    toolchain.to_be_compiled = 1
+    failure = {'source': "a.c", 'object': "a.o", 'duration': 0, 'results': [{
+        'code': 1, 'output': "a.c:1:1: error: expected ;\n",
+        'command': ["cc"]}]}
+    objects = []
+    try:
+        toolchain.compile_result(failure, failure, objects)
+        assert False, "the failure was not raised"
+    except ToolException:
+        pass
+    toolchain.keep_going = True
+    toolchain.compile_result(failure, failure, objects)
+    assert toolchain.compile_failures == ["a.c"]
+    assert objects == []
+
+
+def test_reproducible_compile_command(tmpdir):
+    """Test that reproducible toolchains generate identical compile commands,
+    without the build time stamp"""
+    commands = []
+    for _ in range(2):
+        toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"],
+                                                 macros=["B=1", "A", "B=1"])
+        toolchain.reproducible = True
+        toolchain.inc_md5 = ""
+        toolchain.build_dir = str(tmpdir)
+        toolchain.config_processed = True
+        with patch('os.mkdir'):
+            commands.append(toolchain.compile_command("main.c", "main.o", []))
+        symbols = toolchain.get_symbols()
+        assert symbols.count("B=1") == 1
+        assert symbols.index("B=1") < symbols.index("A")
+    assert commands[0] == commands[1]
+    assert not any("MBED_BUILD_TIMESTAMP" in arg for arg in commands[0][0])
+
+
+def test_pch_only_for_sources_starting_with_mbed_h(tmpdir):
+    """Test that the precompiled header is only given to the C++ sources whose
+    first directive includes mbed.h"""
+    src_dir = str(tmpdir)
+    sources = {}
+    for name, data in [("first.cpp", '// main\n#include "mbed.h"\n'),
+                       ("second.cpp", '#define X 1\n#include "mbed.h"\n'),
+                       ("plain.c", '#include "mbed.h"\n')]:
+        sources[name] = os.path.join(src_dir, name)
+        with open(sources[name], "w") as source:
+            source.write(data)
+
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"])
+    toolchain.inc_md5 = ""
+    toolchain.build_dir = ""
+    toolchain.config_processed = True
+    toolchain.RESPONSE_FILES = False
+    toolchain.pch_file = os.path.join("pch", "mbed.h.gch")
+    assert toolchain.pch_for(sources["first.cpp"]) == toolchain.pch_file
+    assert toolchain.pch_for(sources["second.cpp"]) is None
+    assert toolchain.pch_for(sources["plain.c"]) is None
+    with patch('os.mkdir'):
+        command = toolchain.compile_command(sources["first.cpp"], "first.o",
+                                            ["inc"])[0]
+    assert command.index("-Ipch") < command.index("-Iinc")
+
+    iar = TOOLCHAIN_CLASSES["IAR"](TARGET_MAP["K64F"])
+    assert iar.precompile_header("mbed.h", "pch", []) is None
+
+
+def test_shared_pch_command_and_stale_lock(tmpdir):
+    """Test that a shared precompiled header is compiled without the build
+    time stamp of its first user, and that a lock left behind by a killed
+    build is taken over"""
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"])
+    toolchain.inc_md5 = ""
+    toolchain.build_dir = str(tmpdir)
+    toolchain.config_processed = True
+    toolchain.RESPONSE_FILES = False
+    toolchain.to_be_compiled = 0
+    toolchain.dep_index = MagicMock()
+    toolchain.dep_index.dependencies.side_effect = IOError
+    header = str(tmpdir.join("mbed.h"))
+    pch_command = toolchain.precompile_header(header, "pch", [])[1][0]
+    with patch('os.mkdir'):
+        command = toolchain.compile_command("main.cpp", "main.o", [])[0]
+    assert any(arg.startswith("-DMBED_BUILD_TIMESTAMP=") for arg in command)
+    assert [arg for arg in command if arg.startswith("-D") and
+            not arg.startswith("-DMBED_BUILD_TIMESTAMP=")] == \
+        [arg for arg in pch_command if arg.startswith("-D")]
+
+    pch_root = str(tmpdir.join("pch"))
+    with patch.object(toolchain, "compile_seq") as compile_seq:
+        pch_file = toolchain.compile_pch(header, [], pch_root)
+        lock = pch_file + ".lock"
+        os.mkdir(lock)
+        os.utime(lock, (1000, 1000))
+        assert toolchain.compile_pch(header, [], pch_root) == pch_file
+    assert compile_seq.call_count == 2
+    assert not os.path.exists(lock)
+    assert os.listdir(os.path.dirname(pch_file)) == []
+
+def test_diagnostics_streamed_and_deduplicated(tmpdir):
+    """Test that compiler diagnostics are reported as they are written, and
+    that a warning raised by several translation units is reported once"""
+    events = []
+    notify = lambda event, silent: events.append(event)
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"], notify=notify)
+    header_warning = ("hal/api.h:12:5: warning: unused variable 'x'\n"
+                      "   int x;\n"
+                      "       ^\n")
+    work_dir = str(tmpdir)
+    # Stands for a compiler that only goes on once its first diagnostic
+    # was reported
+    reported = os.path.join(work_dir, "reported")
+    script = ("import os, sys, time\n"
+              "sys.stderr.write(%r)\n"
+              "sys.stderr.flush()\n"
+              "deadline = time.time() + 10\n"
+              "while not os.path.exists(%r):\n"
+              "    if time.time() > deadline: sys.exit(1)\n"
+              "    time.sleep(0.01)\n"
+              "sys.stderr.write('main.c:3:1: error: expected ;\\n')\n"
+              % (header_warning, reported))
+    parser = DiagnosticParser(toolchain)
+
+    def on_line(line):
+        parser.feed(line)
+        if events:
+            open(reported, "w").close()
+
+    _, stderr, code = run_cmd([sys.executable, "-c", script],
+                              on_line=on_line)
+    parser.close()
+    assert code == 0
+    assert stderr.startswith(header_warning)
+    assert [(e['severity'], e['file']) for e in events] == [
+        ('warning', 'hal/api.h'), ('error', 'main.c')]
+
+    toolchain.parse_output(header_warning)
+    toolchain.parse_output("./hal/api.h:12:9: warning: unused variable 'x'\n")
+    assert len(events) == 2
+    assert events[0]['occurrences'] == 3
+    assert events[0]['col'] == 7
+
+    # The warnings of the sources of a library are reported again in the next
+    toolchain.config = MagicMock()
+    toolchain.compile_sources(Resources(), str(tmpdir))
+    toolchain.parse_output(header_warning)
+    warnings = [e for e in events if e['type'] == 'cc']
+    assert len(warnings) == 3
+    assert warnings[2]['occurrences'] == 1
+
+
+def test_parallel_diagnostics_streamed_and_deduplicated(tmpdir):
+    """Test that the diagnostics of compile jobs running in the session pool
+    are reported as the compilers write them, once per warning"""
+    events = []
+    reported = str(tmpdir.join("reported"))
+
+    def notify(event, silent):
+        events.append(event)
+        if event['type'] == 'cc' and event['file'] == "main.c":
+            open(reported, "w").close()
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"], notify=notify)
+    toolchain.compiled = 0
+    toolchain.to_be_compiled = 3
+    header_warning = ("hal/api.h:12:5: warning: unused variable 'x'\n"
+                      "   int x;\n"
+                      "       ^\n")
+    # The last compiler only goes on once its own warning was reported
+    waits = ("sys.stderr.write('main.c:3:5: warning: unused variable y\\n'\n"
+             "                 '   int y;\\n       ^\\n')\n"
+             "sys.stderr.flush()\n"
+             "deadline = time.time() + 10\n"
+             "while not os.path.exists(%r):\n"
+             "    if time.time() > deadline: sys.exit(1)\n"
+             "    time.sleep(0.01)\n" % reported)
+    queue = []
+    for name, script in [("a", ""), ("b", ""), ("c", waits)]:
+        script = ("import os, sys, time\nsys.stderr.write(%r)\n%s"
+                  % (header_warning, script))
+        queue.append({'source': name + ".c",
+                      'object': str(tmpdir.join(name + ".o")),
+                      'commands': [[sys.executable, "-c", script]],
+                      'work_dir': str(tmpdir), 'chroot': None})
+    try:
+        objects = toolchain.compile_queue(queue, [])
+    finally:
+        end_build_session()
+    assert sorted(objects) == sorted(job['object'] for job in queue)
+    warnings = [event for event in events if event['type'] == 'cc']
+    assert [event['file'] for event in warnings] == ["hal/api.h", "main.c"]
+    assert warnings[0]['occurrences'] == 3
+
+
+def test_parallel_scan_matches_serial_scan(tmpdir):
+    """Test that scanning a tree with threads finds the same resources, in the
+    same order, as the serial scan"""
+    work_dir = str(tmpdir)
+    files = ["main.cpp", "lib/a.c", "lib/a.h", "lib/sub/b.c", "lib/.mbedignore",
+             "lib/ignored/c.c", "TARGET_K64F/d.c", "TARGET_LPC1768/e.c",
+             "TOOLCHAIN_GCC_ARM/f.S", "TESTS/t/main.cpp", "more/g.cpp",
+             "FEATURE_BLE/h.c", "FEATURE_BLE/src/i.c",
+             "FEATURE_BLE/FEATURE_NESTED/j.c", "more/FEATURE_LWIP/k.c"]
+    for name in files:
+        path = os.path.join(work_dir, *name.split("/"))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as out:
+            out.write("ignored/*\n" if name.endswith(".mbedignore") else "")
+
+    def scan(threads):
+        toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"])
+        toolchain.scan_threads = threads
+        return toolchain.scan_resources(work_dir)
+
+    def state(resources):
+        fields = dict(resources.__dict__)
+        fields['features'] = dict((name, state(feature)) for name, feature
+                                  in resources.features.items())
+        return fields
+
+    serial = scan(1)
+    assert sorted(serial.features) == ["BLE", "LWIP"]
+    assert serial.features["BLE"].features.keys() == ["NESTED"]
+    assert not any("ignored" in path or "TESTS" in path or "LPC1768" in path
+                   for path in serial.c_sources + serial.cpp_sources)
+    for threads in [2, 8]:
+        assert state(scan(threads)) == state(serial)
+
+
+def test_ignore_matcher_matches_like_fnmatch():
+    """Test that the compiled .mbedignore patterns ignore the same paths as
+    matching each pattern with fnmatch"""
+    import fnmatch
+    from os.path import join
+    ignore_files = [(".", ["*.py", "build/*"]),
+                    ("lib", ["*", "!x"]),
+                    ("src", ["sub/*.c", "*.h", "other/"]),
+                    ("src/sub", ["a?.cpp", "[bc].s", "../f.c"]),
+                    ("s[r]c", ["*.c"]),
+                    ("src2", ["/abs/*"])]
+    matcher = IgnoreMatcher()
+    patterns = []
+    for directory, lines in ignore_files:
+        matcher.add(directory, lines)
+        patterns.extend(lines if directory == "." else
+                        [join(directory, line) for line in lines])
+
+    paths = ["main.py", "build/", "build/x.o", "lib/", "lib/a.c", "libs/a.c",
+             "src/", "src/a.c", "src/a.h", "src/sub/", "src/sub/b.c",
+             "src/sub/a1.cpp", "src/sub/a12.cpp", "src/sub/b.s", "src/other/",
+             "src/other/x.c", "src/sub/../f.c", "src/f.c", "src2/a.c",
+             "/abs/x", "src2/abs/x", "./", "s[r]c/a.c"]
+    for path in [join(*path.split("/")) for path in paths]:
+        assert matcher.match(path) == any(fnmatch.fnmatch(path, pattern)
+                                          for pattern in patterns), path
+
+    # Patterns added after a match are compiled in
+    assert not matcher.match(join("src", "sub", "z.txt"))
+    matcher.add(join("src", "sub"), ["z.*"])
+    assert matcher.match(join("src", "sub", "z.txt"))
+
+
+def test_resources_hold_each_path_once():
+    """Test that adding resources to each other does not duplicate paths, that
+    copies are independent and that relative paths are kept per feature"""
+    import pickle
+    from os.path import join
+    paths = PathList(["a.c", "b.c"])
+    paths.append("a.c")
+    paths += ["c.c", "b.c"]
+    paths.insert(0, "c.c")
+    assert paths == ["a.c", "b.c", "c.c"] and "c.c" in paths
+    paths[0] = "b.c"
+    assert paths == ["b.c", "c.c"] and "a.c" not in paths
+    del paths[0]
+    assert paths == ["c.c"] and "b.c" not in paths
+    assert pickle.loads(pickle.dumps(paths, 2)) == paths
+
+    base = join("root", "src")
+    res = Resources(base)
+    res.c_sources.append(join(base, "main.c"))
+    res.inc_dirs.append(base)
+    res.file_basepath[base] = "root"
+    res.file_basepath.add(join(base, "main.c"), "root")
+    res.file_basepath.add(join("other", "x.c"), "other")
+    assert dict.keys(res.file_basepath) == [base, join("other", "x.c")]
+    assert res.file_basepath[join(base, "main.c")] == "root"
+    assert join(base, "main.c") in res.file_basepath
+    feature = Resources(base)
+    feature.c_sources.append(join(base, "FEATURE_X", "x.c"))
+    res.features["X"] = feature
+
+    copied = deepcopy(res)
+    for _ in range(2):
+        copied.add(feature)
+        copied.add(res)
+    assert copied.c_sources == [join(base, "main.c"),
+                                join(base, "FEATURE_X", "x.c")]
+    assert res.c_sources == [join(base, "main.c")]
+
+    copied.relative_to("root", dot=True)
+    assert copied.c_sources == ["./" + join("src", "main.c"),
+                                "./" + join("src", "FEATURE_X", "x.c")]
+    assert copied.inc_dirs == ["./src"]
+    assert copied.features["X"].c_sources == ["./" + join("src", "FEATURE_X",
+                                                          "x.c")]
+
+
+def test_object_paths_are_normalized(tmpdir):
+    """Test that the objects of the sources of the base directory are named
+    like the objects a scan of the build directory finds"""
+    toolchain = TOOLCHAIN_CLASSES["GCC_ARM"](TARGET_MAP["K64F"])
+    toolchain.prev_dir = None
+    build = str(tmpdir.join("build"))
+    source = str(tmpdir.join("main.c"))
+    assert toolchain.relative_object_path(build, str(tmpdir), source) == \
+        os.path.join(build, "main.o")
+    assert toolchain.relative_object_path(
+        build, str(tmpdir), str(tmpdir.join("sub", "x.c"))) == \
+        os.path.join(build, "sub", "x.o")
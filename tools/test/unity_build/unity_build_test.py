@@ -0,0 +1,77 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sys
+import os
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
+                                    ".."))
+sys.path.insert(0, ROOT)
+
+from tools.unity_build import UnityBuild, REGROUP_AFTER
+
+
+def test_unity_build_plan(tmpdir):
+    """Test that the sources of a directory are grouped into unity files, that
+    failing and edited sources are then compiled on their own, and that
+    edited sources are grouped again once they are left unmodified"""
+    from time import time
+    work_dir = str(tmpdir)
+    src_dir = os.path.join(work_dir, "src")
+    build_dir = os.path.join(work_dir, "build")
+    os.mkdir(src_dir)
+    os.mkdir(build_dir)
+    sources = []
+    for name in ["a.c", "b.c", "c.cpp", "d.cpp", "e.cpp", "f.S"]:
+        sources.append(os.path.join(src_dir, name))
+        with open(sources[-1], "w") as source:
+            source.write("/* %s */\n" % ("x" * 40))
+        os.utime(sources[-1], (1000, 1000))
+    basepath = dict((source, work_dir) for source in sources)
+
+    unity = UnityBuild(build_dir, 120)
+    planned = unity.plan(sources, basepath)
+    groups = sorted(unity.groups.values())
+    assert groups == [sources[0:2], sources[2:4]]
+    assert sorted(set(planned) - set(unity.groups)) == sources[4:]
+    for path, members in unity.groups.items():
+        assert path.startswith(unity.source_base())
+        with open(path) as unity_file:
+            content = unity_file.read()
+        assert all(member.replace("\\", "/") in content
+                   for member in members)
+
+    failed = [path for path, members in unity.groups.items()
+              if members == sources[0:2]][0]
+    assert unity.split(failed) == sources[0:2]
+    unity.exclude(sources[0:2])
+    unity.save([])
+
+    os.utime(sources[2], (time() + 10, time() + 10))
+    unity = UnityBuild(build_dir, 120)
+    planned = unity.plan(sources, basepath)
+    assert unity.groups.values() == [sources[3:5]]
+    assert set(sources[0:3]) < set(planned)
+    unity.save([])
+
+    os.utime(sources[2], (1000, 1000))
+    for _ in range(REGROUP_AFTER):
+        unity = UnityBuild(build_dir, 120)
+        assert sources[2] in unity.edited
+        unity.plan(sources, basepath)
+        unity.save([])
+    assert sorted(unity.groups.values()) == [sources[2:4]]
+    assert UnityBuild(build_dir, 120).edited == {}
@@ -31,7 +31,7 @@ import ctypes
 from types import ListType
 from colorama import Fore, Back, Style
 from prettytable import PrettyTable
-from copy import copy
+from copy import copy, deepcopy
 
 from time import sleep, time
 from Queue import Queue, Empty
@@ -46,6 +46,8 @@ from tools.tests import TEST_MAP
 from tools.paths import BUILD_DIR
 from tools.paths import HOST_TESTS
 from tools.utils import ToolException
+from tools.job_control import start_job_control
+from tools.settings import BUILD_MEMORY_RESERVE
 from tools.utils import NotSupportedException
 from tools.utils import construct_enum
 from tools.memap import MemapParser
@@ -60,6 +62,7 @@ from tools.build_api import create_result
 from tools.build_api import add_result_to_report
 from tools.build_api import prepare_toolchain
 from tools.build_api import scan_resources
+from tools.build_api import SharedScan
 from tools.build_api import get_config
 from tools.libraries import LIBRARIES, LIBRARY_MAP
 from tools.options import extract_profile
@@ -2071,6 +2074,18 @@ def norm_relative_path(path, start):
     return path
 
 
+# The SharedScan of the base source paths of the tests built by a worker of
+# build_tests
+_SHARED_SCAN = None
+
+def _init_build_test_worker(shared_scan):
+    """Keep the shared scan of build_tests in the worker, so the tests it
+    builds do not carry a copy each
+    """
+    global _SHARED_SCAN
+    _SHARED_SCAN = shared_scan
+
+
 def build_test_worker(*args, **kwargs):
     """This is a worker function for the parallel building of tests. The `args`
     and `kwargs` are passed directly to `build_project`. It returns a dictionary
@@ -2099,7 +2114,7 @@ def build_test_worker(*args, **kwargs):
     del kwargs['toolchain_paths']
 
     try:
-        bin_file = build_project(*args, **kwargs)
+        bin_file = build_project(*args, shared_scan=_SHARED_SCAN, **kwargs)
         ret['result'] = True
         ret['bin_file'] = bin_file
         ret['kwargs'] = kwargs
@@ -2122,7 +2137,9 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
                 clean=False, notify=None, verbose=False, jobs=1, macros=None,
                 silent=False, report=None, properties=None,
                 continue_on_build_fail=False, app_config=None,
-                build_profile=None):
+                build_profile=None, reproducible=False, pch=False,
+                unity=False, keep_going=False, optimize_includes=False,
+                size_history=None, compile_timeout=None):
     """Given the data structure from 'find_tests' and the typical build parameters,
     build all the tests
 
@@ -2150,8 +2167,21 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
 
     result = True
 
+    # The base source paths are scanned once here, rather than by the build
+    # of every test
+    base_toolchain = prepare_toolchain(base_source_paths, target, toolchain_name,
+                                       macros=macros, silent=True,
+                                       app_config=app_config,
+                                       build_profile=deepcopy(build_profile))
+    shared_scan = SharedScan(base_source_paths, base_toolchain)
+
     jobs_count = int(jobs if jobs else cpu_count())
-    p = Pool(processes=jobs_count)
+    # The test builds share one budget of concurrent compilers, which the
+    # controller lowers when memory or the CPUs run short
+    start_job_control(jobs_count, BUILD_MEMORY_RESERVE)
+    # Each worker gets the shared scan once, rather than with every test
+    p = Pool(processes=jobs_count, initializer=_init_build_test_worker,
+             initargs=(shared_scan,))
     results = []
     for test_name, test_path in tests.iteritems():
         test_build_path = os.path.join(build_path, test_path)
@@ -2171,6 +2201,13 @@ def build_tests(tests, base_source_paths, build_path, target, toolchain_name,
             'verbose': verbose,
             'app_config': app_config,
             'build_profile': build_profile,
+            'reproducible': reproducible,
+            'pch': os.path.join(build_path, ".pch") if pch else False,
+            'unity': unity,
+            'keep_going': keep_going,
+            'optimize_includes': optimize_includes,
+            'size_history': size_history,
+            'compile_timeout': compile_timeout,
             'silent': True,
             'toolchain_paths': TOOLCHAIN_PATHS
         }
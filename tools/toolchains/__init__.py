@@ -16,24 +16,43 @@ limitations under the License.
 """
 
 import re
+import os
 import sys
-from os import stat, walk, getcwd, sep, remove
+import atexit
+from os import stat, walk, getcwd, sep, remove, getpid, getenv, rmdir, rename
+import signal
+from os import mkdir as mkdir_lock
 from copy import copy
 from time import time, sleep
 from types import ListType
 from shutil import copyfile
-from os.path import join, splitext, exists, relpath, dirname, basename, split, abspath, isfile, isdir
+from os.path import join, splitext, exists, relpath, dirname, basename, split, abspath, isfile, isdir, normpath
 from inspect import getmro
 from copy import deepcopy
+from collections import OrderedDict
+from Queue import Queue, Empty
+from threading import Thread
 from tools.config import Config
 from abc import ABCMeta, abstractmethod
 from distutils.spawn import find_executable
 
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, TimeoutError, cpu_count
+from multiprocessing import Queue as ProcessQueue
 from tools.utils import run_cmd, mkdir, rel_path, ToolException, NotSupportedException, split_path, compile_worker
-from tools.settings import MBED_ORG_USER
+from tools.settings import MBED_ORG_USER, COMPILE_CACHE_DIR, COMPILE_CACHE_SIZE, UNITY_MAX_SIZE
+from tools.settings import COMPILE_WORKERS, BUILD_MEMORY_RESERVE, SCAN_THREADS
+from tools.settings import SCAN_CACHE_DIR, MEMAP_SOURCE, COMPILE_TIMEOUT
+from tools.compile_cache import CompileCache
+from tools.compile_times import CompileTimes
+from tools.dep_index import DependencyIndex
+from tools.config_macros import ConfigMacroTracker
+from tools.unity_build import UnityBuild
+from tools.include_paths import IncludePaths
+from tools.remote_compile import RemotePool
+from tools.job_control import start_job_control, reset_job_control
+from tools.scan_cache import get_scan_cache, read_ignore_file
 import tools.hooks as hooks
-from tools.memap import MemapParser
+from tools.memap import MemapParser, ObjectModules
 from hashlib import md5
 import fnmatch
 
@@ -42,36 +61,238 @@ import fnmatch
 CPU_COUNT_MIN = 1
 CPU_COEF = 1
 
+# The worker pool of the current build session, and the process owning it
+_WORKER_POOL = None
+_WORKER_POOL_PID = None
+# The queue the workers send the error output of their compilers through,
+# as (object, line) pairs, ending with (object, None) once the job is done
+_LINE_QUEUE = None
+
+def _init_worker(line_queue=None):
+    global _LINE_QUEUE
+    _LINE_QUEUE = line_queue
+    # Each worker leads a process group of its own, shared with the compilers
+    # it runs, for end_build_session to kill them all
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+def streaming_compile_worker(job):
+    """Run a compile job in a worker of the build session, sending the error
+    output of the compilers to the build as they write it (see compile_queue)
+    """
+    try:
+        return compile_worker(
+            job, on_line=lambda line: _LINE_QUEUE.put((job['object'], line)))
+    finally:
+        _LINE_QUEUE.put((job['object'], None))
+
+def get_worker_pool(jobs):
+    """Get the worker pool shared by every compile, archive and link of the
+    build session, starting it on first use
+
+    The size of the pool is the job budget of the whole session: it is fixed
+    by the first caller, so nested build steps asking for more jobs share the
+    same workers instead of starting more of them.
+
+    Positional arguments:
+    jobs - the number of workers to start if the pool does not exist yet
+    """
+    global _WORKER_POOL, _WORKER_POOL_PID, _LINE_QUEUE
+    # A pool inherited through fork belongs to the parent process
+    if _WORKER_POOL is None or _WORKER_POOL_PID != getpid():
+        # The workers share the job controller, set up before they are forked
+        start_job_control(jobs, BUILD_MEMORY_RESERVE)
+        _LINE_QUEUE = ProcessQueue()
+        _WORKER_POOL = Pool(processes=jobs, initializer=_init_worker,
+                            initargs=(_LINE_QUEUE,))
+        _WORKER_POOL_PID = getpid()
+    return _WORKER_POOL
+
+def end_build_session(terminate=False):
+    """Stop the worker pool of the build session, if any
+
+    Keyword arguments:
+    terminate - kill the workers and the compilers they are running rather
+                than letting running jobs finish
+    """
+    global _WORKER_POOL, _WORKER_POOL_PID, _LINE_QUEUE
+    if _WORKER_POOL is not None and _WORKER_POOL_PID == getpid():
+        if terminate:
+            # The compilers outlive their workers, but stay in their process
+            # groups. Killing workers first could leave the lock of the task
+            # queue taken, for the pool to wait on it forever
+            groups = [worker.pid for worker in _WORKER_POOL._pool]
+            _WORKER_POOL.terminate()
+            if hasattr(os, 'killpg'):
+                for group in groups:
+                    try:
+                        os.killpg(group, signal.SIGKILL)
+                    except OSError:
+                        pass
+            reset_job_control()
+        else:
+            _WORKER_POOL.close()
+        _WORKER_POOL.join()
+    _WORKER_POOL = None
+    _WORKER_POOL_PID = None
+    _LINE_QUEUE = None
+
+atexit.register(end_build_session)
+
+class PathList(list):
+    """A list of paths holding each path once, in the order they were first
+    added, with a membership test in constant time
+
+    Resources are added to each other again and again, by the scans of
+    overlapping paths and by the configuration adding features, which would
+    otherwise compile and link the same files twice. Paths are strings, so
+    copies only copy the list.
+    """
+
+    def __init__(self, paths=()):
+        list.__init__(self)
+        self._members = set()
+        self.extend(paths)
+
+    def __contains__(self, path):
+        return path in self._members
+
+    def append(self, path):
+        if path not in self._members:
+            self._members.add(path)
+            list.append(self, path)
+
+    def extend(self, paths):
+        members = self._members
+        for path in paths:
+            if path not in members:
+                members.add(path)
+                list.append(self, path)
+
+    def __iadd__(self, paths):
+        self.extend(paths)
+        return self
+
+    def insert(self, index, path):
+        if path not in self._members:
+            self._members.add(path)
+            list.insert(self, index, path)
+
+    def remove(self, path):
+        list.remove(self, path)
+        self._members.discard(path)
+
+    def pop(self, index=-1):
+        path = list.pop(self, index)
+        self._members.discard(path)
+        return path
+
+    def _replace(self, paths):
+        paths = list(paths)
+        del self[:]
+        self.extend(paths)
+
+    def __setitem__(self, index, path):
+        paths = list(self)
+        paths[index] = path
+        self._replace(paths)
+
+    def __setslice__(self, start, stop, paths):
+        self.__setitem__(slice(start, stop), paths)
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self._members = set(self)
+
+    def __delslice__(self, start, stop):
+        self.__delitem__(slice(start, stop))
+
+    def __copy__(self):
+        copied = PathList()
+        list.extend(copied, self)
+        copied._members = set(self._members)
+        return copied
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    def __reduce__(self):
+        return (PathList, (list(self),))
+
+    def __reduce_ex__(self, protocol):
+        return self.__reduce__()
+
+
+class BasePaths(dict):
+    """The base path of each file and directory of the resources
+
+    The files met by a scan have the base path of their directory, so only
+    the directories are kept, and the files that do not have the base path of
+    their directory. The base path of a file is looked up through its
+    directory.
+    """
+
+    def __missing__(self, path):
+        directory = dirname(path)
+        if directory != path and dict.__contains__(self, directory):
+            return dict.__getitem__(self, directory)
+        raise KeyError(path)
+
+    def __contains__(self, path):
+        return (dict.__contains__(self, path) or
+                dict.__contains__(self, dirname(path)))
+
+    def has_key(self, path):
+        return path in self
+
+    def get(self, path, default=None):
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def add(self, path, base_path):
+        """Record the base path of a file, unless its directory gives it"""
+        if dict.get(self, dirname(path)) != base_path:
+            self[path] = base_path
+
+
+# The fields of Resources holding lists of paths
+RESOURCE_LISTS = ['inc_dirs', 'headers', 's_sources', 'c_sources',
+                  'cpp_sources', 'objects', 'libraries', 'lib_builds',
+                  'lib_refs', 'repo_dirs', 'repo_files', 'hex_files',
+                  'bin_files', 'json_files']
+
 class Resources:
     def __init__(self, base_path=None):
         self.base_path = base_path
 
-        self.file_basepath = {}
+        self.file_basepath = BasePaths()
 
-        self.inc_dirs = []
-        self.headers = []
+        self.inc_dirs = PathList()
+        self.headers = PathList()
 
-        self.s_sources = []
-        self.c_sources = []
-        self.cpp_sources = []
+        self.s_sources = PathList()
+        self.c_sources = PathList()
+        self.cpp_sources = PathList()
 
         self.lib_dirs = set([])
-        self.objects = []
-        self.libraries = []
+        self.objects = PathList()
+        self.libraries = PathList()
 
         # mbed special files
-        self.lib_builds = []
-        self.lib_refs = []
+        self.lib_builds = PathList()
+        self.lib_refs = PathList()
 
-        self.repo_dirs = []
-        self.repo_files = []
+        self.repo_dirs = PathList()
+        self.repo_files = PathList()
 
         self.linker_script = None
 
         # Other files
-        self.hex_files = []
-        self.bin_files = []
-        self.json_files = []
+        self.hex_files = PathList()
+        self.bin_files = PathList()
+        self.json_files = PathList()
 
         # Features
         self.features = {}
@@ -89,37 +310,41 @@ class Resources:
             return self.add(resources)
 
     def add(self, resources):
-        for f,p in resources.file_basepath.items():
-            self.file_basepath[f] = p
+        self.file_basepath.update(resources.file_basepath)
 
-        self.inc_dirs += resources.inc_dirs
-        self.headers += resources.headers
-
-        self.s_sources += resources.s_sources
-        self.c_sources += resources.c_sources
-        self.cpp_sources += resources.cpp_sources
+        for field in RESOURCE_LISTS:
+            paths = getattr(self, field)
+            if not isinstance(paths, PathList):
+                paths = PathList(paths)
+                setattr(self, field, paths)
+            paths.extend(getattr(resources, field))
 
         self.lib_dirs |= resources.lib_dirs
-        self.objects += resources.objects
-        self.libraries += resources.libraries
-
-        self.lib_builds += resources.lib_builds
-        self.lib_refs += resources.lib_refs
-
-        self.repo_dirs += resources.repo_dirs
-        self.repo_files += resources.repo_files
 
         if resources.linker_script is not None:
             self.linker_script = resources.linker_script
 
-        self.hex_files += resources.hex_files
-        self.bin_files += resources.bin_files
-        self.json_files += resources.json_files
-
         self.features.update(resources.features)
 
         return self
 
+    def copy(self):
+        """A copy of the resources and of their features, sharing the path
+        strings
+        """
+        copied = Resources(self.base_path)
+        copied.file_basepath = BasePaths(self.file_basepath)
+        for field in RESOURCE_LISTS:
+            setattr(copied, field, PathList(getattr(self, field)))
+        copied.lib_dirs = set(self.lib_dirs)
+        copied.linker_script = self.linker_script
+        copied.features = dict((name, feature.copy()) for name, feature
+                               in self.features.items())
+        return copied
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
     def _collect_duplicates(self, dupe_dict, dupe_headers):
         for filename in self.s_sources + self.c_sources + self.cpp_sources:
             objname, _ = splitext(basename(filename))
@@ -157,31 +382,36 @@ class Resources:
         return count
 
 
-    def relative_to(self, base, dot=False):
-        for field in ['inc_dirs', 'headers', 's_sources', 'c_sources',
-                      'cpp_sources', 'lib_dirs', 'objects', 'libraries',
-                      'lib_builds', 'lib_refs', 'repo_dirs', 'repo_files',
-                      'hex_files', 'bin_files', 'json_files']:
-            v = [rel_path(f, base, dot) for f in getattr(self, field)]
-            setattr(self, field, v)
+    def _map_paths(self, convert):
+        for field in RESOURCE_LISTS:
+            setattr(self, field, PathList(convert(f) for f in getattr(self, field)))
+        self.lib_dirs = set(convert(f) for f in self.lib_dirs)
 
-        self.features = {k: f.relative_to(base, dot) for k, f in self.features.iteritems() if f}
+        for feature in self.features.values():
+            feature._map_paths(convert)
 
         if self.linker_script is not None:
-            self.linker_script = rel_path(self.linker_script, base, dot)
-
-    def win_to_unix(self):
-        for field in ['inc_dirs', 'headers', 's_sources', 'c_sources',
-                      'cpp_sources', 'lib_dirs', 'objects', 'libraries',
-                      'lib_builds', 'lib_refs', 'repo_dirs', 'repo_files',
-                      'hex_files', 'bin_files', 'json_files']:
-            v = [f.replace('\\', '/') for f in getattr(self, field)]
-            setattr(self, field, v)
+            self.linker_script = convert(self.linker_script)
 
-        self.features = {k: f.win_to_unix() for k, f in self.features.iteritems() if f}
+    def relative_to(self, base, dot=False):
+        # Files share their directory with many others, so the relative path
+        # of each directory is only computed once
+        directories = {}
+        def convert(path):
+            directory, name = split(path)
+            if not name or name in ('.', '..'):
+                return rel_path(path, base, dot)
+            if directory not in directories:
+                directories[directory] = relpath(directory, base)
+            relative = directories[directory]
+            relative = name if relative == '.' else join(relative, name)
+            if dot and not relative.startswith('.'):
+                relative = './' + relative
+            return relative
+        self._map_paths(convert)
 
-        if self.linker_script is not None:
-            self.linker_script = self.linker_script.replace('\\', '/')
+    def win_to_unix(self):
+        self._map_paths(lambda path: path.replace('\\', '/'))
 
     def __str__(self):
         s = []
@@ -226,6 +456,181 @@ LEGACY_TOOLCHAIN_NAMES = {
 }
 
 
+class IgnoreMatcher(object):
+    """The patterns of the .mbedignore files met by scans, matched as
+    fnmatch.fnmatch matches them one after the other
+
+    A pattern read in directory "a/b" only matches paths under "a/b/", so the
+    patterns are grouped by directory and a path is only tested against the
+    groups of its ancestors. The patterns of a group are compiled into one
+    regular expression, recompiled once the group grows. Patterns that are not
+    confined to a directory, such as those of the scan root, are tested against
+    every path.
+    """
+
+    MAGIC = re.compile("[*?[]")
+
+    def __init__(self):
+        self.groups = {}
+        # Compiled expression of each group, with the number of its patterns.
+        # Scans add patterns from several threads: a count that does not match
+        # the group anymore means a recompile rather than a lock
+        self.compiled = {}
+
+    def add(self, directory, patterns):
+        """Add the patterns of the .mbedignore file of a directory
+
+        Positional arguments:
+        directory - the path of the directory relative to the base of the scan
+        patterns - the patterns of the file
+        """
+        directory = os.path.normcase(directory)
+        for pattern in patterns:
+            pattern = os.path.normcase(pattern)
+            if directory == ".":
+                self.groups.setdefault("", []).append(pattern)
+                continue
+            full = join(directory, pattern)
+            # A directory name with wildcards matches more than itself
+            if (full.startswith(directory + sep) and
+                    not self.MAGIC.search(directory)):
+                self.groups.setdefault(directory, []).append(
+                    full[len(directory) + 1:])
+            else:
+                self.groups.setdefault("", []).append(full)
+
+    def copy(self):
+        """A matcher that does not see the patterns added to this one, and
+        shares its compiled expressions
+        """
+        matcher = IgnoreMatcher()
+        matcher.groups = dict((group, list(patterns)) for group, patterns
+                              in self.groups.items())
+        matcher.compiled = dict(self.compiled)
+        return matcher
+
+    def _match(self, group, path):
+        patterns = self.groups.get(group)
+        if not patterns:
+            return False
+        count = len(patterns)
+        compiled = self.compiled.get(group)
+        if compiled is None or compiled[0] != count:
+            compiled = (count, re.compile("|".join(
+                "(?:%s)" % fnmatch.translate(pattern)
+                for pattern in patterns[:count])))
+            self.compiled[group] = compiled
+        return compiled[1].match(path) is not None
+
+    def match(self, path):
+        """Whether a path, relative to the base of the scan, is ignored"""
+        path = os.path.normcase(path)
+        if self._match("", path):
+            return True
+        prefix = None
+        for part in path.split(sep)[:-1]:
+            prefix = part if prefix is None else prefix + sep + part
+            if self._match(prefix, path[len(prefix) + 1:]):
+                return True
+        return False
+
+
+class ScanTask(object):
+    """A directory walk run by a ScanPool, holding its result once run"""
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except Exception:
+            self.error = sys.exc_info()
+
+    def get(self):
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.result
+
+
+class ScanPool(object):
+    """Threads walking the directories of a resource scan
+
+    Tasks may submit more tasks, and are never waited on but by join, once
+    they all ran: a task waiting on another could hold the last thread the
+    other one needs. The threads are started for one scan only, as
+    multiprocessing.pool.ThreadPool takes a tenth of a second to stop.
+    """
+
+    def __init__(self, threads):
+        self.tasks = Queue()
+        self.threads = [Thread(target=self._work) for _ in range(threads)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    return
+                task.run()
+            finally:
+                self.tasks.task_done()
+
+    def submit(self, func, *args):
+        task = ScanTask(func, args)
+        self.tasks.put(task)
+        return task
+
+    def join(self):
+        """Wait for every task, including the ones submitted by tasks, and
+        stop the threads
+        """
+        self.tasks.join()
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class DiagnosticParser(object):
+    """Extracts the diagnostics of a compiler from its output, one line at a
+    time, so that they can be reported while the compiler runs
+
+    A diagnostic starts with a line matched by the toolchain and goes on until
+    the line pointing at its column, or the next diagnostic.
+    """
+
+    def __init__(self, toolchain):
+        self.toolchain = toolchain
+        self.msg = None
+
+    def feed(self, line):
+        match = self.toolchain.match_diagnostic(line)
+        if match is not None:
+            self.close()
+            self.msg = self.toolchain.new_diagnostic(match)
+        elif self.msg is not None:
+            # Determine the warning/error column by calculating the ^ position
+            match = self.toolchain.INDEX_PATTERN.match(line)
+            if match is not None:
+                self.msg['col'] = len(match.group('col'))
+                self.close()
+            else:
+                self.msg['text'] += line+"\n"
+
+    def close(self):
+        """Report the diagnostic in progress, if any"""
+        if self.msg is not None:
+            self.toolchain.cc_diagnostic(self.msg)
+            self.msg = None
+
+
 class mbedToolchain:
     # Verbose logging
     VERBOSE = True
@@ -252,6 +657,16 @@ class mbedToolchain:
 
     MBED_CONFIG_FILE_NAME="mbed_config.h"
 
+    # Generated translation unit holding the build time stamp in reproducible
+    # builds. The hidden directory keeps it out of later resource scans.
+    TIMESTAMP_SOURCE = join(".mbed", "mbed_build_timestamp.c")
+
+    # Header precompiled for the C++ sources that include it first
+    PCH_HEADER = "mbed.h"
+    # The first preprocessor directive of a source file
+    FIRST_DIRECTIVE_PATTERN = re.compile(r'^[ \t]*#[ \t]*(.*)$', re.MULTILINE)
+    PCH_INCLUDE_PATTERN = re.compile(r'include\s*[<"]%s[>"]' % re.escape(PCH_HEADER))
+
     __metaclass__ = ABCMeta
 
     profile_template = {'common':[], 'c':[], 'cxx':[], 'asm':[], 'ld':[]}
@@ -298,14 +713,55 @@ class mbedToolchain:
         self.build_dir = None
         self.timestamp = time()
 
+        # Reproducible builds: identical inputs give identical command lines,
+        # objects and binaries. The build time stamp is kept out of the common
+        # command line and compiled into a single generated translation unit.
+        self.reproducible = False
+        self.timestamp_compiled = False
+
+        # Precompiled mbed.h: False, True to keep it in the build directory, or
+        # a directory where several builds share it (see compile_pch)
+        self.pch = False
+        self.pch_file = None
+        # Whether each source starts with including mbed.h
+        self.pch_sources = {}
+
+        # Unity build: the sources of each directory are compiled together
+        # (see tools/unity_build.py)
+        self.unity = False
+        self.unity_build = None
+        # Unity sources that failed to compile in the current build
+        self.unity_failed = []
+
+        # Keep going: compile every source even when some fail, and report
+        # all the failures at the end of compile_sources
+        self.keep_going = False
+        self.compile_failures = []
+
+        # Optimized include paths: only the include directories headers are
+        # found through, the most used first (see tools/include_paths.py)
+        self.optimize_includes = False
+
         # Output build naming based on target+toolchain combo (mbed 2.0 builds)
         self.obj_path = join("TARGET_"+target.name, "TOOLCHAIN_"+self.name)
 
         # Number of concurrent build jobs. 0 means auto (based on host system cores)
         self.jobs = 0
 
+        # Seconds a parallel compile may go without any compiler output or
+        # finished job before it is considered hung
+        self.compile_timeout = COMPILE_TIMEOUT
+
         # Ignore patterns from .mbedignore files
         self.ignore_patterns = []
+        self.ignore_matcher = IgnoreMatcher()
+
+        # Threads walking the directories of a scan, 1 for a serial walk
+        self.scan_threads = SCAN_THREADS or min(2 * cpu_count(), 8)
+        # Directory listings shared by the scans of the process, None to list
+        # every directory again
+        self.scan_cache = get_scan_cache(SCAN_CACHE_DIR)
+        self._scan_depth = 0
 
         # Pre-mbed 2.0 ignore dirs
         self.legacy_ignore_dirs = (LEGACY_IGNORE_DIRS | TOOLCHAINS) - set([target.name, LEGACY_TOOLCHAIN_NAMES[self.name]])
@@ -332,6 +788,9 @@ class mbedToolchain:
         # Print output buffer
         self.output = str()
         self.map_outputs = list()   # Place to store memmap scan results in JSON like data structures
+        # Warnings reported by the compiler, by file, line and message (see
+        # cc_diagnostic)
+        self.warnings = {}
 
         # uVisor spepcific rules
         if 'UVISOR' in self.target.features and 'UVISOR_SUPPORTED' in self.target.extra_labels:
@@ -344,6 +803,26 @@ class mbedToolchain:
         # Used by the mbed Online Build System to build in chrooted environment
         self.CHROOT = None
 
+        # Object cache shared between builds (see tools/compile_cache.py)
+        if COMPILE_CACHE_DIR:
+            self.compile_cache = CompileCache(COMPILE_CACHE_DIR,
+                                              COMPILE_CACHE_SIZE)
+        else:
+            self.compile_cache = None
+
+        # Compile durations of the current build directory, loaded by
+        # compile_sources (see tools/compile_times.py)
+        self.compile_times = None
+
+        # Dependency graph of the current build directory, loaded by
+        # compile_sources (see tools/dep_index.py)
+        self.dep_index = None
+        self.compile_headers = []
+
+        # Configuration macros changed in the current build directory, set up
+        # by get_config_header (see tools/config_macros.py)
+        self.config_macros = None
+
         # Call post __init__() hooks before the ARM/GCC_ARM/IAR toolchain __init__() takes over
         self.init()
 
@@ -427,7 +906,8 @@ class mbedToolchain:
                 self.asm_symbols += self.target.macros
                 # Add extra symbols passed via 'macros' parameter
                 self.asm_symbols += self.macros
-            return list(set(self.asm_symbols))  # Return only unique symbols
+            # Return only unique symbols, in a stable order
+            return list(OrderedDict.fromkeys(self.asm_symbols))
         else:
             if self.cxx_symbols is None:
                 # Target and Toolchain symbols
@@ -440,7 +920,9 @@ class mbedToolchain:
                     self.cxx_symbols.extend(mbedToolchain.CORTEX_SYMBOLS[self.target.core])
 
                 # Symbols defined by the on-line build.system
-                self.cxx_symbols.extend(['MBED_BUILD_TIMESTAMP=%s' % self.timestamp, 'TARGET_LIKE_MBED', '__MBED__=1'])
+                if not self.reproducible:
+                    self.cxx_symbols.append('MBED_BUILD_TIMESTAMP=%s' % self.timestamp)
+                self.cxx_symbols.extend(['TARGET_LIKE_MBED', '__MBED__=1'])
                 if MBED_ORG_USER:
                     self.cxx_symbols.append('MBED_USERNAME=' + MBED_ORG_USER)
 
@@ -457,7 +939,8 @@ class mbedToolchain:
                 if hasattr(self.target, 'supported_form_factors'):
                     self.cxx_symbols.extend(["TARGET_FF_%s" % t for t in self.target.supported_form_factors])
 
-            return list(set(self.cxx_symbols))  # Return only unique symbols
+            # Return only unique symbols, in a stable order
+            return list(OrderedDict.fromkeys(self.cxx_symbols))
 
     # Extend the internal list of macros
     def add_macros(self, new_macros):
@@ -498,11 +981,17 @@ class mbedToolchain:
         for d in dependencies:
             # Some objects are not provided with full path and here we do not have
             # information about the library paths. Safe option: assume an update
-            if not d or not exists(d):
+            if not d:
                 return True
-            
+
             if not self.stat_cache.has_key(d):
-                self.stat_cache[d] = stat(d).st_mtime
+                try:
+                    mod_time = self.dep_index.mtime(d) if self.dep_index else None
+                    if mod_time is None:
+                        mod_time = stat(d).st_mtime
+                except OSError:
+                    return True
+                self.stat_cache[d] = mod_time
 
             if self.stat_cache[d] >= target_mod_time:
                 return True
@@ -511,10 +1000,7 @@ class mbedToolchain:
 
     def is_ignored(self, file_path):
         """Check if file path is ignored by any .mbedignore thus far"""
-        for pattern in self.ignore_patterns:
-            if fnmatch.fnmatch(file_path, pattern):
-                return True
-        return False
+        return self.ignore_matcher.match(file_path)
 
     def add_ignore_patterns(self, root, base_path, patterns):
         """Add a series of patterns to the ignored paths
@@ -529,6 +1015,7 @@ class mbedToolchain:
             self.ignore_patterns.extend(patterns)
         else:
             self.ignore_patterns.extend(join(real_base, pat) for pat in patterns)
+        self.ignore_matcher.add(real_base, patterns)
 
     # Create a Resources object from the path pointed to by *path* by either traversing a
     # a directory structure, when *path* is a directory, or adding *path* to the resources,
@@ -547,12 +1034,28 @@ class mbedToolchain:
                 base_path = path
         resources.base_path = base_path
 
-        if isfile(path):
-            self._add_file(path, resources, base_path, exclude_paths=exclude_paths)
-        else:
-            self._add_dir(path, resources, base_path, exclude_paths=exclude_paths)
+        self._scan_depth += 1
+        try:
+            if isfile(path):
+                self._add_file(path, resources, base_path, exclude_paths=exclude_paths)
+            elif self.scan_threads > 1:
+                resources = self._scan_parallel(path, base_path, exclude_paths)
+            else:
+                self._add_dir(path, resources, base_path, exclude_paths=exclude_paths)
+        finally:
+            self._scan_depth -= 1
+            # Features are scanned by nested calls
+            if self._scan_depth == 0 and self.scan_cache is not None:
+                self.scan_cache.save()
         return resources
 
+    # A helper function for _add_dir and _scan_tree. _walk walks *path* as
+    # os.walk(path, followlinks=True), through the listings of the scan cache.
+    def _walk(self, path):
+        if self.scan_cache is not None:
+            return self.scan_cache.walk(path)
+        return walk(path, followlinks=True)
+
     # A helper function for scan_resources. _add_dir traverses *path* (assumed to be a
     # directory) and heeds the ".mbedignore" files along the way. _add_dir calls _add_file
     # on every file it considers adding to the resources object.
@@ -567,63 +1070,129 @@ class mbedToolchain:
         bottom-up mode the directories in dirnames are generated before dirpath
         itself is generated.
         """
+        def add_feature(name, dir_path):
+            # Recursively scan features but ignore them in the current scan.
+            # These are dynamically added by the config system if the conditions are matched
+            resources.features[name] = self.scan_resources(dir_path, base_path=base_path)
+
+        for root, dirs, files in self._walk(path):
+            self._add_root(root, dirs, files, resources, base_path,
+                           add_feature, exclude_paths)
+
+    # A helper function for _add_dir and _scan_tree. _add_root adds one directory
+    # (*root*) met by os.walk to the resources object, and removes from *dirs* the
+    # subdirectories that must not be walked. *add_feature* is called on the
+    # FEATURE_ subdirectories.
+    def _add_root(self, root, dirs, files, resources, base_path, add_feature,
+                  exclude_paths=None):
         labels = self.get_labels()
-        for root, dirs, files in walk(path, followlinks=True):
-            # Check if folder contains .mbedignore
-            if ".mbedignore" in files:
-                with open (join(root,".mbedignore"), "r") as f:
-                    lines=f.readlines()
-                    lines = [l.strip() for l in lines] # Strip whitespaces
-                    lines = [l for l in lines if l != ""] # Strip empty lines
-                    lines = [l for l in lines if not re.match("^#",l)] # Strip comment lines
-                    # Append root path to glob patterns and append patterns to ignore_patterns
-                    self.add_ignore_patterns(root, base_path, lines)
-
-            # Skip the whole folder if ignored, e.g. .mbedignore containing '*'
-            if self.is_ignored(join(relpath(root, base_path),"")):
-                dirs[:] = []
-                continue
+        # Check if folder contains .mbedignore
+        if ".mbedignore" in files:
+            ignore_file = join(root, ".mbedignore")
+            if self.scan_cache is not None:
+                lines = self.scan_cache.ignore_patterns(ignore_file)
+            else:
+                lines = read_ignore_file(ignore_file)
+            # Append root path to glob patterns and append patterns to ignore_patterns
+            self.add_ignore_patterns(root, base_path, lines)
 
-            for d in copy(dirs):
-                dir_path = join(root, d)
-                # Add internal repo folders/files. This is needed for exporters
-                if d == '.hg' or d == '.git':
-                    resources.repo_dirs.append(dir_path)
-
-                if ((d.startswith('.') or d in self.legacy_ignore_dirs) or
-                    # Ignore targets that do not match the TARGET in extra_labels list
-                    (d.startswith('TARGET_') and d[7:] not in labels['TARGET']) or
-                    # Ignore toolchain that do not match the current TOOLCHAIN
-                    (d.startswith('TOOLCHAIN_') and d[10:] not in labels['TOOLCHAIN']) or
-                    # Ignore .mbedignore files
-                    self.is_ignored(join(relpath(root, base_path), d,"")) or
-                    # Ignore TESTS dir
-                    (d == 'TESTS')):
-                        dirs.remove(d)
-                elif d.startswith('FEATURE_'):
-                    # Recursively scan features but ignore them in the current scan.
-                    # These are dynamically added by the config system if the conditions are matched
-                    resources.features[d[8:]] = self.scan_resources(dir_path, base_path=base_path)
-                    dirs.remove(d)
-                elif exclude_paths:
-                    for exclude_path in exclude_paths:
-                        rel_path = relpath(dir_path, exclude_path)
-                        if not (rel_path.startswith('..')):
-                            dirs.remove(d)
-                            break
+        # Skip the whole folder if ignored, e.g. .mbedignore containing '*'
+        if self.is_ignored(join(relpath(root, base_path),"")):
+            dirs[:] = []
+            return
 
-            # Add root to include paths
-            resources.inc_dirs.append(root)
-            resources.file_basepath[root] = base_path
+        for d in copy(dirs):
+            dir_path = join(root, d)
+            # Add internal repo folders/files. This is needed for exporters
+            if d == '.hg' or d == '.git':
+                resources.repo_dirs.append(dir_path)
+
+            if ((d.startswith('.') or d in self.legacy_ignore_dirs) or
+                # Ignore targets that do not match the TARGET in extra_labels list
+                (d.startswith('TARGET_') and d[7:] not in labels['TARGET']) or
+                # Ignore toolchain that do not match the current TOOLCHAIN
+                (d.startswith('TOOLCHAIN_') and d[10:] not in labels['TOOLCHAIN']) or
+                # Ignore .mbedignore files
+                self.is_ignored(join(relpath(root, base_path), d,"")) or
+                # Ignore TESTS dir
+                (d == 'TESTS')):
+                    dirs.remove(d)
+            elif d.startswith('FEATURE_'):
+                add_feature(d[8:], dir_path)
+                dirs.remove(d)
+            elif exclude_paths:
+                for exclude_path in exclude_paths:
+                    rel_path = relpath(dir_path, exclude_path)
+                    if not (rel_path.startswith('..')):
+                        dirs.remove(d)
+                        break
 
-            for file in files:
-                file_path = join(root, file)
-                self._add_file(file_path, resources, base_path)
+        # Add root to include paths
+        resources.inc_dirs.append(root)
+        resources.file_basepath[root] = base_path
+
+        for file in files:
+            file_path = join(root, file)
+            self._add_file(file_path, resources, base_path)
+
+    # A helper function for scan_resources. _scan_parallel walks the directory *path*
+    # like _add_dir, with a walk of its own for each of its subdirectories and for each
+    # feature, run by a pool of threads. The walks are merged in the order of the serial
+    # walk, so that both return the same resources.
+    def _scan_parallel(self, path, base_path, exclude_paths=None):
+        # The labels are cached on first use, which must not race
+        self.get_labels()
+        pool = ScanPool(self.scan_threads)
+        try:
+            scan = pool.submit(self._scan_tree, pool, path, base_path,
+                               exclude_paths, True)
+        finally:
+            pool.join()
+        return self._collect_scan(scan)
+
+    # A helper function for _scan_parallel, run by the threads of the pool. _scan_tree
+    # walks *path* and submits a walk for each feature met. With *fan_out*, only *path*
+    # itself is added and a walk is submitted for each of its subdirectories.
+    def _scan_tree(self, pool, path, base_path, exclude_paths, fan_out):
+        resources = Resources(path)
+        resources.base_path = base_path
+        subtrees = []
+        features = []
+
+        def add_feature(name, dir_path):
+            self.progress("scan", dir_path)
+            features.append((name, pool.submit(self._scan_tree, pool, dir_path,
+                                               base_path, None, True)))
+
+        for root, dirs, files in self._walk(path):
+            self._add_root(root, dirs, files, resources, base_path,
+                           add_feature, exclude_paths)
+            if fan_out:
+                subtrees = [pool.submit(self._scan_tree, pool, join(root, d),
+                                        base_path, exclude_paths, False)
+                            for d in dirs]
+                break
+        return resources, subtrees, features
+
+    # A helper function for _scan_parallel. _collect_scan merges the resources of a walk
+    # with the ones of the walks it submitted.
+    def _collect_scan(self, scan):
+        resources, subtrees, features = scan.get()
+        for name, feature in features:
+            resources.features[name] = self._collect_scan(feature)
+        for subtree in subtrees:
+            subtree_resources = self._collect_scan(subtree)
+            if (resources.linker_script is not None and
+                    subtree_resources.linker_script is not None):
+                self.info("Warning: Multiple linker scripts detected: %s -> %s" %
+                          (resources.linker_script, subtree_resources.linker_script))
+            resources.add(subtree_resources)
+        return resources
 
     # A helper function for both scan_resources and _add_dir. _add_file adds one file
     # (*file_path*) to the resources object based on the file type.
     def _add_file(self, file_path, resources, base_path, exclude_paths=None):
-        resources.file_basepath[file_path] = base_path
+        resources.file_basepath.add(file_path, base_path)
 
         if self.is_ignored(relpath(file_path, base_path)):
             return
@@ -720,12 +1289,148 @@ class mbedToolchain:
     def relative_object_path(self, build_path, base_dir, source):
         source_dir, name, _ = split_path(source)
 
-        obj_dir = join(build_path, relpath(source_dir, base_dir))
+        obj_dir = normpath(join(build_path, relpath(source_dir, base_dir)))
         if obj_dir is not self.prev_dir:
             self.prev_dir = obj_dir
             mkdir(obj_dir)
         return join(obj_dir, name + '.o')
 
+    # Generate the translation unit holding the build time stamp of a
+    # reproducible build. The time stamp is SOURCE_DATE_EPOCH, as defined by
+    # reproducible-builds.org, or 0 when it is not set. The file is only
+    # rewritten when its content changes.
+    def get_timestamp_source(self):
+        source = join(self.build_dir, self.TIMESTAMP_SOURCE)
+        content = ("/* Automatically generated file, DO NOT EDIT. */\n"
+                   "const unsigned long mbed_build_timestamp = %sUL;\n"
+                   % int(getenv("SOURCE_DATE_EPOCH", 0)))
+        if exists(source):
+            with open(source, "rt") as f:
+                if f.read() == content:
+                    return source
+        mkdir(dirname(source))
+        with open(source, "wt") as f:
+            f.write(content)
+        return source
+
+    def uses_pch(self, source):
+        """Whether a source is compiled as C++ and its first preprocessor
+        directive includes mbed.h, so that precompiling mbed.h does not change
+        what the source sees
+        """
+        ext = splitext(source)[1].lower()
+        if not (ext == '.cpp' or (ext == '.c' and self.COMPILE_C_AS_CPP)):
+            return False
+        if source not in self.pch_sources:
+            try:
+                with open(source) as source_in:
+                    match = self.FIRST_DIRECTIVE_PATTERN.search(source_in.read())
+            except IOError:
+                match = None
+            self.pch_sources[source] = bool(
+                match and self.PCH_INCLUDE_PATTERN.match(match.group(1)))
+        return self.pch_sources[source]
+
+    def pch_for(self, source):
+        """The precompiled header a source is compiled with, if any"""
+        if self.pch_file and self.uses_pch(source):
+            return self.pch_file
+        return None
+
+    def get_pch_symbols(self):
+        """The macros a header is precompiled with: those of the sources,
+        without the build time stamp
+
+        The time stamp differs in every build that is not reproducible, and a
+        compiler rejects a precompiled header defining a macro differently
+        from the source using it. mbed.h does not use the time stamp, so it is
+        not defined when precompiling it.
+        """
+        return [s for s in self.get_symbols()
+                if not s.startswith('MBED_BUILD_TIMESTAMP=')]
+
+    def precompile_header(self, header, pch_dir, includes):
+        """Generate the commands that precompile a header
+
+        Positional arguments:
+        header -- the header to precompile
+        pch_dir -- the directory where the precompiled header goes
+        includes -- a list of all the directories where header files may be found
+
+        Return value:
+        A tuple of the precompiled header and the list of commands that
+        generate it, or None when the toolchain does not support precompiled
+        headers
+        """
+        return None
+
+    def compile_pch(self, header, includes, pch_root):
+        """Precompile mbed.h, unless it is up to date
+
+        The precompiled header is kept in a subdirectory of pch_root named after
+        everything it depends on besides its headers: the C++ command line, the
+        macros, the configuration and the header itself. Builds with the same
+        target, toolchain, profile and configuration, such as the tests of a
+        test run, share it; the first of them builds it while the others wait.
+
+        Return value:
+        The precompiled header, or None when the toolchain does not support them
+        """
+        config_file = self.get_config_header()
+        key = md5(' '.join(self.cppc + self.get_pch_symbols() +
+                           [abspath(header)]))
+        if config_file:
+            with open(config_file) as config_in:
+                key.update(config_in.read())
+        pch_dir = join(pch_root, key.hexdigest())
+        result = self.precompile_header(header, pch_dir, includes)
+        if result is None:
+            self.info("Precompiled headers are not supported by %s" % self.name)
+            return None
+        pch_file, commands = result
+        mkdir(pch_dir)
+
+        # Only one build at a time checks and compiles a shared header. A lock
+        # older than compile_timeout was left behind by a killed build: it is
+        # moved away, which only one of the builds waiting for it can do,
+        # before it is taken again
+        lock = pch_file + ".lock"
+        while True:
+            try:
+                mkdir_lock(lock)
+                break
+            except OSError:
+                try:
+                    if time() - stat(lock).st_mtime > self.compile_timeout:
+                        stale = "%s.%d.stale" % (lock, getpid())
+                        rename(lock, stale)
+                        rmdir(stale)
+                        continue
+                except OSError:
+                    # Released or taken over by another build meanwhile
+                    continue
+                sleep(0.1)
+        try:
+            dep_path = splitext(pch_file)[0] + '.d'
+            try:
+                deps = self.dep_index.dependencies(dep_path, self.parse_dependencies)
+            except (IOError, IndexError):
+                deps = []
+            # The configuration is part of the directory name
+            deps = [d for d in deps if basename(d) != self.MBED_CONFIG_FILE_NAME]
+            if not deps or self.need_update(pch_file, deps):
+                self.to_be_compiled += 1
+                self.compile_seq([{
+                    'source': header,
+                    'object': pch_file,
+                    'commands': commands,
+                    'work_dir': getcwd(),
+                    'chroot': self.CHROOT
+                }], [])
+        finally:
+            rmdir(lock)
+        return pch_file
+
     # Generate response file for all includes.
     # ARM, GCC, IAR cross compatible
     def get_inc_file(self, includes):
@@ -778,6 +1483,9 @@ class mbedToolchain:
         files_to_compile = resources.s_sources + resources.c_sources + resources.cpp_sources
         self.to_be_compiled = len(files_to_compile)
         self.compiled = 0
+        self.compile_failures = []
+        # Warnings are deduplicated, and summarized, within these sources
+        self.warnings = {}
 
         self.cc_verbose("Macros: "+' '.join(['-D%s' % s for s in self.get_symbols()]))
 
@@ -788,14 +1496,25 @@ class mbedToolchain:
         inc_paths = set(inc_paths)
         # Sort include paths for consistency
         inc_paths = sorted(set(inc_paths))
+        self.dep_index = DependencyIndex(build_path)
+        if self.optimize_includes:
+            # Include paths given by the caller may hold headers the
+            # resources do not list, they are all kept
+            include_paths = IncludePaths(self.dep_index)
+            inc_paths = include_paths.optimize(inc_paths, resources.headers,
+                                               keep=inc_dirs)
+            self.info("Include paths: %d of %d kept%s, %d of %d file look ups of the last build avoided"
+                      % (len(inc_paths), len(inc_paths) + include_paths.removed,
+                         ", reordered by use" if include_paths.reordered else "",
+                         include_paths.probes_avoided(), include_paths.probes))
         # Unique id of all include paths
         self.inc_md5 = md5(' '.join(inc_paths)).hexdigest()
         # Where to store response files
         self.build_dir = build_path
+        # Headers a compile worker may need (see compile_inputs)
+        self.compile_headers = resources.headers
 
         objects = []
-        queue = []
-        work_dir = getcwd()
         self.prev_dir = None
 
         # Generate configuration header (this will update self.build_all if needed)
@@ -803,99 +1522,325 @@ class mbedToolchain:
 
         # Sort compile queue for consistency
         files_to_compile.sort()
-        for source in files_to_compile:
-            object = self.relative_object_path(build_path, resources.file_basepath[source], source)
+
+        # Precompile mbed.h once for all the C++ sources that start with it
+        self.pch_file = None
+        if self.pch and any(self.uses_pch(source) for source in files_to_compile):
+            headers = sorted((h for h in resources.headers
+                              if basename(h) == self.PCH_HEADER), key=len)
+            if headers:
+                pch_root = (self.pch if isinstance(self.pch, basestring)
+                            else join(build_path, ".pch"))
+                self.pch_file = self.compile_pch(headers[0], inc_paths, pch_root)
+
+        if self.reproducible and not self.timestamp_compiled:
+            timestamp_source = self.get_timestamp_source()
+            resources.file_basepath[timestamp_source] = build_path
+            files_to_compile.append(timestamp_source)
+            self.to_be_compiled += 1
+            self.timestamp_compiled = True
+
+        # Unity build: replace the sources of each directory with generated
+        # sources including them. The state of an earlier unity build is
+        # also loaded when unity builds are off, to remove its objects
+        self.unity_build = None
+        self.unity_failed = []
+        if self.unity or exists(join(build_path, UnityBuild.FILENAME)):
+            self.unity_build = UnityBuild(build_path, UNITY_MAX_SIZE)
+        if self.unity:
+            planned = self.unity_build.plan(files_to_compile, resources.file_basepath)
+            for source, members in self.unity_build.groups.iteritems():
+                resources.file_basepath[source] = self.unity_build.source_base()
+                # Objects of the members must not be linked with their unity
+                # object
+                for member in members:
+                    object = self.relative_object_path(
+                        build_path, resources.file_basepath[member], member)
+                    if exists(object):
+                        remove(object)
+            self.to_be_compiled += len(planned) - len(files_to_compile)
+            files_to_compile = planned
+            self.info("Unity build: %d sources in %d unity files, %d compiled separately"
+                      % (self.unity_build.members(), len(self.unity_build.groups),
+                         len([s for s in planned if s not in self.unity_build.groups
+                              and splitext(s)[1].lower() in ['.c', '.cpp']])))
+
+        self.compile_times = CompileTimes(build_path)
+        try:
+            objects = self.compile_files(files_to_compile, build_path,
+                                         resources.file_basepath, inc_paths,
+                                         objects)
+            if self.unity_failed:
+                # The sources of unity sources that failed are compiled on
+                # their own. When they all compile, they do not compile
+                # together, and are kept apart in the next builds. Otherwise
+                # they are grouped again once their errors are fixed
+                groups = []
+                for source in self.unity_failed:
+                    members = self.unity_build.split(source)
+                    self.info("Unity build: %s failed, compiling its %d sources separately"
+                              % (relpath(source, self.unity_build.source_base()),
+                                 len(members)))
+                    groups.append(members)
+                self.unity_failed = []
+                separate = sorted(sum(groups, []))
+                self.to_be_compiled += len(separate)
+                objects = self.compile_files(separate, build_path,
+                                             resources.file_basepath,
+                                             inc_paths, objects)
+                for members in groups:
+                    if not any(member in self.compile_failures
+                               for member in members):
+                        self.unity_build.exclude(members)
+        finally:
+            # Keep the durations and dependencies of the jobs that did
+            # finish, even when the build fails
+            self.compile_times.save()
+            self.dep_index.save()
+            if self.unity_build:
+                self.unity_build.save([
+                    self.relative_object_path(build_path,
+                                              self.unity_build.source_base(),
+                                              source)
+                    for source in self.unity_build.groups])
+
+        # Modules of the objects, for the memory map of the link (see
+        # ObjectModules in tools/memap.py)
+        object_modules = ObjectModules(build_path)
+        object_modules.update(objects)
+        object_modules.save()
+
+        if self.compile_cache:
+            self.compile_cache.trim()
+            self.info("Compile cache: %(hits)d hits, %(misses)d misses"
+                      % self.compile_cache.stats())
+        repeats = sum(msg['occurrences'] - 1 for msg in self.warnings.values())
+        if repeats:
+            self.info("Compiler warnings: %d unique, %d repeats in other translation units not shown"
+                      % (len(self.warnings), repeats))
+        if self.compile_failures:
+            raise ToolException("%d of %d sources failed to compile:\n%s" % (
+                len(self.compile_failures), self.to_be_compiled,
+                "\n".join(self.compile_failures)))
+        return objects
+
+    def compile_files(self, sources, build_path, file_basepath, inc_paths, objects):
+        """Compile the sources that are out of date, and add the objects of
+        all the sources to objects
+        """
+        queue = []
+        work_dir = getcwd()
+        for source in sources:
+            object = self.relative_object_path(build_path, file_basepath[source], source)
 
             # Queue mode (multiprocessing)
             commands = self.compile_command(source, object, inc_paths)
             if commands is not None:
-                queue.append({
+                job = {
                     'source': source,
                     'object': object,
                     'commands': commands,
                     'work_dir': work_dir,
                     'chroot': self.CHROOT
-                })
+                }
+                if self.compile_cache and self.compile_cache.fetch(self, job):
+                    self.compiled += 1
+                    self.progress("cached", source, build_update=True)
+                    self.index_dependencies(object)
+                    objects.append(object)
+                else:
+                    queue.append(job)
             else:
                 self.compiled += 1
                 objects.append(object)
 
-        # Use queues/multiprocessing if cpu count is higher than setting
+        # Use queues/multiprocessing if cpu count is higher than setting, or
+        # compile workers. The session pool is already running after the
+        # first call, so even short queues are worth spreading over it
         jobs = self.jobs if self.jobs else cpu_count()
-        if jobs > CPU_COUNT_MIN and len(queue) > jobs:
-            return self.compile_queue(queue, objects)
+        if (jobs > CPU_COUNT_MIN or COMPILE_WORKERS) and len(queue) > 1:
+            # Start the jobs that took longest in previous builds first
+            scheduled = self.compile_times.schedule(queue)
+            before, after = self.compile_times.saving(
+                queue, scheduled, int(self.jobs if self.jobs else cpu_count() * CPU_COEF))
+            if after < before:
+                self.info("Longest-first scheduling: %.1fs estimated instead of %.1fs (%.1fs saved)"
+                          % (after, before, before - after))
+            return self.compile_queue(scheduled, objects)
         else:
             return self.compile_seq(queue, objects)
 
-    # Compile source files queue in sequential order
-    def compile_seq(self, queue, objects):
-        for item in queue:
-            result = compile_worker(item)
+    def compile_result(self, job, result, objects):
+        """Report the outcome of a compile job, and add its object to objects
 
-            self.compiled += 1
-            self.progress("compile", item['source'], build_update=True)
+        Raises ToolException when the job failed, except for unity sources,
+        which are kept in unity_failed for their sources to be compiled on
+        their own, and in keep going mode, where the source is added to
+        compile_failures
+        """
+        self.compiled += 1
+        self.progress("compile", result['source'], build_update=True)
+        if (self.unity_build and result['source'] in self.unity_build.groups and
+                any(res['code'] != 0 for res in result['results'])):
+            self.unity_failed.append(result['source'])
+            return
+        try:
             for res in result['results']:
                 self.cc_verbose("Compile: %s" % ' '.join(res['command']), result['source'])
                 self.compile_output([
                     res['code'],
                     res['output'],
                     res['command']
-                ])
-            objects.append(result['object'])
+                ], parsed=result.get('parsed', False))
+        except ToolException:
+            if not self.keep_going:
+                raise
+            self.compile_failures.append(result['source'])
+            return
+        if self.compile_cache:
+            self.compile_cache.store(self, job)
+        if self.compile_times:
+            self.compile_times.record(result['object'], result['duration'])
+        self.index_dependencies(result['object'])
+        objects.append(result['object'])
+
+    # Compile source files queue in sequential order
+    def compile_seq(self, queue, objects):
+        for item in queue:
+            # Diagnostics are reported as the compiler writes them, except for
+            # unity sources, which are compiled again when they fail
+            if self.unity_build and item['source'] in self.unity_build.groups:
+                result = compile_worker(item)
+            else:
+                parser = DiagnosticParser(self)
+                result = compile_worker(item, on_line=parser.feed)
+                parser.close()
+                result['parsed'] = True
+            self.compile_result(item, result, objects)
         return objects
 
-    # Compile source files queue in parallel by creating pool of worker threads
+    # Compile source files queue in parallel using the build session's pool
     def compile_queue(self, queue, objects):
         jobs_count = int(self.jobs if self.jobs else cpu_count() * CPU_COEF)
-        p = Pool(processes=jobs_count)
-
-        results = []
-        for i in range(len(queue)):
-            results.append(p.apply_async(compile_worker, [queue[i]]))
-        p.close()
-
-        itr = 0
-        while len(results):
-            itr += 1
-            if itr > 180000:
+        if COMPILE_WORKERS:
+            p = RemotePool(COMPILE_WORKERS, self.build_dir)
+            for job in queue:
+                job['inputs'] = self.compile_inputs(job)
+        else:
+            p = get_worker_pool(jobs_count)
+
+        # Results are delivered in completion order, so each finished job is
+        # handled exactly once, as soon as it is done
+        pending = dict((job['object'], job) for job in queue)
+        try:
+            if COMPILE_WORKERS:
+                results = p.imap_unordered(compile_worker, queue)
+                for _ in range(len(queue)):
+                    result = self.next_result(results)
+                    self.compile_result(pending.pop(result['object']), result,
+                                        objects)
+            else:
+                results = p.imap_unordered(streaming_compile_worker, queue)
+                self.stream_results(results, pending, objects)
+        except:
+            # Jobs of a failed compile must not keep running in the session
+            # pool; the next compile starts a fresh one
+            if COMPILE_WORKERS:
                 p.terminate()
-                p.join()
-                raise ToolException("Compile did not finish in 5 minutes")
+            else:
+                end_build_session(terminate=True)
+            raise
 
-            sleep(0.01)
-            pending = 0
-            for r in results:
-                if r._ready is True:
-                    try:
-                        result = r.get()
-                        results.remove(r)
-
-                        self.compiled += 1
-                        self.progress("compile", result['source'], build_update=True)
-                        for res in result['results']:
-                            self.cc_verbose("Compile: %s" % ' '.join(res['command']), result['source'])
-                            self.compile_output([
-                                res['code'],
-                                res['output'],
-                                res['command']
-                            ])
-                        objects.append(result['object'])
-                    except ToolException, err:
-                        if p._taskqueue.queue:
-                            p._taskqueue.queue.clear()
-                            sleep(0.5)
-                        p.terminate()
-                        p.join()
-                        raise ToolException(err)
-                else:
-                    pending += 1
-                    if pending >= jobs_count:
-                        break
+        return objects
 
-        results = None
-        p.join()
+    def next_result(self, results):
+        """The next compile result of a pool, waiting for compile_timeout
+        seconds at most: the build is hung when no job finishes in that time
+        """
+        try:
+            return results.next(self.compile_timeout)
+        except TimeoutError:
+            raise ToolException("No compile job finished in %s seconds"
+                                % self.compile_timeout)
+
+    def stream_results(self, results, pending, objects):
+        """Report the diagnostics of the jobs running in the session pool as
+        their compilers write them, and their results as they finish
+
+        The diagnostics of each job are parsed on their own, and deduplicated
+        across jobs as in compile_seq. The result of a job is only handled
+        once its last line was read, which the job sends before its result.
+        The build is hung when no job writes a line or finishes in
+        compile_timeout seconds, however long each job takes.
 
-        return objects
+        Positional arguments:
+        results - the results of the pool, in completion order
+        pending - the jobs that did not finish, by object
+        objects - the list to add the objects of the jobs to
+        """
+        # Unity sources are compiled again when they fail, so their
+        # diagnostics are only reported when they succeed, as in compile_seq
+        parsers = dict((obj, DiagnosticParser(self)) for obj, job
+                       in pending.items()
+                       if not (self.unity_build and
+                               job['source'] in self.unity_build.groups))
+        finished = {}
+        while pending:
+            try:
+                obj, line = _LINE_QUEUE.get(timeout=self.compile_timeout)
+            except Empty:
+                raise ToolException("No compile job wrote or finished "
+                                    "anything in %s seconds"
+                                    % self.compile_timeout)
+            parser = parsers.get(obj)
+            if line is not None:
+                if parser:
+                    parser.feed(line)
+                continue
+            if parser:
+                parser.close()
+            while obj not in finished:
+                result = self.next_result(results)
+                finished[result['object']] = result
+            result = finished.pop(obj)
+            result['parsed'] = parser is not None
+            self.compile_result(pending.pop(obj), result, objects)
+
+    def compile_inputs(self, job):
+        """The files a compile job may read, for it to run on a compile
+        worker: the files named on its command lines, the configuration
+        header and the headers the object depended on in the previous build,
+        or all the headers of the build when it was not built yet
+        """
+        inputs = []
+        for command in job['commands']:
+            for arg in command[1:]:
+                path = arg.lstrip('@').split('=')[-1]
+                if isfile(path):
+                    inputs.append(path)
+        if self.unity_build:
+            inputs.extend(self.unity_build.groups.get(job['source'], []))
+        if self.config_file:
+            inputs.append(self.config_file)
+        if self.pch_for(job['source']):
+            inputs.append(self.pch_file)
+        try:
+            deps = self.dep_index.dependencies(
+                splitext(job['object'])[0] + '.d', self.parse_dependencies)
+        except (IOError, OSError, IndexError):
+            deps = []
+        return inputs + (deps or self.compile_headers)
+
+    def index_dependencies(self, object):
+        """Add the dependency file the compiler just produced for an object
+        to the dependency index of the build directory
+        """
+        dep_path = splitext(object)[0] + '.d'
+        if self.dep_index and exists(dep_path):
+            try:
+                self.dep_index.update(dep_path, self.parse_dependencies)
+            except (IOError, OSError, IndexError):
+                pass
 
     # Determine the compile command based on type of source file
     def compile_command(self, source, object, includes):
@@ -907,10 +1852,20 @@ class mbedToolchain:
             base, _ = splitext(object)
             dep_path = base + '.d'
             try:
-                deps = self.parse_dependencies(dep_path) if (exists(dep_path)) else []
+                if self.dep_index:
+                    deps = self.dep_index.dependencies(dep_path, self.parse_dependencies)
+                else:
+                    deps = self.parse_dependencies(dep_path) if (exists(dep_path)) else []
             except IOError, IndexError:
                 deps = []
-            if len(deps) == 0 or self.need_update(object, deps):
+            if deps and self.config_file:
+                # Changes of the configuration header are tracked per macro
+                config_file = normpath(self.config_file)
+                deps = [d for d in deps if normpath(d) != config_file] or [source]
+            if deps and self.pch_for(source):
+                deps.append(self.pch_file)
+            if (len(deps) == 0 or self.need_update(object, deps) or
+                (self.config_macros and self.config_macros.need_update(object, deps))):
                 if ext == '.cpp' or self.COMPILE_C_AS_CPP:
                     return self.compile_cpp(source, object, includes)
                 else:
@@ -942,7 +1897,32 @@ class mbedToolchain:
     def is_not_supported_error(self, output):
         return "#error directive: [NOT_SUPPORTED]" in output
 
-    @abstractmethod
+    def match_diagnostic(self, line):
+        """Match the first line of a diagnostic of the compiler
+
+        Positional arguments:
+        line -- a line of the output of the compiler
+
+        Return value:
+        A match of DIAGNOSTIC_PATTERN, or None
+        """
+        return self.DIAGNOSTIC_PATTERN.match(line)
+
+    def new_diagnostic(self, match):
+        """Make the description of a diagnostic from the match of its first
+        line by match_diagnostic
+        """
+        return {
+            'severity': match.group('severity').lower(),
+            'file': match.group('file'),
+            'line': match.group('line'),
+            'col': 0,
+            'message': match.group('message'),
+            'text': '',
+            'target_name': self.target.name,
+            'toolchain_name': self.name
+        }
+
     def parse_output(self, output):
         """Take in compiler output and extract sinlge line warnings and errors from it.
 
@@ -953,17 +1933,22 @@ class mbedToolchain:
         None
 
         Side effects:
-        call self.cc_info or self.notify with a description of the event generated by the compiler
+        call self.cc_diagnostic with a description of each event generated by the compiler
         """
-        raise NotImplemented
+        parser = DiagnosticParser(self)
+        for line in output.splitlines():
+            parser.feed(line)
+        parser.close()
 
-    def compile_output(self, output=[]):
+    def compile_output(self, output=[], parsed=False):
         _rc = output[0]
         _stderr = output[1]
         command = output[2]
 
-        # Parse output for Warnings and Errors
-        self.parse_output(_stderr)
+        # Parse output for Warnings and Errors, unless it was parsed while
+        # the compiler ran
+        if not parsed:
+            self.parse_output(_stderr)
         self.debug("Return: %s"% _rc)
         for error_line in _stderr.splitlines():
             self.debug("Output: %s"% error_line)
@@ -981,6 +1966,8 @@ class mbedToolchain:
         fout = join(dir, lib)
         if self.need_update(fout, objects):
             self.info("Library: %s" % lib)
+            if self.reproducible:
+                objects = sorted(objects)
             self.archive(objects, fout)
             needed_update = True
 
@@ -1008,7 +1995,12 @@ class mbedToolchain:
         bin = join(tmp_path, filename)
         map = join(tmp_path, name + '.map')
 
-        r.objects = sorted(set(r.objects))
+        # A build directory inside the scanned sources holds the objects of
+        # the previous build, found again by the scan under another spelling
+        r.objects = sorted(dict((normpath(abspath(obj)), obj)
+                                for obj in r.objects).values())
+        if self.reproducible:
+            r.libraries = sorted(set(r.libraries))
         if self.need_update(elf, r.objects + r.libraries + [r.linker_script]):
             needed_update = True
             self.progress("link", name)
@@ -1029,7 +2021,12 @@ class mbedToolchain:
     # THIS METHOD IS BEING OVERRIDDEN BY THE MBED ONLINE BUILD SYSTEM
     # ANY CHANGE OF PARAMETERS OR RETURN VALUES WILL BREAK COMPATIBILITY
     def default_cmd(self, command):
-        _stdout, _stderr, _rc = run_cmd(command, work_dir=getcwd(), chroot=self.CHROOT)
+        if _WORKER_POOL is not None and _WORKER_POOL_PID == getpid():
+            # Archive and link steps take a slot of the session's job budget
+            _stdout, _stderr, _rc = _WORKER_POOL.apply(
+                run_cmd, [command], {'work_dir': getcwd(), 'chroot': self.CHROOT})
+        else:
+            _stdout, _stderr, _rc = run_cmd(command, work_dir=getcwd(), chroot=self.CHROOT)
         self.debug("Return: %s"% _rc)
 
         for output_line in _stdout.splitlines():
@@ -1062,6 +2059,21 @@ class mbedToolchain:
             info['type'] = 'cc'
             self.notify(info)
 
+    def cc_diagnostic(self, msg):
+        """Report a diagnostic of the compiler. A warning that another
+        translation unit already raised at the same place is only counted, in
+        the 'occurrences' of the first report
+        """
+        if msg['severity'] == 'warning':
+            key = (normpath(msg['file']), msg['line'], msg['message'])
+            first = self.warnings.get(key)
+            if first is not None:
+                first['occurrences'] += 1
+                return
+            msg['occurrences'] = 1
+            self.warnings[key] = msg
+        self.cc_info(msg)
+
     # THIS METHOD IS BEING OVERRIDDEN BY THE MBED ONLINE BUILD SYSTEM
     # ANY CHANGE OF PARAMETERS OR RETURN VALUES WILL BREAK COMPATIBILITY
     def cc_verbose(self, message, file=""):
@@ -1089,13 +2101,22 @@ class mbedToolchain:
         """
         toolchain = self.__class__.__name__
 
-        # Create memap object
-        memap = MemapParser()
+        # Read the linked image next to the map file when asked to (see
+        # MemapParser.parse_elf)
+        memap = None
+        if MEMAP_SOURCE == "elf":
+            memap = MemapParser()
+            if memap.parse_elf(abspath(splitext(map)[0] + ".elf")) is False:
+                memap = None
 
-        # Parse and decode a map file
-        if memap.parse(abspath(map), toolchain) is False:
-            self.info("Unknown toolchain for memory statistics %s" % toolchain)
-            return None
+        if memap is None:
+            # Create memap object
+            memap = MemapParser()
+
+            # Parse and decode a map file
+            if memap.parse(abspath(map), toolchain) is False:
+                self.info("Unknown toolchain for memory statistics %s" % toolchain)
+                return None
 
         # Store the memap instance for later use
         self.memap_instance = memap
@@ -1114,7 +2135,8 @@ class mbedToolchain:
     # - if there is configuration data and "mbed_config.h" does not exist, it is created.
     # - if there is configuration data similar to the previous configuration data,
     #   "mbed_config.h" is left untouched.
-    # - if there is new configuration data, "mbed_config.h" is overriden.
+    # - if there is new configuration data, "mbed_config.h" is overriden and the
+    #   macros that changed are recorded, so that only the objects using them are rebuilt.
     # The function needs to be called exactly once for the lifetime of this toolchain instance.
     # The "config_processed" variable (below) ensures this behaviour.
     # The function returns the location of the configuration file, or None if there is no
@@ -1124,6 +2146,7 @@ class mbedToolchain:
             return self.config_file
         # The config file is located in the build directory
         self.config_file = join(self.build_dir, self.MBED_CONFIG_FILE_NAME)
+        self.config_macros = ConfigMacroTracker(self.build_dir)
         # If the file exists, read its current content in prev_data
         if exists(self.config_file):
             with open(self.config_file, "rt") as f:
@@ -1132,7 +2155,7 @@ class mbedToolchain:
             prev_data = None
         # Get the current configuration data
         crt_data = Config.config_to_header(self.config_data) if self.config_data else None
-        # "changed" indicates if a configuration change was detected
+        # "changed" indicates if the configuration header appeared or disappeared
         changed = False
         if prev_data is not None: # a previous mbed_config.h exists
             if crt_data is None: # no configuration data, so "mbed_config.h" needs to be removed
@@ -1142,7 +2165,8 @@ class mbedToolchain:
             elif crt_data != prev_data: # different content of config file
                 with open(self.config_file, "wt") as f:
                     f.write(crt_data)
-                changed = True
+                # Only the objects that use the changed macros are rebuilt
+                self.config_macros.update(self.config_file, prev_data, crt_data)
         else: # a previous mbed_config.h does not exist
             if crt_data is not None: # there's configuration data available
                 with open(self.config_file, "wt") as f:
@@ -1150,7 +2174,7 @@ class mbedToolchain:
                 changed = True
             else:
                 self.config_file = None # this means "config file not present"
-        # If there was a change in configuration, rebuild everything
+        # If the configuration appeared or disappeared, rebuild everything
         self.build_all = changed
         # Make sure that this function will only return the location of the configuration
         # file for subsequent calls, without trying to manipulate its content in any way.
@@ -81,36 +81,11 @@ class ARM(mbedToolchain):
                 dependencies.append((self.CHROOT if self.CHROOT else '') + match.group('file'))
         return dependencies
         
-    def parse_output(self, output):
-        msg = None
-        for line in output.splitlines():
-            match = ARM.DIAGNOSTIC_PATTERN.match(line)
-            if match is not None:
-                if msg is not None:
-                    self.cc_info(msg)
-                    msg = None
-                msg = {
-                    'severity': match.group('severity').lower(),
-                    'file': match.group('file'),
-                    'line': match.group('line'),
-                    'col': match.group('column') if match.group('column') else 0,
-                    'message': match.group('message'),
-                    'text': '',
-                    'target_name': self.target.name,
-                    'toolchain_name': self.name
-                }
-            elif msg is not None:
-                # Determine the warning/error column by calculating the ^ position
-                match = ARM.INDEX_PATTERN.match(line)
-                if match is not None:
-                    msg['col'] = len(match.group('col'))
-                    self.cc_info(msg)
-                    msg = None
-                else:
-                    msg['text'] += line+"\n"
-        
-        if msg is not None:
-            self.cc_info(msg)
+    def new_diagnostic(self, match):
+        msg = mbedToolchain.new_diagnostic(self, match)
+        if match.group('column'):
+            msg['col'] = match.group('column')
+        return msg
 
     def get_dep_option(self, object):
         base, _ = splitext(object)
@@ -120,8 +95,13 @@ class ARM(mbedToolchain):
     def get_config_option(self, config_header):
         return ['--preinclude=' + config_header]
 
-    def get_compile_options(self, defines, includes, for_asm=False):        
+    def get_pch_option(self, pch_file):
+        return ['--use_pch=' + pch_file]
+
+    def get_compile_options(self, defines, includes, for_asm=False, pch=None):
         opts = ['-D%s' % d for d in defines]
+        if pch is not None:
+            opts += self.get_pch_option(pch)
         if self.RESPONSE_FILES:
             opts += ['--via', self.get_inc_file(includes)]
         else:
@@ -133,6 +113,24 @@ class ARM(mbedToolchain):
                 opts = opts + self.get_config_option(config_header)
         return opts
 
+    def precompile_header(self, header, pch_dir, includes):
+        # armcc precompiles the headers a source includes before its first
+        # token, so the header is precompiled through a source including it
+        pch_file = join(pch_dir, splitext(basename(header))[0] + ".pch")
+        source = join(pch_dir, basename(header) + ".cpp")
+        if not exists(source):
+            mkdir(pch_dir)
+            with open(source, "wt") as f:
+                f.write('#include "%s"\n' % basename(header))
+        cmd = (self.cppc + self.get_compile_options(self.get_pch_symbols(), includes) +
+               self.get_dep_option(pch_file) +
+               ["--create_pch=" + pch_file, "-o", splitext(source)[0] + ".o", source])
+
+        # Call cmdline hook
+        cmd = self.hook.get_cmdline_compiler(cmd)
+
+        return pch_file, [cmd]
+
     @hook_tool
     def assemble(self, source, object, includes):
         # Preprocess first, then assemble
@@ -156,7 +154,8 @@ class ARM(mbedToolchain):
     @hook_tool
     def compile(self, cc, source, object, includes):
         # Build compile command
-        cmd = cc + self.get_compile_options(self.get_symbols(), includes)
+        cmd = cc + self.get_compile_options(self.get_symbols(), includes,
+                                            pch=self.pch_for(source))
         
         cmd.extend(self.get_dep_option(object))
             
@@ -122,37 +122,9 @@ class GCC(mbedToolchain):
     def is_not_supported_error(self, output):
         return "error: #error [NOT_SUPPORTED]" in output
 
-    def parse_output(self, output):
-        # The warning/error notification is multiline
-        msg = None
-        for line in output.splitlines():
-            match = self.DIAGNOSTIC_PATTERN.search(line)
-            if match is not None:
-                if msg is not None:
-                    self.cc_info(msg)
-                    msg = None
-                msg = {
-                    'severity': match.group('severity').lower(),
-                    'file': match.group('file'),
-                    'line': match.group('line'),
-                    'col': 0,
-                    'message': match.group('message'),
-                    'text': '',
-                    'target_name': self.target.name,
-                    'toolchain_name': self.name
-                }
-            elif msg is not None:
-                # Determine the warning/error column by calculating the ^ position
-                match = self.INDEX_PATTERN.match(line)
-                if match is not None:
-                    msg['col'] = len(match.group('col'))
-                    self.cc_info(msg)
-                    msg = None
-                else:
-                    msg['text'] += line+"\n"
-
-        if msg is not None:
-            self.cc_info(msg)
+    def match_diagnostic(self, line):
+        # Diagnostics of GCC are not always at the start of the line
+        return self.DIAGNOSTIC_PATTERN.search(line)
 
     def get_dep_option(self, object):
         base, _ = splitext(object)
@@ -162,8 +134,15 @@ class GCC(mbedToolchain):
     def get_config_option(self, config_header):
         return ['-include', config_header]
 
-    def get_compile_options(self, defines, includes, for_asm=False):
+    def get_pch_option(self, pch_file):
+        # GCC looks for "mbed.h.gch" in each include directory before looking
+        # for "mbed.h", so the directory of the precompiled header goes first
+        return ['-I%s' % dirname(pch_file)]
+
+    def get_compile_options(self, defines, includes, for_asm=False, pch=None):
         opts = ['-D%s' % d for d in defines]
+        if pch is not None:
+            opts += self.get_pch_option(pch)
         if self.RESPONSE_FILES:
             opts += ['@%s' % self.get_inc_file(includes)]
         else:
@@ -175,6 +154,17 @@ class GCC(mbedToolchain):
                 opts = opts + self.get_config_option(config_header)
         return opts
 
+    def precompile_header(self, header, pch_dir, includes):
+        pch_file = join(pch_dir, basename(header) + ".gch")
+        cmd = (self.cppc + self.get_compile_options(self.get_pch_symbols(), includes) +
+               self.get_dep_option(pch_file) +
+               ["-x", "c++-header", "-o", pch_file, header])
+
+        # Call cmdline hook
+        cmd = self.hook.get_cmdline_compiler(cmd)
+
+        return pch_file, [cmd]
+
     @hook_tool
     def assemble(self, source, object, includes):
         # Build assemble command
@@ -189,7 +179,8 @@ class GCC(mbedToolchain):
     @hook_tool
     def compile(self, cc, source, object, includes):
         # Build compile command
-        cmd = cc + self.get_compile_options(self.get_symbols(), includes)
+        cmd = cc + self.get_compile_options(self.get_symbols(), includes,
+                                            pch=self.pch_for(source))
 
         cmd.extend(self.get_dep_option(object))
 
@@ -253,8 +244,11 @@ class GCC(mbedToolchain):
         else:
             param = objects
 
+        # Deterministic mode zeroes the time stamps, owners and modes of members
+        flags = 'rcsD' if self.reproducible else 'rcs'
+
         # Exec command
-        self.default_cmd([self.ar, 'rcs', lib_path] + param)
+        self.default_cmd([self.ar, flags, lib_path] + param)
 
     @hook_tool
     def binary(self, resources, elf, bin):
@@ -97,37 +97,6 @@ class IAR(mbedToolchain):
         return [(self.CHROOT if self.CHROOT else '')+path.strip() for path in open(dep_path).readlines()
                 if (path and not path.isspace())]
 
-    def parse_output(self, output):
-        msg = None
-        for line in output.splitlines():
-            match = IAR.DIAGNOSTIC_PATTERN.match(line)
-            if match is not None:
-                if msg is not None:
-                    self.cc_info(msg)
-                    msg = None
-                msg = {
-                    'severity': match.group('severity').lower(),
-                    'file': match.group('file'),
-                    'line': match.group('line'),
-                    'col': 0,
-                    'message': match.group('message'),
-                    'text': '',
-                    'target_name': self.target.name,
-                    'toolchain_name': self.name
-                }
-            elif msg is not None:
-                # Determine the warning/error column by calculating the ^ position
-                match = IAR.INDEX_PATTERN.match(line)
-                if match is not None:
-                    msg['col'] = len(match.group('col'))
-                    self.cc_info(msg)
-                    msg = None
-                else:
-                    msg['text'] += line+"\n"
-
-        if msg is not None:
-            self.cc_info(msg)
-
     def get_dep_option(self, object):
         base, _ = splitext(object)
         dep_path = base + '.d'
@@ -0,0 +1,200 @@
+"""
+mbed SDK
+Copyright (c) 2017 ARM Limited
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+from os import stat, remove, getpid, rename
+from os.path import join, exists, splitext, dirname, relpath, abspath
+from time import time
+
+from tools.utils import mkdir
+
+# Sources that may be compiled together, by extension
+UNITY_EXTENSIONS = ['.c', '.cpp']
+
+# Number of builds an edited source is left unmodified for before it is
+# compiled in its unity source again
+REGROUP_AFTER = 3
+
+
+class UnityBuild(object):
+    """The plan of a unity build: the sources of each directory are
+    concatenated into generated translation units of up to max_size bytes of
+    source, so that the headers they share are only parsed once.
+
+    Two kinds of sources are compiled on their own:
+    - the members of a unity file that failed to compile, although each of
+      them compiles on its own. They are excluded for good, since unity
+      builds break on static names and macros that leak from one source into
+      the next. When one of them does not compile on its own either, the
+      error is in the sources and they are grouped again in the next build.
+    - the sources modified after the last unity build. They are taken to be
+      under edition, and compiling them alone keeps each edit from rebuilding
+      a whole unity file. They join their unity file again once they are
+      left unmodified for REGROUP_AFTER builds.
+    Both lists are kept in the build directory and reset by a clean build.
+    """
+
+    FILENAME = ".mbed_unity.json"
+    # Generated sources are hidden from later scans of the build directory,
+    # their objects are not
+    SOURCE_DIR = ".unity"
+    PREFIX = "mbed_unity_"
+
+    def __init__(self, build_path, max_size):
+        self.build_path = build_path
+        self.max_size = max_size
+        self.path = join(build_path, self.FILENAME)
+        try:
+            with open(self.path) as state_in:
+                state = json.load(state_in)
+        except (IOError, ValueError):
+            state = {}
+        self.excluded = set(state.get('excluded', []))
+        # Number of builds each edited source was left unmodified for
+        self.edited = state.get('edited', {})
+        if isinstance(self.edited, list):
+            self.edited = dict((source, 0) for source in self.edited)
+        self.built_at = state.get('built_at')
+        self.previous_objects = state.get('objects', [])
+
+        # Members of each generated source of this build
+        self.groups = {}
+        self.planned = False
+
+    def source_base(self):
+        """The base path of the generated sources, which places their objects
+        in the build directory next to those of the sources they include
+        """
+        return join(self.build_path, self.SOURCE_DIR)
+
+    def _write(self, path, members):
+        content = "/* Automatically generated unity file, DO NOT EDIT. */\n"
+        content += "".join('#include "%s"\n' % abspath(member).replace("\\", "/")
+                           for member in members)
+        if exists(path):
+            with open(path, "rt") as file_in:
+                if file_in.read() == content:
+                    return
+        mkdir(dirname(path))
+        with open(path, "wt") as file_out:
+            file_out.write(content)
+
+    def plan(self, sources, file_basepath):
+        """Split sources into generated unity sources and sources compiled on
+        their own
+
+        Positional arguments:
+        sources - the sources to compile, sorted
+        file_basepath - the base path of each source
+
+        Return value:
+        the list of sources to compile, the unity sources replacing their
+        members
+        """
+        self.planned = True
+        directories = {}
+        separate = []
+        # Sources that are regrouped, or not built anymore, are forgotten
+        edited = {}
+        for source in sources:
+            ext = splitext(source)[1].lower()
+            if (ext not in UNITY_EXTENSIONS or source in self.excluded or
+                    not relpath(source, self.build_path).startswith('..')):
+                separate.append(source)
+                continue
+            if self.built_at and stat(source).st_mtime > self.built_at:
+                edited[source] = 0
+            elif source in self.edited and \
+                    self.edited[source] + 1 < REGROUP_AFTER:
+                edited[source] = self.edited[source] + 1
+            if source in edited:
+                separate.append(source)
+                continue
+            key = (dirname(source), file_basepath[source], ext)
+            directories.setdefault(key, []).append(source)
+
+        unity_sources = []
+        for (directory, base_path, ext), members in sorted(directories.items()):
+            chunks = [[]]
+            size = 0
+            for member in members:
+                member_size = stat(member).st_size
+                if chunks[-1] and size + member_size > self.max_size:
+                    chunks.append([])
+                    size = 0
+                chunks[-1].append(member)
+                size += member_size
+            for index, chunk in enumerate(chunks):
+                if len(chunk) == 1:
+                    separate.append(chunk[0])
+                    continue
+                name = "%s%d%s" % (self.PREFIX, index, ext)
+                source = join(self.source_base(), relpath(directory, base_path),
+                              name)
+                self._write(source, chunk)
+                self.groups[source] = chunk
+                unity_sources.append(source)
+        self.edited = edited
+        return sorted(separate) + unity_sources
+
+    def split(self, source):
+        """Take a unity source that failed to compile out of the build, for
+        its members to be compiled on their own
+
+        Return value:
+        the members of the unity source
+        """
+        return self.groups.pop(source)
+
+    def exclude(self, members):
+        """Compile the members of a unity source on their own from now on,
+        as they compile on their own but not together
+        """
+        self.excluded.update(members)
+
+    def members(self):
+        """The number of sources compiled through unity sources"""
+        return sum(len(members) for members in self.groups.values())
+
+    def save(self, objects):
+        """Record the state of the unity build, and remove the objects of the
+        unity sources that are not generated anymore, so that scans of the
+        build directory do not pick them up
+
+        Positional arguments:
+        objects - the objects of the unity sources of this build
+        """
+        for obj in set(self.previous_objects) - set(objects):
+            if exists(obj):
+                remove(obj)
+        # Without a unity build, the sources modified since the last one are
+        # still to be seen as edited
+        built_at = time() if self.planned else self.built_at
+
+        temp = "%s.%d.tmp" % (self.path, getpid())
+        try:
+            with open(temp, "w") as state_out:
+                json.dump({'excluded': sorted(self.excluded),
+                           'edited': self.edited,
+                           'built_at': built_at,
+                           'objects': sorted(objects)},
+                          state_out, indent=0)
+            rename(temp, self.path)
+        except (IOError, OSError):
+            try:
+                remove(temp)
+            except OSError:
+                pass
@@ -25,41 +25,52 @@ from os.path import isdir, join, exists, split, relpath, splitext, abspath
 from os.path import commonprefix, normpath, dirname
 from subprocess import Popen, PIPE, STDOUT, call
 from math import ceil
+from time import time
+from threading import Thread
 import json
 from collections import OrderedDict
 import logging
 from intelhex import IntelHex
+from tools.job_control import job_slot
 
 def remove_if_in(lst, thing):
     if thing in lst:
         lst.remove(thing)
 
-def compile_worker(job):
+def compile_worker(job, on_line=None):
     """Standard task runner used for compiling
 
     Positional argumets:
     job - a dict containing a list of commands and the remaining arguments
           to run_cmd
+
+    Keyword arguments:
+    on_line - called with each line of the error output of the commands, as
+              they write it
     """
     results = []
-    for command in job['commands']:
-        try:
-            _, _stderr, _rc = run_cmd(command, work_dir=job['work_dir'],
-                                      chroot=job['chroot'])
-        except KeyboardInterrupt:
-            raise ToolException
+    # The job controller of the build decides when the compiler may start
+    with job_slot():
+        start = time()
+        for command in job['commands']:
+            try:
+                _, _stderr, _rc = run_cmd(command, work_dir=job['work_dir'],
+                                          chroot=job['chroot'], on_line=on_line)
+            except KeyboardInterrupt:
+                raise ToolException
 
-        results.append({
-            'code': _rc,
-            'output': _stderr,
-            'command': command
-        })
+            results.append({
+                'code': _rc,
+                'output': _stderr,
+                'command': command
+            })
 
     return {
         'source': job['source'],
         'object': job['object'],
         'commands': job['commands'],
-        'results': results
+        'results': results,
+        'duration': time() - start
     }
 
 def cmd(command, check=True, verbose=False, shell=False, cwd=None):
@@ -72,7 +83,7 @@ def cmd(command, check=True, verbose=False, shell=False, cwd=None):
         raise Exception('ERROR %d: "%s"' % (return_code, text))
 
 
-def run_cmd(command, work_dir=None, chroot=None, redirect=False):
+def run_cmd(command, work_dir=None, chroot=None, redirect=False, on_line=None):
     """Run a command in the forground
 
     Positional arguments:
@@ -82,6 +93,8 @@ def run_cmd(command, work_dir=None, chroot=None, redirect=False):
     work_dir - the working directory to run the command in
     chroot - the chroot to run the command in
     redirect - redirect the stderr to a pipe to be used later
+    on_line - called with each line of the error output (or of the output,
+              when redirected) as the command writes it
     """
     if chroot:
         # Conventions managed by the web team for the mbed.org build system
@@ -98,7 +111,27 @@ def run_cmd(command, work_dir=None, chroot=None, redirect=False):
     try:
         process = Popen(command, stdout=PIPE,
                         stderr=STDOUT if redirect else PIPE, cwd=work_dir)
-        _stdout, _stderr = process.communicate()
+        if on_line is None:
+            _stdout, _stderr = process.communicate()
+        else:
+            stream = process.stdout if redirect else process.stderr
+            # The other pipe is drained meanwhile, for the command never to
+            # block on it
+            other = []
+            if not redirect:
+                drain = Thread(target=lambda: other.append(process.stdout.read()))
+                drain.start()
+            lines = []
+            for line in iter(stream.readline, ''):
+                lines.append(line)
+                on_line(line.rstrip('\r\n'))
+            if not redirect:
+                drain.join()
+            process.wait()
+            if redirect:
+                _stdout, _stderr = ''.join(lines), None
+            else:
+                _stdout, _stderr = other[0], ''.join(lines)
     except OSError:
         print "[OS ERROR] Command: "+(' '.join(command))
         raise